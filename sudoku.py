@@ -6,14 +6,1354 @@ Created on Tue Jan 11 23:21:45 2022
 """
 
 import numpy as np
-import logging, logging.config
+import logging, logging.config, logging.handlers
 import time
-from random import randint
+import argparse
+import asyncio
+import atexit
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import combinations, islice, permutations, product
+from math import isqrt
+from random import Random, randint
 
 #logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', datefmt="%Y-%m-%d %H:%M:%S", level=logging.DEBUG, filename="sudoku.log", filemode="w")
-logging.config.fileConfig('logging.conf')
 
 logger = logging.getLogger('sudoku')
+logger.addHandler(logging.NullHandler()) # nothing is logged until logging is configured
+
+DEFAULT_LOG_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logging.conf")
+_log_listener = None
+
+""" Configure Logging
+Logging is not configured when the module is imported, so that importing it does no file I/O.
+Call this function (running sudoku.py as a script does) or set the SUDOKU_LOG_CONFIG environment
+variable to the path of a config file before importing, to opt in.
+Params: config -> path of a logging.config.fileConfig file. Defaults to the logging.conf next to this module.
+  asynchronous -> if True, the 'sudoku' logger only puts records on a queue, and a QueueListener thread
+    passes them on to the configured handlers, so file I/O happens outside the solving thread.
+    Also enabled by setting the SUDOKU_LOG_ASYNC environment variable to 1.
+Returns: the running QueueListener in asynchronous mode, None otherwise.
+"""
+def configure_logging(config: str = None, asynchronous: bool = False):
+  global _log_listener
+  stop_logging()
+  logging.config.fileConfig(config or DEFAULT_LOG_CONFIG, disable_existing_loggers=False)
+  if asynchronous:
+    handlers = [h for h in logger.handlers if not isinstance(h, logging.NullHandler)]
+    records = queue.SimpleQueue()
+    for h in handlers:
+      logger.removeHandler(h)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    _log_listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _log_listener.start()
+  return _log_listener
+
+""" Stop Logging
+Stops the asynchronous logging listener, if one is running, after it has written every queued record.
+Registered to run at exit.
+"""
+def stop_logging():
+  global _log_listener
+  if _log_listener is not None:
+    _log_listener.stop()
+    _log_listener = None
+
+atexit.register(stop_logging)
+
+if os.environ.get("SUDOKU_LOG_CONFIG"):
+  configure_logging(os.environ["SUDOKU_LOG_CONFIG"], asynchronous=os.environ.get("SUDOKU_LOG_ASYNC", "0") not in ("", "0"))
+
+
+""" Board Geometry
+Lookup tables for a board of (box * box) squares of box * box cells each, such as the 9x9 board
+(box 3), or 4x4, 16x16, and 25x25 boards (box 2, 4, and 5). Digits run from 1 to size = box * box.
+The tables are computed once per box size (see geometry()) and shared by the solvers, the generator,
+and board I/O. A cell is addressed either by its absolute position x (0 to size * size - 1, across
+the rows from the top-left cell) or by the indices (s, r, c) used in Sudoku.board: its square,
+and its row and column within the square.
+"""
+class BoardGeometry:
+  
+  def __init__(self, box: int):
+    if box < 1:
+      raise ValueError(f"Box size must be at least 1, got {box}")
+    b = self.box = box
+    n = self.size = box * box
+    self.cell_count = n * n
+    self.legal_values = list(range(1, n + 1))
+    self.all_digits = ((1 << n) - 1) << 1 # bits 1 through size
+    
+    self.positions = range(n * n)
+    self.row_of_pos = [x // n for x in self.positions]
+    self.col_of_pos = [x % n for x in self.positions]
+    self.square_of_pos = [b * (x // (n * b)) + (x % n) // b for x in self.positions]
+    self.pos_to_indices = [(self.square_of_pos[x], self.row_of_pos[x] % b, self.col_of_pos[x] % b)
+                           for x in self.positions]
+    self.indices_to_pos = [[[n * (b * (s // b) + r) + b * (s % b) + c for c in range(b)] for r in range(b)]
+                           for s in range(n)]
+    
+    # Units are the positions of each row, column, and square. units lists the rows, then the
+    # columns, then the squares, and units_of_pos gives the indices into units of the three
+    # units containing each position.
+    self.unit_rows = [[n * row + col for col in range(n)] for row in range(n)]
+    self.unit_cols = [[n * row + col for row in range(n)] for col in range(n)]
+    self.unit_squares = [[self.indices_to_pos[s][r][c] for r in range(b) for c in range(b)] for s in range(n)]
+    self.units = self.unit_rows + self.unit_cols + self.unit_squares
+    self.units_of_pos = [(self.row_of_pos[x], n + self.col_of_pos[x], 2 * n + self.square_of_pos[x])
+                         for x in self.positions]
+    # The other positions sharing a row, column, or square with each position
+    self.peers = [sorted(set(self.unit_rows[self.row_of_pos[x]] + self.unit_cols[self.col_of_pos[x]]
+                             + self.unit_squares[self.square_of_pos[x]]) - {x}) for x in self.positions]
+    
+    # A segment is the intersection of a square with a row or a column (box cells).
+    # Segments 0 to size * box - 1 are row segments, numbered box * row + square column;
+    # the following size * box segments are column segments, numbered size * box + box * col + square row.
+    half = n * b
+    self.segment_cells = ([[n * row + b * sc + c for c in range(b)] for row in range(n) for sc in range(b)]
+                          + [[n * (b * sr + r) + col for r in range(b)] for col in range(n) for sr in range(b)])
+    self.segment_line_rest = [sorted(set(self.unit_rows[i // b]) - set(self.segment_cells[i])) for i in range(half)] \
+                             + [sorted(set(self.unit_cols[i // b]) - set(self.segment_cells[half + i]))
+                                for i in range(half)]
+    self.segment_square_rest = [sorted(set(self.unit_squares[self.square_of_pos[self.segment_cells[i][0]]])
+                                       - set(self.segment_cells[i])) for i in range(2 * half)]
+    # The other segments of the same square, and of the same row or column, as each segment
+    self.segment_square_siblings = [tuple(j for j in range(2 * half) if j != i and (j < half) == (i < half)
+                                          and set(self.segment_square_rest[i]) >= set(self.segment_cells[j]))
+                                    for i in range(2 * half)]
+    self.segment_line_siblings = [tuple(j for j in range(2 * half) if j != i
+                                        and set(self.segment_line_rest[i]) >= set(self.segment_cells[j]))
+                                  for i in range(2 * half)]
+    
+    # Sudoku.cells stores the board as a flat buffer of size * size bytes in square-major order, the same
+    # order as Sudoku.board: the cell at indices (s, r, c) is stored at size * s + box * r + c.
+    self.cell_of_pos = [n * s + b * r + c for s, r, c in self.pos_to_indices]
+    self.pos_of_cell = [self.indices_to_pos[i // n][(i // b) % b][i % b] for i in range(n * n)]
+    self.row_cells = [[self.cell_of_pos[x] for x in unit] for unit in self.unit_rows]
+    self.col_cells = [[self.cell_of_pos[x] for x in unit] for unit in self.unit_cols]
+    self.square_cells = [list(range(n * s, n * s + n)) for s in range(n)]
+    self.peer_cells = [[self.cell_of_pos[p] for p in self.peers[self.pos_of_cell[i]]] for i in range(n * n)]
+    self.exact_cover = None # DancingLinks template, built on first use by sudoku_exact_cover
+
+
+_geometries = dict()
+
+"""
+Returns the BoardGeometry for the given box size, building it on first use.
+"""
+def geometry(box: int = 3) -> BoardGeometry:
+  g = _geometries.get(box)
+  if g is None:
+    g = _geometries[box] = BoardGeometry(box)
+  return g
+
+# The tables of the standard 9x9 board, used as the defaults throughout this module.
+# See BoardGeometry for a description of each.
+GEOMETRY = geometry(3)
+POSITIONS = GEOMETRY.positions
+ROW_OF_POS = GEOMETRY.row_of_pos
+COL_OF_POS = GEOMETRY.col_of_pos
+SQUARE_OF_POS = GEOMETRY.square_of_pos
+POS_TO_INDICES = GEOMETRY.pos_to_indices
+INDICES_TO_POS = GEOMETRY.indices_to_pos
+ALL_DIGITS = GEOMETRY.all_digits # bits 1 through 9
+UNIT_ROWS = GEOMETRY.unit_rows
+UNIT_COLS = GEOMETRY.unit_cols
+UNIT_SQUARES = GEOMETRY.unit_squares
+UNITS = GEOMETRY.units
+UNITS_OF_POS = GEOMETRY.units_of_pos
+PEERS = GEOMETRY.peers
+SEGMENT_CELLS = GEOMETRY.segment_cells
+SEGMENT_LINE_REST = GEOMETRY.segment_line_rest
+SEGMENT_SQUARE_REST = GEOMETRY.segment_square_rest
+SEGMENT_SQUARE_SIBLINGS = GEOMETRY.segment_square_siblings
+SEGMENT_LINE_SIBLINGS = GEOMETRY.segment_line_siblings
+CELL_OF_POS = GEOMETRY.cell_of_pos
+POS_OF_CELL = GEOMETRY.pos_of_cell
+ROW_CELLS = GEOMETRY.row_cells
+COL_CELLS = GEOMETRY.col_cells
+SQUARE_CELLS = GEOMETRY.square_cells
+PEER_CELLS = GEOMETRY.peer_cells
+
+# Symbols used for the digits of a board in text form: 0 for an empty cell, then 1 to 9,
+# then letters for the digits 10 to 25 of larger boards. '.' is also read as an empty cell.
+SYMBOLS = "0123456789ABCDEFGHIJKLMNOP"
+SYMBOL_VALUES = {ch: v for v, ch in enumerate(SYMBOLS)}
+SYMBOL_VALUES.update({ch.lower(): v for v, ch in enumerate(SYMBOLS) if ch.isalpha()})
+SYMBOL_VALUES["."] = 0
+_SYMBOL_CODES = np.frombuffer(SYMBOLS.encode("ascii"), dtype=np.uint8) # ASCII code of the symbol of each value
+
+""" Parse Puzzle
+Reads the cell values of a puzzle written as text, organized by row: 81 symbols for a 9x9 board
+(size * size in general), with 0 or . for empty cells. White space is ignored.
+Params: puzzle -> the puzzle text, such as one line of a batch puzzle file.
+  geometry -> the BoardGeometry of the puzzle. Defaults to the 9x9 board.
+Returns: list -> the values of the cells, in absolute position order.
+Raises: ValueError if the puzzle has the wrong number of cells or a symbol that is not a digit of the board.
+"""
+def parse_puzzle(puzzle: str, geometry: BoardGeometry = GEOMETRY) -> list:
+  symbols = "".join(puzzle.split())
+  if len(symbols) != geometry.cell_count:
+    raise ValueError(f"Expected a puzzle of {geometry.cell_count} cells, got {len(symbols)}: {puzzle[:100]!r}")
+  values = [SYMBOL_VALUES.get(ch, -1) for ch in symbols]
+  for ch, val in zip(symbols, values):
+    if not 0 <= val <= geometry.size:
+      raise ValueError(f"Invalid cell {ch!r} for a {geometry.size}x{geometry.size} puzzle: {puzzle[:100]!r}")
+  return values
+
+
+NEVER = sys.maxsize # node count of a periodic task that is not enabled
+
+"""
+Raised by a search that has run past its deadline (see SolveStats).
+"""
+class SolveTimeout(TimeoutError):
+  pass
+
+""" Solve Cancelled
+Raised by a search whose cancellation event was set (see SolveStats), e.g. because another worker
+of a parallel search already found a solution.
+"""
+class SolveCancelled(Exception):
+  pass
+
+
+""" Solve Stats
+Counters and timings collected by a search. After every call to Sudoku.solve, Sudoku.count_solutions,
+solve_puzzle_backtracking, or generate_board, the stats of that call are attached to the board as self.stats.
+nodes -> the number of search nodes visited: empty cells tried by backtracking, candidate states
+  explored by propagation, or columns branched on by Dancing Links.
+backtracks -> the number of nodes abandoned without finding a solution below them.
+max_depth -> the deepest level reached by the search (the number of choices made on the way down).
+checks -> the number of placements checked for validity: candidate values tried by
+  backtracking and the generator, branch assignments by propagation, and rows tried by Dancing Links.
+wall, cpu -> seconds of wall-clock and CPU time spent in each phase, keyed by phase name
+  ("parse", "propagate", "search", and "verify" for solves; "fill" and "remove" for generation).
+Params: progress -> optional callback, called with this SolveStats object every progress_interval nodes,
+    for sampling the progress of long searches.
+  trace -> log a debug record for every node visited. Off by default, as it costs more than the search itself.
+  deadline -> optional time.time() value after which the search is abandoned. visit() is the search's
+    cancellation checkpoint: every DEADLINE_CHECK_INTERVAL nodes, it raises SolveTimeout once the deadline
+    has passed, which unwinds the search wherever it is.
+  cancel -> optional threading or multiprocessing Event, checked at the same checkpoint: once it is set,
+    visit() raises SolveCancelled.
+  profiler -> optional SolveProfiler, which records the phases as sections and samples the search depth
+    every profiler.sample_interval nodes.
+Progress reports, cancellation checks, and depth samples all wait for a node count, so visit() only compares
+the node count with the next of them; without any of them, it costs the same as counting.
+"""
+class SolveStats:
+  
+  DEADLINE_CHECK_INTERVAL = 64
+  
+  def __init__(self, progress=None, progress_interval: int = 10000, trace: bool = False, deadline: float = None,
+               cancel=None, profiler=None):
+    self.nodes = 0
+    self.backtracks = 0
+    self.max_depth = 0
+    self.checks = 0
+    self.wall = dict()
+    self.cpu = dict()
+    self.progress = progress
+    self.progress_interval = progress_interval
+    self.trace = trace
+    self.deadline = deadline
+    self.cancel = cancel
+    self.profiler = profiler
+    self.__next_progress = progress_interval if progress is not None else NEVER
+    self.__next_deadline_check = SolveStats.DEADLINE_CHECK_INTERVAL if deadline is not None or cancel is not None else NEVER
+    self.__next_sample = profiler.sample_interval if profiler is not None else NEVER
+    self.__next_event = min(self.__next_progress, self.__next_deadline_check, self.__next_sample)
+  
+  """
+  Records a visit to a search node at the given depth.
+  """
+  def visit(self, depth: int):
+    self.nodes += 1
+    if depth > self.max_depth:
+      self.max_depth = depth
+    if self.trace:
+      logger.debug("visiting node %s at depth %s", self.nodes, depth)
+    if self.nodes >= self.__next_event:
+      self.__periodic__(depth)
+  
+  """
+  Runs the periodic tasks that are due at the current node count: progress reports, cancellation checks,
+  and depth samples.
+  """
+  def __periodic__(self, depth: int):
+    if self.nodes >= self.__next_sample:
+      self.__next_sample += self.profiler.sample_interval
+      self.profiler.sample(depth)
+    if self.nodes >= self.__next_progress:
+      self.__next_progress += self.progress_interval
+      self.progress(self)
+    if self.nodes >= self.__next_deadline_check:
+      self.__next_deadline_check += SolveStats.DEADLINE_CHECK_INTERVAL
+      self.__next_event = min(self.__next_progress, self.__next_deadline_check, self.__next_sample)
+      if self.deadline is not None and time.time() > self.deadline:
+        raise SolveTimeout(f"Search abandoned at its deadline, after {self.nodes} nodes")
+      if self.cancel is not None and self.cancel.is_set():
+        raise SolveCancelled(f"Search cancelled after {self.nodes} nodes")
+    self.__next_event = min(self.__next_progress, self.__next_deadline_check, self.__next_sample)
+  
+  """
+  Context manager that adds the wall-clock and CPU time spent in its body to the named phase.
+  """
+  @contextmanager
+  def phase(self, name: str):
+    wall, cpu = time.perf_counter(), time.process_time()
+    if self.profiler is not None:
+      self.profiler.begin(name)
+    try:
+      yield self
+    finally:
+      if self.profiler is not None:
+        self.profiler.end()
+      self.wall[name] = self.wall.get(name, 0.0) + time.perf_counter() - wall
+      self.cpu[name] = self.cpu.get(name, 0.0) + time.process_time() - cpu
+  
+  """
+  Context manager that records its body as the named section of the profiler, if there is one.
+  """
+  def section(self, name: str):
+    return self.profiler.section(name) if self.profiler is not None else nullcontext()
+  
+  """
+  Returns: function -> f, recording each of its calls as the named section of the profiler if there is one,
+    f itself otherwise. Searches look their steps up with it once, not on every call.
+  """
+  def timed(self, name: str, f):
+    return self.profiler.timed(name, f) if self.profiler is not None else f
+  
+  def as_dict(self) -> dict:
+    return {"nodes": self.nodes, "backtracks": self.backtracks, "max_depth": self.max_depth,
+            "checks": self.checks, "wall": dict(self.wall), "cpu": dict(self.cpu)}
+  
+  """
+  Adds the counters of another search (as returned by as_dict) to these, such as those of the
+  subproblems of a parallel search. depth is the depth at which that search started.
+  """
+  def merge(self, other: dict, depth: int = 0):
+    self.nodes += other["nodes"]
+    self.backtracks += other["backtracks"]
+    self.checks += other["checks"]
+    self.max_depth = max(self.max_depth, depth + other["max_depth"])
+
+
+""" Solve Profiler
+Opt-in profiler for Sudoku.solve and generate_board (pass it as their profiler argument), for finding where
+the time of a slow puzzle goes without the distortion of cProfile or of per-node DEBUG logging.
+It records named sections, nested as they run:
+- the phases of SolveStats ("parse", "propagate", "search", "verify", "fill", "remove", ...), and
+- the steps the solvers time through SolveStats.section and SolveStats.timed: "validation" of the givens
+  and of the solution, "candidate selection", and "propagation" (and "I/O" in the profile command).
+It also samples the depth of the search every sample_interval nodes. The results can be written as
+collapsed stacks (one "section;nested section microseconds" line per stack, for flamegraph.pl or speedscope)
+or as a Chrome trace (for chrome://tracing or Perfetto), where the depth samples show as a counter track.
+The profiler reaches the solvers through the SolveStats of each call, so solves running at the same time, in
+other threads, are not recorded by it; but one profiler should only record one solve at a time. When no profiler
+is given, the searches call their steps directly, and only pay the node count comparison they make anyway
+(see SolveStats), so profiling costs nothing unless it is enabled.
+Params: sample_interval -> the number of search nodes between two depth samples.
+  max_events -> the most sections kept for the Chrome trace. Beyond it, sections are still added to the
+    collapsed stacks and totals, but not to the trace (dropped_events counts them).
+"""
+class SolveProfiler:
+  
+  def __init__(self, sample_interval: int = 100, max_events: int = 200000):
+    self.sample_interval = sample_interval
+    self.max_events = max_events
+    self.origin = time.perf_counter_ns()
+    self.stack = list() # open sections, as [name, start, nanoseconds spent in nested sections]
+    self.self_time = dict() # nanoseconds spent in each stack of sections, excluding nested sections
+    self.events = list() # (name, start, duration, depth) of every section, for the Chrome trace
+    self.dropped_events = 0
+    self.depth_samples = list() # (time, search depth)
+  
+  """
+  Opens a section. Sections must be closed with end, in the reverse order.
+  """
+  def begin(self, name: str):
+    self.stack.append([name, time.perf_counter_ns(), 0])
+  
+  """
+  Closes the innermost open section.
+  """
+  def end(self):
+    now = time.perf_counter_ns()
+    path = tuple(frame[0] for frame in self.stack)
+    name, start, nested = self.stack.pop()
+    duration = now - start
+    self.self_time[path] = self.self_time.get(path, 0) + duration - nested
+    if self.stack:
+      self.stack[-1][2] += duration
+    if len(self.events) < self.max_events:
+      self.events.append((name, start, duration, len(self.stack)))
+    else:
+      self.dropped_events += 1
+  
+  """
+  Context manager that records its body as a section.
+  """
+  @contextmanager
+  def section(self, name: str):
+    self.begin(name)
+    try:
+      yield self
+    finally:
+      self.end()
+  
+  """
+  Records the current depth of the search. Called by SolveStats.visit every sample_interval nodes.
+  """
+  def sample(self, depth: int):
+    self.depth_samples.append((time.perf_counter_ns(), depth))
+  
+  """
+  Returns: function -> f, recording each of its calls as a section. f must not be a generator function,
+    whose calls return before its work is done.
+  """
+  def timed(self, name: str, f):
+    begin, end = self.begin, self.end
+    
+    def timed(*args, **kwargs):
+      begin(name)
+      try:
+        return f(*args, **kwargs)
+      finally:
+        end()
+    
+    timed.__wrapped__ = f
+    return timed
+  
+  """
+  Returns: dict -> the total microseconds spent in each section name, including nested sections, and the
+    number of times it ran.
+  """
+  def totals(self) -> dict:
+    totals = dict()
+    for name, _, duration, _ in self.events:
+      total = totals.setdefault(name, {"us": 0.0, "count": 0})
+      total["us"] += duration / 1000
+      total["count"] += 1
+    return totals
+  
+  """
+  Returns: str -> the collapsed stacks: one line per stack of nested sections, with its names joined by ';'
+    and the microseconds spent in it (excluding nested sections), as read by flamegraph.pl and speedscope.
+  """
+  def collapsed(self) -> str:
+    return "".join(f"{';'.join(path)} {ns // 1000}\n" for path, ns in sorted(self.self_time.items()) if ns >= 1000)
+  
+  """
+  Returns: dict -> the sections and depth samples in the Chrome trace event format, ready to be written as JSON.
+  """
+  def chrome_trace(self) -> dict:
+    pid = os.getpid()
+    events = [{"name": name, "ph": "X", "ts": (start - self.origin) / 1000, "dur": duration / 1000,
+               "pid": pid, "tid": 0} for name, start, duration, _ in self.events]
+    events += [{"name": "search depth", "ph": "C", "ts": (t - self.origin) / 1000, "pid": pid, "tid": 0,
+                "args": {"depth": depth}} for t, depth in self.depth_samples]
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped_events, "sample_interval": self.sample_interval}}
+  
+  """
+  Writes the profile to filename: as a Chrome trace if the name ends with .json, as collapsed stacks otherwise.
+  """
+  def write(self, filename: str):
+    with open(filename, "w") as f:
+      if filename.endswith(".json"):
+        json.dump(self.chrome_trace(), f)
+      else:
+        f.write(self.collapsed())
+
+
+""" Constraint State
+Incrementally tracks which digits are used in every row, column, and square of a board.
+Each unit keeps a bitmask where bit v is set when digit v has been placed in that unit,
+so checking, placing, and removing a value are all constant-time operations.
+Cells are addressed by their absolute position (0 to 80 on a 9x9 board), as in POS_TO_INDICES.
+Params: geometry -> the BoardGeometry of the board. Defaults to the 9x9 board.
+"""
+class ConstraintState:
+  
+  def __init__(self, geometry: BoardGeometry = GEOMETRY):
+    self.geometry = geometry
+    self.row_of_pos, self.col_of_pos, self.square_of_pos = geometry.row_of_pos, geometry.col_of_pos, geometry.square_of_pos
+    self.rows = [0] * geometry.size
+    self.cols = [0] * geometry.size
+    self.squares = [0] * geometry.size
+  
+  """
+  Fills the state from the values currently on a board.
+  Params: board -> the board to read, in the (size, box, box) layout used by Sudoku.board.
+  Returns: bool -> True if the given values do not conflict with each other, False otherwise.
+  """
+  def load(self, board) -> bool:
+    g = self.geometry
+    self.rows = [0] * g.size
+    self.cols = [0] * g.size
+    self.squares = [0] * g.size
+    flat = np.asarray(board).reshape(-1).tolist()
+    for x in g.positions:
+      val = flat[g.cell_of_pos[x]]
+      if val == Sudoku.EMPTY_VALUE:
+        continue
+      if not 0 < val <= g.size or not self.can_place(x, val):
+        return False
+      self.place(x, val)
+    return True
+  
+  """
+  Returns True if val can be placed at position x without repeating a digit
+  in the position's row, column, or square, False otherwise.
+  """
+  def can_place(self, x: int, val: int) -> bool:
+    bit = 1 << val
+    return not ((self.rows[self.row_of_pos[x]] | self.cols[self.col_of_pos[x]] | self.squares[self.square_of_pos[x]]) & bit)
+  
+  """
+  Records val as placed at position x.
+  """
+  def place(self, x: int, val: int):
+    bit = 1 << val
+    self.rows[self.row_of_pos[x]] |= bit
+    self.cols[self.col_of_pos[x]] |= bit
+    self.squares[self.square_of_pos[x]] |= bit
+  
+  """
+  Removes a previously placed val from position x.
+  """
+  def unplace(self, x: int, val: int):
+    mask = ~(1 << val)
+    self.rows[self.row_of_pos[x]] &= mask
+    self.cols[self.col_of_pos[x]] &= mask
+    self.squares[self.square_of_pos[x]] &= mask
+  
+  """
+  Returns: int -> a bitmask of the digits that can be placed at position x (bit v set when v can be placed).
+  """
+  def candidates(self, x: int) -> int:
+    return self.geometry.all_digits & ~(self.rows[self.row_of_pos[x]] | self.cols[self.col_of_pos[x]]
+                                        | self.squares[self.square_of_pos[x]])
+
+
+""" Backtracking Search
+Iterative depth-first search which fills the given positions of a board one at a time, in order,
+with digits that do not repeat in their row, column, or square.
+Instead of recursing once per position, the search keeps an explicit stack with one frame per
+position filled so far: [position, bitmask of the candidates not tried there yet, value placed].
+Its depth is therefore not bounded by the recursion limit, and the search can be paused and resumed:
+run(max_nodes) returns PAUSED after visiting max_nodes positions, and the next call to run picks up
+where it stopped. After a solution, the next call to run backtracks from it to look for another one.
+Params: cells -> the flat board (see Sudoku.cells), which is filled in place. Values placed by the search
+    are removed again when it backtracks, so the board is back to its starting values once it is EXHAUSTED.
+  positions -> the empty positions to fill, in the order they are filled.
+  state -> a ConstraintState loaded with the values already on the board, which also gives its geometry.
+  rng -> optional random.Random. If given, the candidates of every position are tried in random order,
+    otherwise in ascending order.
+  stats -> optional SolveStats that counts the positions visited and the candidates tried.
+  most_constrained -> if True, positions are not filled in the given order: each step fills the remaining
+    position with the fewest candidates, and a position left without candidates is found immediately.
+    This costs a scan of the remaining positions per step, but keeps the search from thrashing on
+    boards larger than 9x9.
+"""
+class BacktrackingSearch:
+  
+  SOLVED = "solved"
+  PAUSED = "paused"
+  EXHAUSTED = "exhausted"
+  
+  def __init__(self, cells: bytearray, positions: list, state: ConstraintState, rng: Random = None,
+               stats: SolveStats = None, most_constrained: bool = False):
+    self.cells = cells
+    self.positions = list(positions) # positions[:depth] are the filled positions, in order
+    self.state = state
+    self.rng = rng
+    self.stats = stats if stats is not None else SolveStats()
+    self.most_constrained = most_constrained
+    self.stack = list()
+    self.status = None
+    self.__descend = True # True when the next step visits a new position, False when it retries the top frame
+  
+  """
+  Returns: int -> the number of positions currently filled by the search.
+  """
+  @property
+  def depth(self) -> int:
+    return len(self.stack)
+  
+  """ Run
+  Runs the search until it finds a solution, runs out of candidates, or has visited max_nodes positions.
+  Params: max_nodes -> the number of positions to visit before pausing. Defaults to None (no limit).
+  Returns: str -> SOLVED if every position is filled, with the solution on the board; PAUSED if max_nodes
+    was reached; EXHAUSTED if there are no (further) solutions. The status is also kept as self.status.
+  """
+  def run(self, max_nodes: int = None) -> str:
+    stack, positions, cells, state, stats, rng = self.stack, self.positions, self.cells, self.state, self.stats, self.rng
+    cell_of_pos, legal_values = state.geometry.cell_of_pos, state.geometry.legal_values
+    trace = stats.trace
+    select_position = stats.timed("candidate selection", self.__select_position__)
+    visited = 0
+    while True:
+      if self.__descend:
+        k = len(stack)
+        if k == len(positions):
+          self.__descend = False
+          self.status = BacktrackingSearch.SOLVED
+          return self.status
+        if max_nodes is not None and visited >= max_nodes:
+          self.status = BacktrackingSearch.PAUSED
+          return self.status
+        visited += 1
+        if self.most_constrained:
+          select_position(k)
+        x = positions[k]
+        stats.visit(k)
+        stack.append([x, state.candidates(x), 0])
+      frame = stack[-1] if stack else None
+      if frame is None:
+        self.status = BacktrackingSearch.EXHAUSTED
+        return self.status
+      x, mask, val = frame
+      if val:
+        state.unplace(x, val)
+      if not mask:
+        # Every candidate at this position failed, backtrack to the previous one
+        if trace:
+          logger.debug("About to backtrack from position %s", x)
+        cells[cell_of_pos[x]] = Sudoku.EMPTY_VALUE
+        stack.pop()
+        stats.backtracks += 1
+        self.__descend = False
+        continue
+      if rng is None:
+        val = (mask & -mask).bit_length() - 1
+      else:
+        choices = [v for v in legal_values if mask >> v & 1]
+        val = choices[rng.randrange(len(choices))]
+      stats.checks += 1
+      frame[1] = mask & ~(1 << val)
+      frame[2] = val
+      cells[cell_of_pos[x]] = val
+      state.place(x, val)
+      if trace:
+        logger.debug("Selected value %s for position %s", val, x)
+      self.__descend = True
+  
+  """
+  Moves the unfilled position with the fewest candidates to positions[k].
+  """
+  def __select_position__(self, k: int):
+    positions, candidates = self.positions, self.state.candidates
+    best, best_count = k, self.state.geometry.size + 1
+    for j in range(k, len(positions)):
+      count = bin(candidates(positions[j])).count("1")
+      if count < best_count:
+        best, best_count = j, count
+        if count < 2:
+          break
+    positions[k], positions[best] = positions[best], positions[k]
+  
+  """
+  Returns the state of the search between two calls to run, as a dict of plain values that can be written as
+  JSON and passed to from_checkpoint later. The board and the ConstraintState are not included: both are
+  rebuilt from the cells, which hold every value placed by the search. The rng state is not included either.
+  """
+  def checkpoint(self) -> dict:
+    return {"positions": list(self.positions), "stack": [list(frame) for frame in self.stack],
+            "descend": self.__descend, "status": self.status}
+  
+  """
+  Rebuilds a search saved with checkpoint. cells must hold the board as it was when the checkpoint was taken,
+  and state must be loaded with those cells.
+  """
+  @classmethod
+  def from_checkpoint(cls, cells: bytearray, state: ConstraintState, checkpoint: dict, stats: SolveStats = None,
+                      most_constrained: bool = False):
+    search = cls(cells, checkpoint["positions"], state, stats=stats, most_constrained=most_constrained)
+    search.stack = [list(frame) for frame in checkpoint["stack"]]
+    search.__descend = checkpoint["descend"]
+    search.status = checkpoint["status"]
+    return search
+
+
+
+""" Candidate State
+Candidate digits for every cell of a board, kept as bitmasks (bit v set when v is still possible).
+Supports constraint propagation with naked singles, hidden singles, and box/line reductions,
+and a depth-first search that branches on the cell with the fewest candidates.
+Params: geometry -> the BoardGeometry of the board. Defaults to the 9x9 board.
+"""
+class CandidateState:
+  
+  def __init__(self, cands: list = None, values: list = None, geometry: BoardGeometry = GEOMETRY):
+    self.geometry = geometry
+    self.cands = cands if cands is not None else [geometry.all_digits] * geometry.cell_count
+    self.values = values if values is not None else [Sudoku.EMPTY_VALUE] * geometry.cell_count
+    self.pending = list()
+  
+  """
+  Builds the candidate state for the given board, in the (size, box, box) layout used by Sudoku.board.
+  Returns: CandidateState, or None if the given values already contradict each other.
+  """
+  @classmethod
+  def from_board(cls, board, geometry: BoardGeometry = GEOMETRY):
+    state = cls(geometry=geometry)
+    flat = np.asarray(board).reshape(-1).tolist()
+    for x in geometry.positions:
+      val = flat[geometry.cell_of_pos[x]]
+      if val != Sudoku.EMPTY_VALUE and (not 0 < val <= geometry.size or not state.assign(x, val)):
+        return None
+    return state
+  
+  def copy(self):
+    return CandidateState(self.cands[:], self.values[:], self.geometry)
+  
+  """
+  Places val at position x and removes it from the candidates of every peer.
+  Returns: bool -> False if this leaves a peer without candidates, True otherwise.
+  """
+  def assign(self, x: int, val: int) -> bool:
+    bit = 1 << val
+    if not self.cands[x] & bit:
+      return False
+    self.cands[x] = bit
+    self.values[x] = val
+    for p in self.geometry.peers[x]:
+      if self.cands[p] & bit and not self.eliminate(p, bit):
+        return False
+    return True
+  
+  """
+  Removes the candidate bit from position x, queueing x if it is left with a single candidate.
+  Returns: bool -> False if x has no candidates left, True otherwise.
+  """
+  def eliminate(self, x: int, bit: int) -> bool:
+    m = self.cands[x] & ~bit
+    self.cands[x] = m
+    if m == 0:
+      return False
+    if m & (m - 1) == 0 and self.values[x] == Sudoku.EMPTY_VALUE:
+      self.pending.append(x)
+    return True
+  
+  """
+  Assigns every queued naked single.
+  Returns: bool -> False on a contradiction, True otherwise.
+  """
+  def __naked_singles__(self) -> bool:
+    while self.pending:
+      x = self.pending.pop()
+      if self.values[x] == Sudoku.EMPTY_VALUE and not self.assign(x, self.cands[x].bit_length() - 1):
+        return False
+    return True
+  
+  """
+  Assigns every digit that has a single possible position within a unit.
+  Returns: (bool, bool) -> (False on a contradiction, whether any value was assigned).
+  """
+  def __hidden_singles__(self) -> tuple:
+    changed = False
+    cands, values = self.cands, self.values
+    all_digits = self.geometry.all_digits
+    for unit in self.geometry.units:
+      once = twice = placed = 0
+      for x in unit:
+        m = cands[x]
+        twice |= once & m
+        once |= m
+        if values[x]:
+          placed |= m
+      if once != all_digits: # some digit can no longer be placed in this unit
+        return False, changed
+      hidden = once & ~twice & ~placed # digits already placed in the unit need no search
+      while hidden:
+        bit = hidden & -hidden
+        hidden ^= bit
+        for x in unit:
+          if cands[x] & bit:
+            if values[x] == Sudoku.EMPTY_VALUE:
+              if not self.assign(x, bit.bit_length() - 1):
+                return False, changed
+              changed = True
+            break
+    return True, changed
+  
+  """
+  Removes candidates with box/line reductions: a digit confined to one row or column of a square
+  cannot appear elsewhere in that row or column (pointing), and a digit confined to one square
+  within a row or column cannot appear elsewhere in that square (claiming).
+  Returns: (bool, bool) -> (False on a contradiction, whether any candidate was removed).
+  """
+  def __box_line_reductions__(self) -> tuple:
+    cands, values, g = self.cands, self.values, self.geometry
+    masks = list()
+    for cells in g.segment_cells:
+      m = 0
+      for x in cells:
+        if values[x] == Sudoku.EMPTY_VALUE:
+          m |= cands[x]
+      masks.append(m)
+    changed = False
+    square_siblings, line_siblings = g.segment_square_siblings, g.segment_line_siblings
+    for i, m in enumerate(masks):
+      if not m:
+        continue
+      in_square = in_line = 0
+      for j in square_siblings[i]:
+        in_square |= masks[j]
+      for j in line_siblings[i]:
+        in_line |= masks[j]
+      for confined, rest in ((m & ~in_square, g.segment_line_rest[i]),
+                             (m & ~in_line, g.segment_square_rest[i])):
+        if not confined:
+          continue
+        for x in rest:
+          if cands[x] & confined and values[x] == Sudoku.EMPTY_VALUE:
+            if not self.eliminate(x, confined):
+              return False, changed
+            changed = True
+    return True, changed
+  
+  """
+  Applies all deductions until none of them changes the state any more.
+  Returns: bool -> False if a contradiction was found, True otherwise.
+  """
+  def propagate(self) -> bool:
+    while True:
+      if not self.__naked_singles__():
+        return False
+      ok, changed = self.__hidden_singles__()
+      if not ok:
+        return False
+      if changed or self.pending:
+        continue
+      ok, changed = self.__box_line_reductions__()
+      if not ok:
+        return False
+      if not changed and not self.pending:
+        return True
+  
+  """
+  Returns the unsolved position with the fewest candidates, or -1 if every cell has a value.
+  """
+  def select_cell(self) -> int:
+    best = -1
+    best_count = self.geometry.size + 1
+    for x in self.geometry.positions:
+      if self.values[x] == Sudoku.EMPTY_VALUE:
+        count = bin(self.cands[x]).count("1")
+        if count < best_count:
+          best, best_count = x, count
+          if count == 2:
+            break
+    return best
+  
+  """
+  Depth-first search over the candidates, propagating after every assignment.
+  The branches are kept on an explicit stack of [state, position, untried candidates] frames rather than on
+  the call stack (like BacktrackingSearch), so the depth of the search is not bound by the recursion limit.
+  Params: stats -> optional SolveStats that counts the states visited.
+    depth -> the number of branches taken to reach this state.
+  Returns: a generator of solved CandidateState objects, one per solution of this state.
+  """
+  def search(self, stats: SolveStats = None, depth: int = 0):
+    propagate, select_cell = CandidateState.propagate, CandidateState.select_cell
+    if stats is not None:
+      propagate = stats.timed("propagation", propagate)
+      select_cell = stats.timed("candidate selection", select_cell)
+    stack = list()
+    state = self
+    while True:
+      if stats is not None:
+        stats.visit(depth + len(stack))
+      if not propagate(state):
+        if stats is not None:
+          stats.backtracks += 1
+      else:
+        x = select_cell(state)
+        if x < 0:
+          yield state
+        else:
+          stack.append([state, x, state.cands[x]])
+      # Move on to the next candidate of the deepest open branch
+      state = None
+      while stack and state is None:
+        frame = stack[-1]
+        parent, x, m = frame
+        if not m:
+          stack.pop()
+          continue
+        bit = m & -m
+        frame[2] = m ^ bit
+        child = parent.copy()
+        if stats is not None:
+          stats.checks += 1
+        if child.assign(x, bit.bit_length() - 1):
+          state = child
+        elif stats is not None:
+          stats.backtracks += 1
+      if state is None:
+        return
+
+
+
+""" Technique Grader
+Rates a puzzle by the logical techniques a person needs to solve it. The grader works on the same candidate
+bitsets as CandidateState, and at every step applies the cheapest technique of TECHNIQUES that makes progress,
+starting over from the cheapest after each one, so that every technique it records was actually needed.
+When none of them applies, the rest of the puzzle needs "search" (trial and error, or techniques beyond chains).
+The difficulty score is the weight of the hardest technique used (as in Sudoku Explainer, whose weights these
+follow), and DIFFICULTY_LEVELS names score ranges.
+Params: values -> the cell values of the puzzle, in absolute position order (see parse_puzzle).
+  geometry -> the BoardGeometry of the puzzle. Defaults to the 9x9 board.
+"""
+class TechniqueGrader:
+  
+  # (name, weight, method, subset or fish size), in cost order
+  TECHNIQUES = [
+    ("hidden single", 1.2, "__hidden_singles__", None),
+    ("naked single", 2.3, "__naked_singles__", None),
+    ("pointing/claiming", 2.6, "__locked_candidates__", None),
+    ("naked pair", 3.0, "__naked_subsets__", 2),
+    ("x-wing", 3.2, "__fish__", 2),
+    ("hidden pair", 3.4, "__hidden_subsets__", 2),
+    ("naked triple", 3.6, "__naked_subsets__", 3),
+    ("swordfish", 3.8, "__fish__", 3),
+    ("hidden triple", 4.0, "__hidden_subsets__", 3),
+    ("chains", 4.5, "__coloring__", None),
+  ]
+  SEARCH_WEIGHT = 10.0
+  # (highest score, level), in increasing order
+  DIFFICULTY_LEVELS = [(2.3, "easy"), (3.4, "medium"), (4.0, "hard"), (4.5, "expert"), (SEARCH_WEIGHT, "extreme")]
+  
+  def __init__(self, values: list, geometry: BoardGeometry = GEOMETRY):
+    self.geometry = geometry
+    self.state = CandidateState(geometry=geometry)
+    self.consistent = all(v == Sudoku.EMPTY_VALUE or (0 < v <= geometry.size and self.state.assign(x, v))
+                          for x, v in enumerate(values))
+    self.state.pending.clear() # the grader finds its own singles
+  
+  """ Grade
+  Solves the puzzle with logical techniques only, recording each technique used.
+  Returns: dict -> "score" (None if the puzzle contradicts itself), "level" ("invalid" if it does), "techniques"
+    (the number of times each technique was applied, in cost order), and "solved" (whether the techniques
+    alone solved the puzzle, without search).
+  """
+  def grade(self) -> dict:
+    used = dict()
+    consistent = self.consistent
+    values = self.state.values
+    while consistent and Sudoku.EMPTY_VALUE in values:
+      for name, weight, method, size in TechniqueGrader.TECHNIQUES:
+        progress = getattr(self, method)(size)
+        self.state.pending.clear()
+        if progress is None:
+          consistent = False
+          break
+        if progress:
+          used[name] = used.get(name, 0) + progress
+          break
+      else:
+        used["search"] = 1
+        break
+    if not consistent:
+      return {"score": None, "level": "invalid", "techniques": used, "solved": False}
+    weights = {name: weight for name, weight, _, _ in TechniqueGrader.TECHNIQUES}
+    score = max((weights.get(name, TechniqueGrader.SEARCH_WEIGHT) for name in used), default=0.0)
+    level = next(level for top, level in TechniqueGrader.DIFFICULTY_LEVELS if score <= top)
+    return {"score": score, "level": level, "techniques": used, "solved": "search" not in used}
+  
+  """
+  The techniques below apply one step each, and return the number of placements or eliminations made
+  (0 if the technique does not apply), or None if they reveal a contradiction.
+  """
+  def __hidden_singles__(self, _) -> int:
+    cands, values = self.state.cands, self.state.values
+    count = 0
+    for unit in self.geometry.units:
+      once = twice = placed = 0
+      for x in unit:
+        m = cands[x]
+        twice |= once & m
+        once |= m
+        if values[x]:
+          placed |= m
+      if once != self.geometry.all_digits: # some digit can no longer be placed in this unit
+        return None
+      hidden = once & ~twice & ~placed
+      if hidden:
+        bit = hidden & -hidden
+        x = next(x for x in unit if cands[x] & bit)
+        if not self.state.assign(x, bit.bit_length() - 1):
+          return None
+        count += 1
+    return count
+  
+  def __naked_singles__(self, _) -> int:
+    cands, values = self.state.cands, self.state.values
+    count = 0
+    for x in self.geometry.positions:
+      m = cands[x]
+      if values[x] == Sudoku.EMPTY_VALUE and m & (m - 1) == 0:
+        if not m or not self.state.assign(x, m.bit_length() - 1):
+          return None
+        count += 1
+    return count
+  
+  def __locked_candidates__(self, _) -> int:
+    ok, changed = self.state.__box_line_reductions__()
+    return None if not ok else int(changed)
+  
+  """
+  Naked pairs and triples: size cells of a unit whose candidates together are size digits
+  take those digits, which are removed from the other cells of the unit.
+  """
+  def __naked_subsets__(self, size: int) -> int:
+    cands, values = self.state.cands, self.state.values
+    for unit in self.geometry.units:
+      empties = [x for x in unit if values[x] == Sudoku.EMPTY_VALUE]
+      if len(empties) <= size:
+        continue
+      small = [x for x in empties if bin(cands[x]).count("1") <= size]
+      for subset in combinations(small, size):
+        m = 0
+        for x in subset:
+          m |= cands[x]
+        if bin(m).count("1") != size:
+          continue
+        eliminated = 0
+        for x in empties:
+          if x not in subset and cands[x] & m:
+            if not self.state.eliminate(x, m):
+              return None
+            eliminated += 1
+        if eliminated:
+          return eliminated
+    return 0
+  
+  """
+  Hidden pairs and triples: size digits of a unit whose possible cells together are size cells
+  take those cells, so every other digit is removed from them.
+  """
+  def __hidden_subsets__(self, size: int) -> int:
+    cands, values = self.state.cands, self.state.values
+    for unit in self.geometry.units:
+      placed = 0
+      for x in unit:
+        if values[x]:
+          placed |= cands[x]
+      spots = dict() # digit bit -> bitmask of its possible indices in the unit
+      for i, x in enumerate(unit):
+        m = cands[x] & ~placed if values[x] == Sudoku.EMPTY_VALUE else 0
+        while m:
+          bit = m & -m
+          m ^= bit
+          spots[bit] = spots.get(bit, 0) | 1 << i
+      small = [bit for bit, where in spots.items() if bin(where).count("1") <= size]
+      for subset in combinations(small, size):
+        where = digits = 0
+        for bit in subset:
+          where |= spots[bit]
+          digits |= bit
+        if bin(where).count("1") != size:
+          continue
+        eliminated = 0
+        for i, x in enumerate(unit):
+          if where >> i & 1 and cands[x] & ~digits:
+            self.state.eliminate(x, ~digits)
+            eliminated += 1
+        if eliminated:
+          return eliminated
+    return 0
+  
+  """
+  X-Wings (size 2) and Swordfish (size 3): when a digit's possible cells in size rows all lie in the same
+  size columns, the digit is removed from the rest of those columns, and the same with rows and columns swapped.
+  """
+  def __fish__(self, size: int) -> int:
+    g = self.geometry
+    cands, values = self.state.cands, self.state.values
+    for digit in g.legal_values:
+      bit = 1 << digit
+      for base, cover in ((g.unit_rows, g.unit_cols), (g.unit_cols, g.unit_rows)):
+        lines = list()
+        for li, line in enumerate(base):
+          m = 0
+          for i, x in enumerate(line):
+            if cands[x] & bit and values[x] == Sudoku.EMPTY_VALUE:
+              m |= 1 << i
+          if 2 <= bin(m).count("1") <= size:
+            lines.append((li, m))
+        for subset in combinations(lines, size):
+          m = 0
+          for _, where in subset:
+            m |= where
+          if bin(m).count("1") != size:
+            continue
+          rows = {li for li, _ in subset}
+          eliminated = 0
+          for i in range(g.size):
+            if not m >> i & 1:
+              continue
+            for j, x in enumerate(cover[i]):
+              if j not in rows and cands[x] & bit and values[x] == Sudoku.EMPTY_VALUE:
+                if not self.state.eliminate(x, bit):
+                  return None
+                eliminated += 1
+          if eliminated:
+            return eliminated
+    return 0
+  
+  """
+  Single-digit chains (simple coloring): the cells where a digit has only two possible places in a unit
+  are linked, and exactly one end of every link holds the digit. Coloring each chain of links in two
+  alternating colors, the digit is removed from any cell that sees both colors of a chain, and from every
+  cell of a color that has two cells seeing each other.
+  """
+  def __coloring__(self, _) -> int:
+    g = self.geometry
+    cands, values = self.state.cands, self.state.values
+    for digit in g.legal_values:
+      bit = 1 << digit
+      links = dict()
+      for unit in g.units:
+        where = [x for x in unit if cands[x] & bit and values[x] == Sudoku.EMPTY_VALUE]
+        if len(where) == 2:
+          a, b = where
+          links.setdefault(a, set()).add(b)
+          links.setdefault(b, set()).add(a)
+      color = dict()
+      for start in links:
+        if start in color:
+          continue
+        color[start] = 0
+        chain = [start]
+        for x in chain:
+          for y in links[x]:
+            if y not in color:
+              color[y] = 1 - color[x]
+              chain.append(y)
+        if len(chain) < 3:
+          continue
+        in_chain = set(chain)
+        sides = ([x for x in chain if color[x] == 0], [x for x in chain if color[x] == 1])
+        targets = set()
+        for side in sides:
+          seen = set(side)
+          if any(p in seen for x in side for p in g.peers[x]):
+            targets.update(side) # color wrap: this color cannot hold the digit
+        if not targets:
+          seen = [set(), set()]
+          for k, side in enumerate(sides):
+            for x in side:
+              seen[k].update(g.peers[x])
+          targets = (seen[0] & seen[1]) - in_chain # color trap
+        eliminated = 0
+        for x in targets:
+          if cands[x] & bit and values[x] == Sudoku.EMPTY_VALUE:
+            if not self.state.eliminate(x, bit):
+              return None
+            eliminated += 1
+        if eliminated:
+          return eliminated
+    return 0
+
+
+""" Dancing Links
+Knuth's Algorithm X over a sparse exact-cover matrix stored as dancing links.
+Nodes live in parallel lists (left, right, up, down, column) instead of objects; node 0 is the
+root and nodes 1 to n are the column headers. Rows are added with add_row and identified by
+the caller's row id, which is what solutions() reports back.
+"""
+class DancingLinks:
+  
+  def __init__(self, columns: int):
+    n = columns
+    self.L = [i - 1 for i in range(n + 1)]
+    self.L[0] = n
+    self.R = [i + 1 for i in range(n + 1)]
+    self.R[n] = 0
+    self.U = list(range(n + 1))
+    self.D = list(range(n + 1))
+    self.C = list(range(n + 1))
+    self.S = [0] * (n + 1) # number of nodes in each column
+    self.row_of = [-1] * (n + 1)
+    self.row_start = dict()
+  
+  """
+  Adds a row to the matrix.
+  Params: row_id -> any hashable identifier for the row.
+    columns -> the (0-based) columns in which this row has a 1.
+  """
+  def add_row(self, row_id, columns: list):
+    first = None
+    for col in columns:
+      h = col + 1
+      node = len(self.L)
+      self.C.append(h)
+      self.row_of.append(row_id)
+      self.U.append(self.U[h])
+      self.D.append(h)
+      self.D[self.U[h]] = node
+      self.U[h] = node
+      self.S[h] += 1
+      if first is None:
+        first = node
+        self.L.append(node)
+        self.R.append(node)
+      else:
+        self.L.append(self.L[first])
+        self.R.append(first)
+        self.R[self.L[first]] = node
+        self.L[first] = node
+    self.row_start[row_id] = first
+  
+  def copy(self):
+    other = DancingLinks.__new__(DancingLinks)
+    other.L, other.R, other.U, other.D = self.L[:], self.R[:], self.U[:], self.D[:]
+    other.C, other.S = self.C, self.S[:]
+    other.row_of, other.row_start = self.row_of, self.row_start
+    return other
+  
+  def __cover__(self, c: int):
+    L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+    R[L[c]] = R[c]
+    L[R[c]] = L[c]
+    i = D[c]
+    while i != c:
+      j = R[i]
+      while j != i:
+        D[U[j]] = D[j]
+        U[D[j]] = U[j]
+        S[C[j]] -= 1
+        j = R[j]
+      i = D[i]
+  
+  def __uncover__(self, c: int):
+    L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+    i = U[c]
+    while i != c:
+      j = L[i]
+      while j != i:
+        S[C[j]] += 1
+        D[U[j]] = j
+        U[D[j]] = j
+        j = L[j]
+      i = U[i]
+    R[L[c]] = c
+    L[R[c]] = c
+  
+  """
+  Forces a row into every solution by covering all of its columns, as is done for the clues of a puzzle.
+  Returns: bool -> False if the row conflicts with a row selected before it, True otherwise.
+  """
+  def select(self, row_id) -> bool:
+    first = self.row_start[row_id]
+    node = first
+    while True:
+      h = self.C[node]
+      if self.R[self.L[h]] != h: # column already covered
+        return False
+      node = self.R[node]
+      if node == first:
+        break
+    while True:
+      self.__cover__(self.C[node])
+      node = self.R[node]
+      if node == first:
+        return True
+  
+  """
+  Enumerates exact covers of the remaining columns, always branching on the column with the fewest rows.
+  The columns branched on and the rows chosen in them are kept on explicit stacks rather than on the call
+  stack, so the depth of the search is not bound by the recursion limit.
+  Params: stats -> optional SolveStats that counts the columns branched on.
+  Returns: a generator of lists of row ids, one list per solution.
+  The matrix is restored to its previous state once the generator is exhausted.
+  """
+  def solutions(self, stats: SolveStats = None):
+    L, R, D, C, S = self.L, self.R, self.D, self.C, self.S
+    columns = list() # the columns branched on
+    chosen = list() # the row chosen in each of them, but the last one while its next row is looked for
+    
+    def search():
+      while True:
+        if stats is not None:
+          stats.visit(len(chosen))
+        r = None
+        if R[0] == 0:
+          yield [self.row_of[node] for node in chosen]
+        else:
+          c = R[0]
+          best = c
+          while c != 0:
+            if S[c] < S[best]:
+              best = c
+              if S[c] < 2:
+                break
+            c = R[c]
+          if S[best] == 0:
+            if stats is not None:
+              stats.backtracks += 1
+          else:
+            self.__cover__(best)
+            columns.append(best)
+            r = D[best]
+        # Find the next row to try, leaving the columns whose rows have all been tried
+        while True:
+          if r is None:
+            if not columns:
+              return
+            r = chosen.pop()
+            j = L[r]
+            while j != r:
+              self.__uncover__(C[j])
+              j = L[j]
+            r = D[r]
+          if r != columns[-1]:
+            break
+          self.__uncover__(columns.pop())
+          r = None
+        if stats is not None:
+          stats.checks += 1
+        chosen.append(r)
+        j = R[r]
+        while j != r:
+          self.__cover__(C[j])
+          j = R[j]
+    
+    return search()
+
+
+EXACT_COVER_COLUMNS = 324 # cell, row-digit, column-digit, and square-digit constraints of a 9x9 board
+
+""" Sudoku Exact Cover
+Returns a fresh DancingLinks matrix for an empty board of the given geometry. On a 9x9 board, it has
+729 rows (one per cell and digit, with row id 9 * position + digit - 1) over the 324 constraint columns;
+in general, size ** 3 rows (row id size * position + digit - 1) over 4 * size ** 2 columns.
+The matrix is built once per geometry and copied on later calls.
+"""
+def sudoku_exact_cover(geometry: BoardGeometry = GEOMETRY) -> DancingLinks:
+  if geometry.exact_cover is None:
+    n = geometry.size
+    dlx = DancingLinks(4 * n * n)
+    for x in geometry.positions:
+      row, col, s = geometry.row_of_pos[x], geometry.col_of_pos[x], geometry.square_of_pos[x]
+      for d in range(n):
+        dlx.add_row(n * x + d, [x, n * (n + row) + d, n * (2 * n + col) + d, n * (3 * n + s) + d])
+    geometry.exact_cover = dlx
+  return geometry.exact_cover.copy()
 
 
 class Sudoku:
@@ -22,41 +1362,118 @@ class Sudoku:
   LEGAL_VALUES = [i for i in range(1, 10)]
   UNIQUES = np.unique(LEGAL_VALUES)
   EMPTY_VALUE = 0
+  SOLVE_STRATEGIES = {
+    "backtracking": "__solve_backtracking__",
+    "propagation": "__solve_propagation__",
+    "dlx": "__solve_dlx__",
+  }
 
   """
   Initializes the Sudoku class object.
   No parameters will generate a board with 17 clues.
+  Key 'box' sets the size of the board's squares: 3 (the default) for a 9x9 board,
+  2 for 4x4, 4 for 16x16, or 5 for 25x25. It applies to all of the keys below.
   Key 'filename' will initialize the board from a given text file.
-  Key 'generate' will generate a board with the given number of clues.
+  Key 'puzzle' will initialize the board from a string of 81 digits, organized by row
+  (size * size symbols on other boards, see SYMBOLS).
+  Key 'generate' will generate a board with the given number of clues,
+  with optional keys 'seed' and 'timeout' passed on to generate_board.
   Key 'test' will create an "empty board", which is a board with only '0's.
   """
   def __init__(self, **kwargs):
-    logger.debug("Initializing Sudoku board")
-    if len(kwargs) > 0: # If keyword arguments were provided
-      logger.debug("  Initialization keyword arguments (expecting %s):", len(kwargs))
-      if logger.getEffectiveLevel() <= logging.DEBUG:
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug("Initializing Sudoku board")
+      if len(kwargs) > 0: # If keyword arguments were provided
+        logger.debug("  Initialization keyword arguments (expecting %s):", len(kwargs))
         for key, value in kwargs.items():
           logger.debug("\t%s : %s", key, value)
 #    self.board = self.init_board()
 #    self.clear_board()
-    self.board = np.zeros((9, 3, 3), dtype=int)
+    self.__init_cells__(box=kwargs.get("box", 3))
     if "filename" in kwargs.keys():
       self.init_from_file(kwargs["filename"])
+    elif "puzzle" in kwargs.keys():
+      self.init_from_string(kwargs["puzzle"])
     elif "generate" in kwargs.keys():
-      self.generate_board(int(kwargs["generate"]))
+      self.generate_board(int(kwargs["generate"]), seed=kwargs.get("seed"), timeout=kwargs.get("timeout"))
     else:
       self.generate_board()
   
   """
-  Compares Sudoku boards for equality.
-  Returns: True if all values in self's board are equal to all corresponding values in other's board,
-  False otherwise.
+  Allocates the flat board buffer and the views onto it.
+  self.geometry is the BoardGeometry for the given box size.
+  self.cells is a bytearray of 81 cells (size * size in general) in square-major order (see CELL_OF_POS), and
+  self.board is a (9, 3, 3) (in general (size, box, box)) uint8 numpy view of the same memory,
+  so writes through either are shared.
   """
-  def __eq__(self, other) -> bool:
-    return (self.board == other.board).all()
-      
+  def __init_cells__(self, cells: bytes = None, box: int = 3):
+    g = self.geometry = geometry(box)
+    self.cells = bytearray(cells) if cells is not None else bytearray(g.cell_count)
+    if len(self.cells) != g.cell_count:
+      raise ValueError(f"Expected {g.cell_count} cells for box size {box}, got {len(self.cells)}")
+    self._board = np.frombuffer(self.cells, dtype=np.uint8).reshape(g.size, box, box)
+    self._bands = self._board.reshape(box, box, box, box) # (square row, square col, row, col)
+  
+  @property
+  def board(self) -> np.ndarray:
+    return self._board
+  
+  @board.setter
+  def board(self, values):
+    self._board[...] = values
+  
+  def __getstate__(self) -> dict:
+    return {"cells": bytes(self.cells), "box": self.geometry.box}
+  
+  def __setstate__(self, state: dict):
+    self.__init_cells__(state["cells"], state.get("box", 3))
+  
   """
-  Combines the provided list of digits into one integer.
+  Returns a new Sudoku object with a copy of this board.
+  """
+  def copy(self):
+    other = Sudoku.__new__(Sudoku)
+    other.__init_cells__(self.cells, self.geometry.box)
+    return other
+  
+  """
+  Returns the current cell values as an immutable bytes object, to be passed to restore() later.
+  """
+  def snapshot(self) -> bytes:
+    return bytes(self.cells)
+  
+  """
+  Restores the cell values saved by snapshot(), without reallocating the board.
+  """
+  def restore(self, snapshot: bytes):
+    self.cells[:] = snapshot
+  
+  """
+  Zero-copy views of a row, column, or square of the board, each as a 3x3 (box x box) uint8 array.
+  A row view is organized by square then column, and a column view by square then row,
+  so that view.flatten() lists the cells in board order. Writes to a view change the board.
+  """
+  def row_view(self, row: int) -> np.ndarray:
+    b = self.geometry.box
+    return self._bands[row // b, :, row % b, :]
+  
+  def col_view(self, col: int) -> np.ndarray:
+    b = self.geometry.box
+    return self._bands[:, col // b, :, col % b]
+  
+  def square_view(self, s: int) -> np.ndarray:
+    return self._board[s]
+  
+  """
+  Compares Sudoku boards for equality.
+  Returns: True if all values in self's board are equal to all corresponding values in other's board,
+  False otherwise.
+  """
+  def __eq__(self, other) -> bool:
+    return self.board.shape == other.board.shape and (self.board == other.board).all()
+      
+  """
+  Combines the provided list of digits into one integer.
   Utility function used in validating a solved Sudoku board.
   """
   def __combine_digits__(self, digits: list) -> int:
@@ -64,7 +1481,7 @@ class Sudoku:
       return None
     if len(digits) == 1:
       return digits[0]
-    d = digits
+    d = [int(digit) for digit in digits]
     factor = 10
     value = d[-1]
     for i in range(len(digits)-2, -1, -1):
@@ -88,9 +1505,7 @@ class Sudoku:
     return board
   
   def clear_board(self):
-    def f(s, r, c):
-      self.board[s][r][c] = 0
-    self.loop_rows(f)
+    self.cells[:] = bytes(len(self.cells))
   
   #print(board)
   
@@ -118,404 +1533,1977 @@ class Sudoku:
 #            return False
 #    return True
   
-  def __collect_row_into_list__(self, row: int) -> list:
-    r = row % 3
-    s = 0 # first row of squares
-    L = list()
-    if row > 5: # last row of squares
-      s = 6
-    elif row > 2: # middle row of squares
-      s = 3
-    for j in range(9): # go through columns in row
-      c = j % 3
-      if j % 3 == 0 and j != 0: # if we should be in the next square
-        s += 1
-      L.append(self.board[s][r][c])
-    return L
+  def __collect_row_into_list__(self, row: int) -> list:
+    return [self.cells[i] for i in self.geometry.row_cells[row]]
+  
+  def __collect_col_into_list__(self, col: int) -> list:
+    return [self.cells[i] for i in self.geometry.col_cells[col]]
+  
+  def __values_are_valid__(self, values: list) -> bool:
+    for i in range(len(values)):
+      if values[i] in self.geometry.legal_values or values[i] == Sudoku.EMPTY_VALUE:
+        if values.count(values[i]) > 1:
+          if values[i] != Sudoku.EMPTY_VALUE:
+            return False
+      else:
+        return False
+    return True
+  
+  """
+  Returns True if no unit of the given units (lists of cell indices into self.cells)
+  repeats a digit or holds an illegal value, False otherwise.
+  Digits seen in a unit are tracked in a bitmask, so no lists are built.
+  """
+  def __units_are_valid__(self, units: list) -> bool:
+    cells = self.cells
+    size = self.geometry.size
+    for unit in units:
+      seen = 0
+      for i in unit:
+        val = cells[i]
+        if val == Sudoku.EMPTY_VALUE:
+          continue
+        bit = 1 << val
+        if val > size or seen & bit:
+          return False
+        seen |= bit
+    return True
+  
+  def __rows_are_valid__(self) -> bool:
+    return self.__units_are_valid__(self.geometry.row_cells)
+    
+  def __cols_are_valid__(self) -> bool:
+    return self.__units_are_valid__(self.geometry.col_cells)
+  
+  def __squares_are_valid__(self) -> bool:
+    return self.__units_are_valid__(self.geometry.square_cells)
+  
+  """ Is Valid
+  Returns: bool -> True if the rows, columns, and 3x3 squares are in a valid state,
+    False otherwise.
+  """
+  def __is_valid__(self) -> bool:
+    return (self.__rows_are_valid__() 
+            and self.__cols_are_valid__() 
+            and self.__squares_are_valid__())
+  
+#  def check_value(self, val, s, row, col) -> bool:
+#    return self.check_row(val, s, row, col) and self.check_col(val, s, row, col) and self.check_square(val, s, row, col)
+
+  """
+  Returns a string representation of the current state of the Sudoku board.
+  """
+  def to_string(self) -> str:
+    b = self.geometry.box
+    board_str = ""
+    for k in range(0, b * b, b):
+      for r in range(0, b):
+        for s in range(k, k+b):
+          board_str += str(self.board[s][r]) + ' '
+        board_str += '\n'
+      board_str += '\n'
+    return board_str
+  
+  """
+  Returns the board as a single line of 81 digits, organized by row,
+  the format used for each puzzle of a batch file. Larger boards use the letters of SYMBOLS after 9.
+  """
+  def to_line(self) -> str:
+    cells = self.cells
+    return "".join([SYMBOLS[cells[i]] for i in self.geometry.cell_of_pos])
+  
+  """
+  Writes the contents of this Sudoku board to a text file,
+  using the same format as used to initialize a new board from a file.
+  Params: filename - a string. The Sudoku board will be written to this file.
+  """
+  def to_file(self, filename: str):
+    with open(filename, "w") as f:
+      for row in self.geometry.row_cells:
+        f.write("".join([SYMBOLS[self.cells[i]] for i in row]))
+        f.write("\n")
+        
+    
+  """
+  Returns True if the given Sudoku square (or 3x3 block) is solved, False otherwise.
+  Solved is defined as each cell containing a unique integer in the interval [1,9] ([1,size] in general).
+  """
+  def square_is_solved(self, s) -> bool:
+    uniques = Sudoku.UNIQUES if self.geometry is GEOMETRY else np.unique(self.geometry.legal_values)
+    unique_square = np.unique(self.board[s])
+    return (np.shape(unique_square) == np.shape(uniques) 
+            and np.all(np.equal(unique_square, uniques)))
+  
+  """
+  Returns True if all nine squares of the Sudoku board are solved, False otherwise.
+  """
+  def squares_are_solved(self) -> bool:
+    if not self.__squares_are_valid__():
+      return False
+    for i in range(self.geometry.size):
+      if not self.square_is_solved(i):
+        return False
+    return True
+  
+  """
+  Returns True if the Sudoku board is solved, False otherwise.
+  To be solved, the board must both be in a valid state and have no empty spaces.
+  Note: An empty space is represented by a '0', the EMPTY_VALUE constant.
+  """
+  def board_is_solved(self) -> bool:
+    valid = self.__rows_are_valid__() and self.__cols_are_valid__()
+    solved = self.squares_are_solved() and self.board.all()
+    return valid and solved
+  
+  def board_is_solved_two(self) -> bool:
+    return (self.__rows_are_valid__() 
+            and self.__cols_are_valid__() 
+            and self.squares_are_solved() 
+            and self.board.all())
+  
+  """
+  Applies the given function, f, to each cell in the board, traversing across rows.
+  Params: f, the function to apply to the given cell, and any keyword arguments to be passed into f.
+  """
+  def loop_rows(self, f, **kwargs):
+    for s, r, c in self.geometry.pos_to_indices: # square, row, column
+      # do stuff with position [s][r][c]
+      f(s, r, c, **kwargs)
+
+  def init_test_junk_board(self):
+    def gen():
+      i = 0
+      while True:
+        yield i
+        i += 1
+    it = gen()
+    def f(s, r, c):
+      self.board[s][r][c] = next(it)
+    
+    self.loop_rows(f)
+    print(self.to_string())
+  
+  """
+  Initializes the Sudoku board from a file.
+  The expected file format is 9 lines of 9 unseparated integers, organized by row
+  (size lines of size symbols on other boards, see SYMBOLS), with 0 or . for empty cells.
+  However, as white space is removed, the integers may be separated without causing an error.
+  Lines starting with '#' are skipped, and the file is only read up to the end of the board,
+  so the first puzzle of a batch puzzle file can be read as well.
+  Raises: ValueError if the file does not hold a valid board.
+  """
+  def init_from_file(self, filename: str):
+    lines = list()
+    count = 0
+    with open(filename, "r") as f:
+      for line in f:
+        if line.lstrip().startswith("#"):
+          continue
+        line = "".join(line.split())
+        lines.append(line)
+        count += len(line)
+        if count >= self.geometry.cell_count:
+          break
+    self.init_from_string("".join(lines))
+  
+  """
+  Initializes the Sudoku board from a string of 81 digits, organized by row,
+  such as one line of a batch puzzle file, with 0 or . for empty cells. White space is removed before reading.
+  Boards larger than 9x9 write the digits from 10 up as letters (see SYMBOLS).
+  Raises: ValueError if the string does not hold a valid board (see parse_puzzle).
+  """
+  def init_from_string(self, puzzle: str):
+    self.__write_values__(parse_puzzle(puzzle, self.geometry))
+  
+  """ Position to Indices
+  Maps an absolute position on a 9x9 board to the three indices used in self.board
+  (see BoardGeometry.pos_to_indices for other sizes).
+  Params: An integer representing the absolute position on the board.
+  Returns: Three integers, s, r, c, representing the square, row, and column position in self.board.
+  """
+  @staticmethod
+  def pos_to_indices(x: int) -> tuple:
+    return POS_TO_INDICES[x]
+  
+  """ Indices to Position
+  Maps the three indices (square, row, column) to the absolute position on a 9x9 board
+  (see BoardGeometry.indices_to_pos for other sizes).
+  Params: three integers, s, r, c, representing the square, row, and column position in self.board.
+  Returns: An integer representing the absolute position on the board.
+  """
+  @staticmethod
+  def indices_to_pos(s: int, r: int, c: int) -> int:
+    return INDICES_TO_POS[s][r][c]
+    
+  """ Solve Puzzle Backtracking
+  Solves the Sudoku puzzle using backtracking.
+  This is a brute-force method of solving Sudoku.
+  While it should be able to solve every solvable Sudoku puzzle,
+  some puzzles may require a large amount of time to solve,
+  given the large amount of possible solutions.
+  """
+  def solve_puzzle_backtracking(self):
+    start = time.time()
+    self.stats = SolveStats()
+    if self.__solve_backtracking__(self.stats):
+      with self.stats.phase("verify"):
+        solved = self.board_is_solved()
+      if solved:
+        end = time.time()
+        final = end - start
+        print(f"Board is solved (in {final} seconds):")
+        print(self.to_string())
+        logger.info("Board was solved in %s seconds", final)
+        return True
+      else:
+        print("Error: Board is not solved, but check_cell returned True.")
+        print(self.to_string())
+        logger.warning("Board was reported solved, but is not actually solved.")
+        return False
+    else:
+      print(f"Board is not solvable (conclusion reached in {time.time() - start} seconds)")
+      print(self.to_string())
+      logger.info("Board was found to be unsolvable in %s seconds", time.time() - start)
+      return False
+  
+  """ Solve Backtracking
+  Search step of solve_puzzle_backtracking. Fills self.board in place, trying the values of every empty
+  cell in ascending order, cell by cell across the rows (see BacktrackingSearch).
+  Params: stats -> SolveStats that counts the empty cells visited and the values tried.
+  Returns: bool -> True if a solution was written to the board, False otherwise.
+  """
+  def __solve_backtracking__(self, stats: SolveStats) -> bool:
+    g = self.geometry
+    with stats.phase("parse"):
+      state = ConstraintState(g)
+      with stats.section("validation"):
+        if not state.load(self.board):
+          return False
+      empties = [x for x in g.positions if self.cells[g.cell_of_pos[x]] == Sudoku.EMPTY_VALUE]
+    with stats.phase("search"):
+      solved = BacktrackingSearch(self.cells, empties, state, stats=stats).run() == BacktrackingSearch.SOLVED
+    if solved:
+      logger.info("Solution has been found for this board.")
+    return solved
+  
+  """ Solve Propagation
+  Search step of the "propagation" strategy. Reduces the candidates of every cell with
+  naked singles, hidden singles, and box/line reductions, and only branches, on the cell
+  with the fewest candidates, once no more deductions can be made.
+  Params: stats -> SolveStats that counts the candidate states explored.
+  Returns: bool -> True if a solution was written to the board, False otherwise.
+  """
+  def __solve_propagation__(self, stats: SolveStats) -> bool:
+    with stats.phase("parse"):
+      state = CandidateState.from_board(self.board, self.geometry)
+    if state is None:
+      return False
+    with stats.phase("propagate"):
+      consistent = state.propagate()
+    if not consistent:
+      return False
+    with stats.phase("search"):
+      for solution in state.search(stats):
+        self.__write_values__(solution.values)
+        return True
+    return False
+  
+  """ Solve DLX
+  Search step of the "dlx" strategy, which solves the board as an exact cover problem with Dancing Links.
+  Params: stats -> SolveStats that counts the columns branched on.
+  Returns: bool -> True if a solution was written to the board, False otherwise.
+  """
+  def __solve_dlx__(self, stats: SolveStats) -> bool:
+    solutions = self.iter_solutions(limit=1, stats=stats)
+    with stats.phase("search"):
+      for board in solutions:
+        self.board[:] = board
+        return True
+    return False
+  
+  """ Iterate Solutions
+  Enumerates the solutions of the board with Dancing Links (Algorithm X), without modifying self.board.
+  Params: limit -> stop after this many solutions. Defaults to None, which enumerates all of them.
+    stats -> optional SolveStats that counts the columns branched on.
+  Returns: a generator of (9, 3, 3) numpy arrays (in general (size, box, box)), one per solution.
+  """
+  def iter_solutions(self, limit: int = None, stats: SolveStats = None):
+    g = self.geometry
+    n = g.size
+    with stats.phase("parse") if stats is not None else nullcontext():
+      dlx = sudoku_exact_cover(g)
+      consistent = True
+      for x in g.positions:
+        val = self.cells[g.cell_of_pos[x]]
+        if val == Sudoku.EMPTY_VALUE:
+          continue
+        if not 0 < val <= n or not dlx.select(n * x + val - 1):
+          consistent = False
+          break
+    
+    def solutions():
+      if not consistent:
+        return
+      found = 0
+      for rows in dlx.solutions(stats):
+        cells = bytearray(self.cells)
+        for row_id in rows:
+          cells[g.cell_of_pos[row_id // n]] = row_id % n + 1
+        yield np.frombuffer(cells, dtype=np.uint8).reshape(self.board.shape)
+        found += 1
+        if limit is not None and found >= limit:
+          return
+    
+    return solutions()
+  
+  """
+  Writes a list of 81 values (size * size in general), in absolute position order, into self.board.
+  """
+  def __write_values__(self, values: list):
+    for x in self.geometry.positions:
+      self.cells[self.geometry.cell_of_pos[x]] = values[x]
+  
+  """ Solve
+  Solves the Sudoku puzzle in place using the given strategy. Unlike solve_puzzle_backtracking,
+  nothing is printed; the outcome is only logged.
+  Params: strategy -> the name of a solving strategy, one of the keys of Sudoku.SOLVE_STRATEGIES.
+    "backtracking" tries every value in every cell in order (the same search as solve_puzzle_backtracking).
+    "propagation" deduces values with constraint propagation and branches on the most constrained cell.
+    "dlx" solves the board as an exact cover problem with Dancing Links.
+    progress, progress_interval, trace -> passed on to SolveStats.
+    cache -> optional SolutionCache, consulted before searching (the time spent is the "cache" phase
+      of the stats). Solutions found by the search, and unsolvable puzzles, are added to it.
+    timeout -> the number of seconds the search may take. Defaults to None (no limit).
+    profiler -> optional SolveProfiler, which records the solve as a "solve" section (see SolveProfiler).
+  The SolveStats of the solve are attached to the board as self.stats.
+  Returns: bool -> True if the board is solved, False if it is not solvable.
+  Raises: SolveTimeout if the timeout expires before the search ends. The board is left as it was.
+  """
+  def solve(self, strategy: str = "propagation", progress=None, progress_interval: int = 10000,
+            trace: bool = False, cache=None, timeout: float = None, profiler=None) -> bool:
+    if strategy not in Sudoku.SOLVE_STRATEGIES:
+      raise ValueError(f"Unknown solving strategy '{strategy}', expected one of {list(Sudoku.SOLVE_STRATEGIES)}")
+    if timeout is not None and timeout <= 0:
+      raise SolveTimeout("No time left to solve the board")
+    self.stats = SolveStats(progress, progress_interval, trace, None if timeout is None else time.time() + timeout,
+                            profiler=profiler)
+    if profiler is None:
+      return self.__solve__(strategy, cache)
+    with profiler.section("solve"):
+      return self.__solve__(strategy, cache)
+  
+  """
+  Solving step of solve, recording into self.stats.
+  """
+  def __solve__(self, strategy: str, cache) -> bool:
+    start = time.time()
+    if cache is not None:
+      with self.stats.phase("cache"):
+        puzzle = self.to_line()
+        solution = cache.get(puzzle)
+      if solution is not None:
+        logger.info("Board was found in the solution cache in %s seconds", time.time() - start)
+        if solution == UNSOLVABLE:
+          return False
+        self.init_from_string(solution)
+        return True
+    snapshot = self.snapshot()
+    try:
+      found = getattr(self, Sudoku.SOLVE_STRATEGIES[strategy])(self.stats)
+    except SolveTimeout:
+      self.restore(snapshot)
+      logger.info("Solving with the %s strategy timed out after %s seconds", strategy, time.time() - start)
+      raise
+    if found:
+      with self.stats.phase("verify"), self.stats.section("validation"):
+        solved = self.board_is_solved()
+    if found and not solved:
+      logger.warning("Board was reported solved by the %s strategy, but is not actually solved.", strategy)
+      self.restore(snapshot)
+      return False
+    if cache is not None:
+      cache.put(puzzle, self.to_line() if found else UNSOLVABLE)
+    if found:
+      logger.info("Board was solved with the %s strategy in %s seconds", strategy, time.time() - start)
+    else:
+      logger.info("Board was found to be unsolvable with the %s strategy in %s seconds", strategy, time.time() - start)
+    return found
+  
+  """ Generate Board
+  Generates a Sudoku puzzle with a unique solution.
+  A complete solution is first filled in at random, one cell at a time in row order. Clues are then
+  removed in a random order, and a removal is only kept if the puzzle still has exactly one solution,
+  which the propagation solver checks by counting solutions up to two.
+  Generation stops once n clues remain, once no further clue can be removed, or once the timeout expires;
+  the board always holds a puzzle with a unique solution.
+  Params: n -> An integer representing the target number of clues for this board.
+    Defaults to 17 (the minimum number of clues needed to solve a Sudoku puzzle). Removal usually
+    gets stuck before reaching 17, in which case the board keeps the clues that could not be removed.
+    seed -> seed for the random number generator, so that the same seed produces the same puzzle.
+    Defaults to None (a different puzzle every time).
+    timeout -> the number of seconds to spend removing clues. Defaults to None (no limit).
+    progress, progress_interval, trace -> passed on to SolveStats.
+    profiler -> optional SolveProfiler, which records the generation as a "generate" section (see SolveProfiler).
+  The SolveStats of the generation, including the nodes of every uniqueness check,
+  are attached to the board as self.stats.
+  Return: None
+  """
+  def generate_board(self, n: int = 17, seed: int = None, timeout: float = None, progress=None,
+                     progress_interval: int = 10000, trace: bool = False, profiler=None):
+    self.stats = SolveStats(progress, progress_interval, trace, profiler=profiler)
+    if profiler is None:
+      return self.__generate__(n, seed, timeout)
+    with profiler.section("generate"):
+      return self.__generate__(n, seed, timeout)
+  
+  """
+  Generation step of generate_board, recording into self.stats.
+  """
+  def __generate__(self, n: int, seed: int, timeout: float):
+    rng = Random(seed)
+    start = time.time()
+    g = self.geometry
+    stats = self.stats
+    
+    # Fill every cell with random values, which always succeeds on an empty board. Random fills of large
+    # boards occasionally run into a long dead end, so the search is restarted after a node budget
+    # that grows by a quarter after every restart.
+    with stats.phase("fill"):
+      budget = 3 * g.cell_count // 2
+      while True:
+        self.clear_board()
+        search = BacktrackingSearch(self.cells, g.positions, ConstraintState(g), rng=rng, stats=stats,
+                                    most_constrained=True)
+        if search.run(max_nodes=budget) == BacktrackingSearch.SOLVED:
+          break
+        budget += budget // 4
+    
+    clues = g.cell_count
+    order = list(g.positions)
+    rng.shuffle(order)
+    with stats.phase("remove"):
+      for pos in order:
+        if clues <= n:
+          break
+        if timeout is not None and time.time() - start > timeout:
+          logger.warning("Board generation timed out after %s seconds with %s clues.", timeout, clues)
+          break
+        i = g.cell_of_pos[pos]
+        val = self.cells[i]
+        self.cells[i] = Sudoku.EMPTY_VALUE
+        if self.__count__(2, "propagation", stats) == 1:
+          clues -= 1
+        else:
+          self.cells[i] = val
+    logger.info("Generated a board with %s clues in %s seconds.", clues, time.time() - start)
+  
+  """ Count Solutions
+  Counts the solutions of the board without modifying it.
+  Params: limit -> stop counting once this many solutions have been found. Defaults to None, which counts
+      every solution. limit=2 is enough to tell whether a puzzle has a unique solution.
+    strategy -> the search used to count, one of the keys of Sudoku.SOLVE_STRATEGIES.
+    progress, progress_interval, trace -> passed on to SolveStats.
+  The SolveStats of the search are attached to the board as self.stats.
+  Returns: int -> the number of solutions, at most limit.
+  """
+  def count_solutions(self, limit: int = None, strategy: str = "propagation", progress=None,
+                      progress_interval: int = 10000, trace: bool = False) -> int:
+    if strategy not in Sudoku.SOLVE_STRATEGIES:
+      raise ValueError(f"Unknown solving strategy '{strategy}', expected one of {list(Sudoku.SOLVE_STRATEGIES)}")
+    self.stats = SolveStats(progress, progress_interval, trace)
+    if limit is not None and limit < 1:
+      return 0
+    return self.__count__(limit, strategy, self.stats)
+  
+  """
+  Search step of count_solutions, recording into the given SolveStats.
+  """
+  def __count__(self, limit: int, strategy: str, stats: SolveStats) -> int:
+    if strategy == "backtracking":
+      return self.__count_backtracking__(limit, stats)
+    if strategy == "dlx":
+      solutions = self.iter_solutions(limit=limit, stats=stats)
+      with stats.phase("search"):
+        return sum(1 for _ in solutions)
+    with stats.phase("parse"):
+      state = CandidateState.from_board(self.board, self.geometry)
+    if state is None:
+      return 0
+    with stats.phase("search"):
+      return sum(1 for _ in islice(state.search(stats), limit))
+  
+  """
+  Returns True if the board has exactly one solution, False otherwise.
+  """
+  def has_unique_solution(self) -> bool:
+    return self.count_solutions(limit=2) == 1
+  
+  """
+  Rates the difficulty of the board by the logical techniques needed to solve it (see grade_puzzle).
+  """
+  def grade(self) -> dict:
+    return grade_puzzle(self.to_line(), self.geometry.box)
+  
+  """ Solve Parallel
+  Solves the board in place, splitting its search tree across worker processes (see split_frontier),
+  so that one hard puzzle can use every core. Each subproblem is solved with the given strategy,
+  and the other workers are cancelled as soon as one of them finds a solution.
+  A pool is started for every call, which costs tens of milliseconds: use solve for easy puzzles.
+  Params: workers -> the number of worker processes. Defaults to None, which uses one per CPU.
+    strategy -> the solving strategy of the subproblems, one of the keys of Sudoku.SOLVE_STRATEGIES.
+    split_depth -> the depth of the search tree at which it is split. Defaults to None, which splits it
+      until there are PARALLEL_SPLIT_FACTOR subproblems per worker.
+    timeout -> the number of seconds the search may take. Defaults to None (no limit).
+  The SolveStats of the search, which add up the nodes of every subproblem searched, are attached to the
+  board as self.stats. The split is the "split" phase and the parallel search the "search" phase.
+  Returns: bool -> True if the board is solved, False if it is not solvable.
+  Raises: SolveTimeout if the timeout expires before the search ends. The board is left as it was.
+  """
+  def solve_parallel(self, workers: int = None, strategy: str = "propagation", split_depth: int = None,
+                     timeout: float = None) -> bool:
+    if strategy not in Sudoku.SOLVE_STRATEGIES:
+      raise ValueError(f"Unknown solving strategy '{strategy}', expected one of {list(Sudoku.SOLVE_STRATEGIES)}")
+    start = time.time()
+    self.stats = SolveStats(deadline=None if timeout is None else start + timeout)
+    snapshot = self.snapshot()
+    try:
+      found = self.__search_parallel__(0, workers, strategy, split_depth, self.stats)
+    except SolveTimeout:
+      self.restore(snapshot)
+      logger.info("Parallel solving timed out after %s seconds", time.time() - start)
+      raise
+    if found and not self.board_is_solved():
+      logger.warning("Board was reported solved by the parallel %s search, but is not actually solved.", strategy)
+      self.restore(snapshot)
+      return False
+    logger.info("Board was %s by the parallel %s search in %s seconds", "solved" if found else "found to be unsolvable",
+                strategy, time.time() - start)
+    return bool(found)
+  
+  """ Count Solutions Parallel
+  Counts the solutions of the board without modifying it, splitting its search tree across worker processes
+  like solve_parallel, and adding up the solutions of the subproblems. The remaining workers are
+  cancelled once limit solutions have been found.
+  Params: limit, strategy -> as for count_solutions.
+    workers, split_depth -> as for solve_parallel.
+  Returns: int -> the number of solutions, at most limit.
+  """
+  def count_solutions_parallel(self, limit: int = None, workers: int = None, strategy: str = "propagation",
+                               split_depth: int = None) -> int:
+    if strategy not in Sudoku.SOLVE_STRATEGIES:
+      raise ValueError(f"Unknown solving strategy '{strategy}', expected one of {list(Sudoku.SOLVE_STRATEGIES)}")
+    self.stats = SolveStats()
+    if limit is not None and limit < 1:
+      return 0
+    return self.__search_parallel__(limit, workers, strategy, split_depth, self.stats, count=True)
+  
+  """ Search Parallel
+  Shared driver of solve_parallel and count_solutions_parallel. Splits the search tree, then hands the
+  subproblems to a pool of workers. More subproblems than workers are made so that the pool's shared
+  queue balances the load: a worker whose subproblems turn out to be easy simply takes the next one.
+  Returns: the number of solutions found (at most limit) if count is True; otherwise True if a solution
+    was written to the board, False if there is none.
+  """
+  def __search_parallel__(self, limit: int, workers: int, strategy: str, split_depth: int, stats: SolveStats,
+                          count: bool = False):
+    workers = workers or os.cpu_count() or 1
+    with stats.phase("split"):
+      frontier, solutions = split_frontier(self, None if split_depth is not None else PARALLEL_SPLIT_FACTOR * workers,
+                                           split_depth, stats)
+    if not count and solutions:
+      self.restore(solutions[0])
+      return True
+    found = len(solutions) if count else False
+    if count and limit is not None and found >= limit:
+      return limit
+    if not frontier:
+      return found
+    cancel = multiprocessing.Event()
+    with stats.phase("search"), ProcessPoolExecutor(max_workers=min(workers, len(frontier)), initializer=_init_split_worker,
+                                                    initargs=(cancel,)) as executor:
+      futures = {executor.submit(_search_subproblem, cells, self.geometry.box, strategy, count, limit, stats.deadline): depth
+                 for cells, depth in frontier}
+      try:
+        for future in as_completed(futures):
+          result, substats = future.result()
+          if substats is not None:
+            stats.merge(substats, futures[future])
+          if count:
+            found += result
+            if limit is not None and found >= limit:
+              return limit
+          elif result is not None:
+            self.restore(result)
+            return True
+      finally:
+        # Pending subproblems are dropped, and running ones stop at their next cancellation checkpoint
+        cancel.set()
+        for future in futures:
+          future.cancel()
+    return found
+  
+  """ Count Backtracking
+  Counting version of the backtracking search, run on a copy of the cells so that the board is not modified.
+  """
+  def __count_backtracking__(self, limit: int, stats: SolveStats) -> int:
+    g = self.geometry
+    with stats.phase("parse"):
+      state = ConstraintState(g)
+      with stats.section("validation"):
+        if not state.load(self.board):
+          return 0
+      empties = [x for x in g.positions if self.cells[g.cell_of_pos[x]] == Sudoku.EMPTY_VALUE]
+    search = BacktrackingSearch(bytearray(self.cells), empties, state, stats=stats)
+    count = 0
+    with stats.phase("search"):
+      while (limit is None or count < limit) and search.run() == BacktrackingSearch.SOLVED:
+        count += 1
+    return count
+      
+
+UNSOLVABLE = "unsolvable"
+
+""" Write Atomically
+Replaces the file at path with the given data, so that a reader (or a process restarted after a crash) sees either
+the old file or the new one, never a partly written one: the data is written and flushed to a temporary file
+in the same directory first, which is then renamed over path.
+"""
+def _write_atomically(path: str, data: bytes):
+  directory = os.path.dirname(os.path.abspath(path))
+  temp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+  try:
+    with open(temp, "wb") as f:
+      f.write(data)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(temp, path)
+  except BaseException:
+    if os.path.exists(temp):
+      os.remove(temp)
+    raise
+
+""" Resumable Search
+Counts (or enumerates) the solutions of a board with BacktrackingSearch, saving its state to a checkpoint file
+every interval seconds, so that a long exhaustive count that is killed or preempted can continue exactly where
+it stopped instead of starting over. The search runs in slices of CHECKPOINT_SLICE nodes and only looks at the
+clock between slices, so checkpointing costs nothing measurable between saves, and a save (a small JSON file,
+written atomically) happens at most once per interval.
+The checkpoint holds the original puzzle, the current board, the stack of candidates still to try at every
+filled position, the solutions found so far (the first keep of them), and the SolveStats counters.
+Params: board -> the Sudoku board to search. It is not modified.
+  path -> the checkpoint file. Use ResumableSearch.resume(path) to continue a search from it.
+  limit -> stop once this many solutions have been found. Defaults to None (count them all); 1 solves the board.
+  interval -> the number of seconds between checkpoints.
+  keep -> the number of solutions kept, as 81-digit strings, in self.solutions.
+"""
+class ResumableSearch:
+  
+  CHECKPOINT_FORMAT = "sudoku-search-checkpoint"
+  CHECKPOINT_VERSION = 1
+  CHECKPOINT_SLICE = 20000
+  
+  def __init__(self, board, path: str, limit: int = None, interval: float = 60.0, keep: int = 1):
+    g = self.geometry = board.geometry
+    self.path = path
+    self.limit = limit
+    self.interval = interval
+    self.keep = keep
+    self.puzzle = board.to_line()
+    self.found = 0
+    self.solutions = list()
+    self.done = False
+    self.stats = SolveStats()
+    self.cells = bytearray(board.cells)
+    self.state = ConstraintState(g)
+    if not self.state.load(np.frombuffer(self.cells, dtype=np.uint8)):
+      self.done = True # the givens already contradict each other
+    empties = [x for x in g.positions if self.cells[g.cell_of_pos[x]] == Sudoku.EMPTY_VALUE]
+    self.search = BacktrackingSearch(self.cells, empties, self.state, stats=self.stats, most_constrained=True)
+  
+  """ Resume
+  Rebuilds a search from its checkpoint file.
+  Params: interval -> the number of seconds between checkpoints from now on. Defaults to None, which keeps
+    the interval of the saved search.
+  Returns: ResumableSearch -> the search, ready to run again. Its done attribute is True if it had finished.
+  Raises: ValueError if the file is not a checkpoint of a search.
+  """
+  @classmethod
+  def resume(cls, path: str, interval: float = None):
+    with open(path, "r") as f:
+      data = json.load(f)
+    if data.get("format") != cls.CHECKPOINT_FORMAT or data.get("version") != cls.CHECKPOINT_VERSION:
+      raise ValueError(f"{path} is not a version {cls.CHECKPOINT_VERSION} search checkpoint")
+    board = Sudoku(puzzle=data["puzzle"], box=data["box"])
+    self = cls(board, path, data["limit"], interval if interval is not None else data["interval"], data["keep"])
+    g = self.geometry
+    current = parse_puzzle(data["board"], g)
+    for x in g.positions:
+      self.cells[g.cell_of_pos[x]] = current[x]
+    self.state = ConstraintState(g)
+    self.state.load(np.frombuffer(self.cells, dtype=np.uint8))
+    stats = data["stats"]
+    self.stats.merge(stats)
+    self.stats.wall.update(stats["wall"])
+    self.stats.cpu.update(stats["cpu"])
+    self.search = BacktrackingSearch.from_checkpoint(self.cells, self.state, data["search"], self.stats, most_constrained=True)
+    self.found = data["found"]
+    self.solutions = data["solutions"]
+    self.done = data["done"]
+    logger.info("Resumed the search of %s from %s, with %s solutions found after %s nodes",
+                self.puzzle, path, self.found, self.stats.nodes)
+    return self
+  
+  """
+  Writes the state of the search to the checkpoint file, atomically.
+  """
+  def save(self):
+    g = self.geometry
+    data = {
+      "format": ResumableSearch.CHECKPOINT_FORMAT, "version": ResumableSearch.CHECKPOINT_VERSION,
+      "box": g.box, "puzzle": self.puzzle, "limit": self.limit, "interval": self.interval, "keep": self.keep,
+      "board": "".join(SYMBOLS[self.cells[g.cell_of_pos[x]]] for x in g.positions),
+      "search": self.search.checkpoint(), "found": self.found, "solutions": self.solutions, "done": self.done,
+      "stats": self.stats.as_dict(),
+    }
+    _write_atomically(self.path, json.dumps(data, separators=(",", ":")).encode())
+  
+  """ Run
+  Runs the search until it is done or max_seconds have passed, saving a checkpoint every interval seconds,
+  and once more when it stops.
+  Params: max_seconds -> stop after about this many seconds, for time-sliced jobs. Defaults to None (no limit).
+  Returns: int -> the number of solutions found so far. self.done tells whether the search is complete.
+  """
+  def run(self, max_seconds: float = None) -> int:
+    g = self.geometry
+    start = last_save = time.time()
+    search = self.search
+    with self.stats.phase("search"):
+      while not self.done:
+        if self.limit is not None and self.found >= self.limit:
+          self.done = True
+          break
+        status = search.run(max_nodes=ResumableSearch.CHECKPOINT_SLICE)
+        if status == BacktrackingSearch.SOLVED:
+          self.found += 1
+          if len(self.solutions) < self.keep:
+            self.solutions.append("".join(SYMBOLS[self.cells[g.cell_of_pos[x]]] for x in g.positions))
+        elif status == BacktrackingSearch.EXHAUSTED:
+          self.done = True
+          break
+        now = time.time()
+        if max_seconds is not None and now - start >= max_seconds:
+          break
+        if now - last_save >= self.interval:
+          self.save()
+          last_save = now
+    self.save()
+    return self.found
+
+
+""" Play Session
+State of an interactive game on a puzzle, for front-ends that validate every move and offer hints.
+The puzzle is solved once, when the session starts, and a ConstraintState and the position of every digit
+in every row, column, and square are kept up to date as cells are set and cleared, so checking a move,
+listing the candidates of a cell, and explaining a conflict are constant-time operations.
+Cells are addressed by (row, col), both counted from 0. Given cells cannot be changed.
+Moves that would repeat a digit in a row, column, or square are refused; moves that are legal but differ
+from the solution are accepted, and reported by mistakes() and hint().
+Params: board -> the Sudoku puzzle to play. It is copied, so the session does not modify it.
+Raises: ValueError if the puzzle has no solution.
+"""
+class PlaySession:
+  
+  UNIT_NAMES = ("row", "column", "square")
+  
+  def __init__(self, board):
+    g = self.geometry = board.geometry
+    self.board = board.copy()
+    Solved = board.copy()
+    if not Solved.solve():
+      raise ValueError("The puzzle has no solution")
+    self.solution = [Solved.cells[g.cell_of_pos[x]] for x in g.positions]
+    given = [board.cells[g.cell_of_pos[x]] for x in g.positions]
+    self.givens = frozenset(x for x in g.positions if given[x] != Sudoku.EMPTY_VALUE)
+    self.values = [Sudoku.EMPTY_VALUE] * g.cell_count
+    self.state = ConstraintState(g)
+    # where[u][v] is the position of digit v in unit u (see BoardGeometry.units), or -1
+    self.where = [[-1] * (g.size + 1) for _ in g.units]
+    self.filled = 0
+    for x in self.givens:
+      self.__write__(x, given[x])
+    self.undo_stack = list()
+    self.redo_stack = list()
+  
+  """
+  Returns the position of the cell at (row, col), checking that it is on the board.
+  """
+  def __position__(self, row: int, col: int) -> int:
+    n = self.geometry.size
+    if not (0 <= row < n and 0 <= col < n):
+      raise ValueError(f"Cell ({row}, {col}) is not on the {n}x{n} board")
+    return n * row + col
+  
+  def __cell__(self, x: int) -> tuple:
+    return divmod(x, self.geometry.size)
+  
+  """
+  Writes val (or an empty cell) at position x, updating the board, the constraint state, and the digit positions.
+  """
+  def __write__(self, x: int, val: int):
+    old = self.values[x]
+    units = self.geometry.units_of_pos[x]
+    if old != Sudoku.EMPTY_VALUE:
+      self.state.unplace(x, old)
+      for u in units:
+        self.where[u][old] = -1
+      self.filled -= 1
+    if val != Sudoku.EMPTY_VALUE:
+      self.state.place(x, val)
+      for u in units:
+        self.where[u][val] = x
+      self.filled += 1
+    self.values[x] = val
+    self.board.cells[self.geometry.cell_of_pos[x]] = val
+  
+  """ Check
+  Checks whether value can be written at (row, col), without changing anything.
+  Returns: list -> one dict per conflict, with the "unit" ("row", "column", or "square") that already holds value,
+    the "cell" (row, col) holding it there, and a "message" for the player. Empty if the move is legal.
+  Raises: ValueError if the cell is off the board or a given, or value is not a digit of the board.
+  """
+  def check(self, row: int, col: int, value: int) -> list:
+    x = self.__position__(row, col)
+    if x in self.givens:
+      raise ValueError(f"Cell ({row}, {col}) is a given")
+    if not 0 < value <= self.geometry.size:
+      raise ValueError(f"{value} is not a digit of the board")
+    conflicts = list()
+    for name, u in zip(PlaySession.UNIT_NAMES, self.geometry.units_of_pos[x]):
+      y = self.where[u][value]
+      if y >= 0 and y != x:
+        cell = self.__cell__(y)
+        conflicts.append({"unit": name, "cell": cell,
+                          "message": f"{value} is already in this {name}, at row {cell[0] + 1}, column {cell[1] + 1}"})
+    return conflicts
+  
+  """ Place
+  Writes value at (row, col) if that repeats no digit in the cell's row, column, or square.
+  Returns: list -> the conflicts that refused the move (see check), or an empty list if it was made.
+  """
+  def place(self, row: int, col: int, value: int) -> list:
+    conflicts = self.check(row, col, value)
+    if not conflicts:
+      self.__move__(self.__position__(row, col), value)
+    return conflicts
+  
+  """
+  Empties the cell at (row, col).
+  """
+  def clear(self, row: int, col: int):
+    x = self.__position__(row, col)
+    if x in self.givens:
+      raise ValueError(f"Cell ({row}, {col}) is a given")
+    if self.values[x] != Sudoku.EMPTY_VALUE:
+      self.__move__(x, Sudoku.EMPTY_VALUE)
+  
+  def __move__(self, x: int, val: int):
+    self.undo_stack.append((x, self.values[x], val))
+    self.redo_stack.clear()
+    self.__write__(x, val)
+  
+  """
+  Takes back the last move. Returns: bool -> False if there was no move to take back.
+  """
+  def undo(self) -> bool:
+    if not self.undo_stack:
+      return False
+    move = self.undo_stack.pop()
+    self.__write__(move[0], move[1])
+    self.redo_stack.append(move)
+    return True
+  
+  """
+  Makes the last move taken back by undo again. Returns: bool -> False if there was no move to make again.
+  """
+  def redo(self) -> bool:
+    if not self.redo_stack:
+      return False
+    move = self.redo_stack.pop()
+    self.__write__(move[0], move[2])
+    self.undo_stack.append(move)
+    return True
+  
+  """
+  Returns: list -> the digits that can be written at (row, col) without a conflict, given the other cells.
+  """
+  def candidates(self, row: int, col: int) -> list:
+    x = self.__position__(row, col)
+    val = self.values[x]
+    if val != Sudoku.EMPTY_VALUE:
+      self.state.unplace(x, val)
+    m = self.state.candidates(x)
+    if val != Sudoku.EMPTY_VALUE:
+      self.state.place(x, val)
+    return [v for v in self.geometry.legal_values if m >> v & 1]
+  
+  """
+  Returns: list -> the (row, col) of every cell whose value differs from the solution.
+  """
+  def mistakes(self) -> list:
+    return [self.__cell__(x) for x in self.geometry.positions
+            if self.values[x] != Sudoku.EMPTY_VALUE and self.values[x] != self.solution[x]]
+  
+  """
+  Returns: bool -> True if every cell is filled. Since moves with conflicts are refused, the board is then solved.
+  """
+  def is_solved(self) -> bool:
+    return self.filled == self.geometry.cell_count
+  
+  """ Hint
+  Finds the next move for the player: first a cell that differs from the solution, if any, then a naked single
+  (a cell with one candidate), then a hidden single (a digit with one possible cell in a row, column, or square),
+  and otherwise the solution of the cell with the fewest candidates.
+  Returns: dict -> the "technique" ("mistake", "naked single", "hidden single", or "reveal"), the "cell" (row, col),
+    the "value" that belongs there, and for hidden singles the "unit" it was found in; None if the board is solved.
+  """
+  def hint(self):
+    g = self.geometry
+    values, candidates = self.values, self.state.candidates
+    for x in g.positions:
+      if values[x] != Sudoku.EMPTY_VALUE and values[x] != self.solution[x]:
+        return {"technique": "mistake", "cell": self.__cell__(x), "value": self.solution[x]}
+    if self.is_solved():
+      return None
+    fewest, fewest_count = -1, g.size + 1
+    for x in g.positions:
+      if values[x] == Sudoku.EMPTY_VALUE:
+        m = candidates(x)
+        if m and m & (m - 1) == 0:
+          return {"technique": "naked single", "cell": self.__cell__(x), "value": m.bit_length() - 1}
+        count = bin(m).count("1")
+        if count < fewest_count:
+          fewest, fewest_count = x, count
+    for u, unit in enumerate(g.units):
+      once = twice = 0
+      for x in unit:
+        if values[x] == Sudoku.EMPTY_VALUE:
+          m = candidates(x)
+          twice |= once & m
+          once |= m
+      hidden = once & ~twice
+      if hidden:
+        bit = hidden & -hidden
+        x = next(x for x in unit if values[x] == Sudoku.EMPTY_VALUE and candidates(x) & bit)
+        return {"technique": "hidden single", "cell": self.__cell__(x), "value": bit.bit_length() - 1,
+                "unit": f"{PlaySession.UNIT_NAMES[u // g.size]} {u % g.size + 1}"}
+    return {"technique": "reveal", "cell": self.__cell__(fewest), "value": self.solution[fewest]}
+
+""" Read Puzzles
+Lazily reads a batch puzzle file, which holds one puzzle per line as 81 digits organized by row
+(size * size symbols on other boards, see SYMBOLS), with 0 or . for empty cells.
+Blank lines and lines starting with '#' are skipped. Only one line is held in memory at a time,
+so files of any size can be streamed.
+Returns: a generator of puzzle strings.
+"""
+def read_puzzles(filename: str):
+  with open(filename, "r") as f:
+    for line in f:
+      line = line.strip()
+      if line and not line.startswith("#"):
+        yield line
+
+""" Write Puzzles
+Writes puzzles to a batch puzzle file, one per line, consuming the given iterable lazily.
+Params: puzzles -> an iterable of puzzle strings or Sudoku objects, such as a generator.
+Returns: int -> the number of puzzles written.
+"""
+def write_puzzles(filename: str, puzzles) -> int:
+  count = 0
+  with open(filename, "w") as f:
+    for puzzle in puzzles:
+      f.write((puzzle.to_line() if isinstance(puzzle, Sudoku) else puzzle) + "\n")
+      count += 1
+  return count
+
+
+""" Packed Puzzles
+A compact binary format for 9x9 puzzles: each puzzle is a record of PACKED_PUZZLE_SIZE (41) bytes,
+holding its 81 cells in row order at 4 bits per cell (the first cell in the high bits of the first byte,
+and 4 bits of padding at the end). Records are stored back to back with no header, so puzzle i starts at
+byte 41 * i and can be read directly from a memory-mapped file (see PackedPuzzles).
+"""
+PACKED_PUZZLE_SIZE = 41
+# Value of every byte of a 9x9 puzzle line, 255 for bytes which are not a cell
+_PACKED_VALUES = np.full(256, 255, dtype=np.uint8)
+for ch in "0123456789.":
+  _PACKED_VALUES[ord(ch)] = SYMBOL_VALUES[ch]
+
+""" Pack Puzzles
+Packs 9x9 puzzles into the binary format described above, all at once with vectorized NumPy operations.
+Params: puzzles -> a list of 81-character puzzle strings or Sudoku objects.
+Returns: bytes -> PACKED_PUZZLE_SIZE bytes per puzzle.
+Raises: ValueError if a puzzle is not 81 cells of 0 to 9 (or .).
+"""
+def pack_puzzles(puzzles: list) -> bytes:
+  lines = [p.to_line() if isinstance(p, Sudoku) else p for p in puzzles]
+  for line in lines:
+    if len(line) != 81:
+      raise ValueError(f"Expected a puzzle of 81 cells, got {len(line)}: {line[:100]!r}")
+  try:
+    codes = np.frombuffer("".join(lines).encode("ascii"), dtype=np.uint8)
+  except UnicodeEncodeError:
+    raise ValueError("Puzzles may only contain the digits 0 to 9 and '.'") from None
+  values = _PACKED_VALUES[codes].reshape(-1, 81)
+  if (values == 255).any():
+    bad = int(np.argmax((values == 255).any(axis=1)))
+    raise ValueError(f"Invalid cell in puzzle {bad}: {lines[bad]!r}")
+  cells = np.zeros((len(lines), 82), dtype=np.uint8)
+  cells[:, :81] = values
+  return ((cells[:, 0::2] << 4) | cells[:, 1::2]).tobytes()
+
+""" Unpack Puzzles
+Unpacks records of the binary format described above.
+Params: records -> a bytes-like object, or a uint8 array of shape (N, PACKED_PUZZLE_SIZE).
+Returns: np.ndarray -> a (N, 81) uint8 array of cell values, organized by row.
+"""
+def unpack_puzzles(records) -> np.ndarray:
+  records = np.frombuffer(records, dtype=np.uint8) if isinstance(records, (bytes, bytearray, memoryview)) else records
+  records = records.reshape(-1, PACKED_PUZZLE_SIZE)
+  cells = np.empty((records.shape[0], 2 * PACKED_PUZZLE_SIZE), dtype=np.uint8)
+  cells[:, 0::2] = records >> 4
+  cells[:, 1::2] = records & 0x0F
+  return cells[:, :81]
+
+""" Write Packed Puzzles
+Writes puzzles to a file in the binary format described above, consuming the given iterable lazily
+and packing batch_size puzzles at a time.
+Params: puzzles -> an iterable of 81-character puzzle strings or Sudoku objects, such as read_puzzles(filename).
+Returns: int -> the number of puzzles written.
+"""
+def write_packed_puzzles(filename: str, puzzles, batch_size: int = 4096) -> int:
+  count = 0
+  with open(filename, "wb") as f:
+    puzzles = iter(puzzles)
+    while True:
+      batch = list(islice(puzzles, batch_size))
+      if not batch:
+        return count
+      f.write(pack_puzzles(batch))
+      count += len(batch)
+
+""" Packed Puzzles
+Random access to a file of packed puzzles (see pack_puzzles) through a read-only memory map.
+Opening the file reads nothing; only the records that are accessed are paged in, so a worker
+can read puzzle i of a huge file without parsing the puzzles before it.
+  len(packed) -> the number of puzzles.
+  packed[i] -> puzzle i as an 81-digit string.
+  packed.grids(start, stop) -> puzzles start to stop - 1 as a (N, 9, 9) uint8 array, ready for validate_boards.
+  iter(packed) -> lazily yields every puzzle as an 81-digit string.
+Use as a context manager, or call close(), to release the memory map.
+"""
+class PackedPuzzles:
+  
+  def __init__(self, filename: str):
+    size = os.path.getsize(filename)
+    if size % PACKED_PUZZLE_SIZE:
+      raise ValueError(f"{filename} is not a packed puzzle file: its size is not a multiple of {PACKED_PUZZLE_SIZE}")
+    count = size // PACKED_PUZZLE_SIZE
+    # An empty file cannot be memory-mapped
+    self.records = (np.memmap(filename, dtype=np.uint8, mode="r", shape=(count, PACKED_PUZZLE_SIZE)) if count
+                    else np.zeros((0, PACKED_PUZZLE_SIZE), dtype=np.uint8))
+  
+  def __len__(self) -> int:
+    return self.records.shape[0]
+  
+  def __getitem__(self, i: int) -> str:
+    if not -len(self) <= i < len(self):
+      raise IndexError(f"Puzzle index {i} out of range for {len(self)} puzzles")
+    i %= len(self)
+    return (unpack_puzzles(self.records[i:i + 1])[0] + ord("0")).tobytes().decode("ascii")
+  
+  def grids(self, start: int = 0, stop: int = None) -> np.ndarray:
+    return unpack_puzzles(self.records[start:stop]).reshape(-1, 9, 9)
+  
+  def __iter__(self):
+    for start in range(0, len(self), 4096):
+      for row in unpack_puzzles(self.records[start:start + 4096]) + ord("0"):
+        yield row.tobytes().decode("ascii")
+  
+  # The map is unmapped once no array refers to it any more, so views taken from it stay valid
+  def close(self):
+    self.records = np.zeros((0, PACKED_PUZZLE_SIZE), dtype=np.uint8)
   
-  def __collect_col_into_list__(self, col: int) -> list:
-    c = col % 3
-    s = 0 # first col of squares
-    L = list()
-    if col > 5: # last col of squares
-      s = 2
-    elif col > 2: # middle col of squares
-      s = 1
-    for j in range(9): # go through rows in column
-      r = j % 3
-      if j % 3 == 0 and j != 0: # if we should be in the next square
-        s += 3
-      L.append(self.board[s][r][c])
-    return L
+  def __enter__(self):
+    return self
   
-  def __values_are_valid__(self, values: list) -> bool:
-    for i in range(len(values)):
-      if values[i] in Sudoku.LEGAL_VALUES or values[i] == Sudoku.EMPTY_VALUE:
-        if values.count(values[i]) > 1:
-          if values[i] != Sudoku.EMPTY_VALUE:
-            return False
-      else:
-        return False
-    return True
+  def __exit__(self, *exc):
+    self.close()
+
+_worker_cache = None # the SolutionCache of a solve_batch worker process, kept across chunks
+
+""" Propagate Singles
+Applies naked and hidden singles to many boards at once, as vectorized NumPy operations over all of them:
+each round computes the candidates of every cell of every board from the digits placed in its units, then
+places every naked single and, when a board has none, every hidden single. Boards that stop changing drop out
+of the rounds, and the rounds end when none is left.
+Params: values -> a (N, size * size) array of cell values, organized by row. It is not modified.
+  geometry -> the BoardGeometry of the boards. Defaults to the 9x9 board.
+Returns: (np.ndarray, np.ndarray) -> the (N, size * size) uint8 values after propagation, and the status of each
+  board: SINGLES_SOLVED, SINGLES_STUCK (singles alone cannot finish it), or SINGLES_INVALID (it has no solution).
+"""
+SINGLES_SOLVED, SINGLES_STUCK, SINGLES_INVALID = 1, 0, -1
+
+def propagate_singles(values, geometry: BoardGeometry = GEOMETRY) -> tuple:
+  g = geometry
+  n = g.size
+  values = np.array(values, dtype=np.uint8).reshape(-1, g.cell_count)
+  if (values > n).any():
+    raise ValueError(f"Cell values must be between 0 and {n}")
+  dtype = np.uint16 if n < 16 else np.uint32 # wide enough for the bits 1 through size
+  zero, one, all_digits = dtype(0), dtype(1), dtype(g.all_digits)
+  units = np.array(g.units) # (3 * size, size) positions: the rows, then the columns, then the squares
+  cell_units = np.array(g.units_of_pos).T # (3, size * size) unit indices
+  status = np.full(len(values), SINGLES_STUCK, dtype=np.int8)
+  active = np.arange(len(values))
+  while len(active):
+    v = values[active]
+    empty = v == Sudoku.EMPTY_VALUE
+    bits = np.where(empty, zero, np.left_shift(one, v.astype(dtype)))
+    in_units = bits[:, units]
+    placed = np.bitwise_or.reduce(in_units, axis=2)
+    duplicate = (in_units.sum(axis=2, dtype=np.uint32) != placed).any(axis=1)
+    taken = placed[:, cell_units[0]] | placed[:, cell_units[1]] | placed[:, cell_units[2]]
+    cands = np.where(empty, all_digits & ~taken, zero)
+    # Digits possible in exactly one cell of each unit
+    unit_cands = cands[:, units]
+    once = np.zeros_like(placed)
+    twice = np.zeros_like(placed)
+    for k in range(n):
+      m = unit_cands[:, :, k]
+      twice |= once & m
+      once |= m
+    single = (cands & (cands - one)) == 0
+    invalid = duplicate | (empty & (cands == 0)).any(axis=1) | ((once | placed) != all_digits).any(axis=1)
+    solved = ~invalid & ~empty.any(axis=1)
+    naked = empty & single & ~invalid[:, None]
+    new = np.where(naked, cands, zero)
+    # Boards without naked singles place their hidden singles instead
+    hidden_boards = np.flatnonzero(~naked.any(axis=1) & ~invalid & ~solved)
+    if len(hidden_boards):
+      found = unit_cands[hidden_boards] & (once & ~twice)[hidden_boards][:, :, None]
+      hidden = np.zeros((len(hidden_boards), g.cell_count), dtype=dtype)
+      for kind in range(3): # every cell is in exactly one unit of each kind
+        hidden[:, units[kind * n:(kind + 1) * n].ravel()] |= found[:, kind * n:(kind + 1) * n].reshape(len(hidden_boards), -1)
+      # A cell that is the only place of two digits: the board has no solution
+      clash = ((hidden & (hidden - one)) != 0).any(axis=1)
+      invalid[hidden_boards[clash]] = True
+      hidden[clash] = zero
+      new[hidden_boards] = hidden
+    changed = (new != 0).any(axis=1) & ~invalid
+    status[active[invalid]] = SINGLES_INVALID
+    status[active[solved]] = SINGLES_SOLVED
+    digits = (np.frexp(new[changed])[1] - 1).astype(np.uint8) # the bit number of each single bit, 255 for none
+    values[active[changed]] = np.where(new[changed] != 0, digits, v[changed])
+    active = active[changed]
+  return values, status
+
+""" Solve Boards
+Solves many puzzles at once: singles are propagated across all of them with propagate_singles, and only the
+boards that singles cannot finish are searched, one at a time, with the given strategy. Most everyday puzzles
+fall to singles alone, which makes this much faster than solving them one by one.
+Params: puzzles -> a list of puzzle strings (see parse_puzzle), or a (N, size * size) array of values by row.
+  box -> the box size of the puzzles (see Sudoku). Defaults to 3, for 9x9 puzzles.
+  strategy -> the solving strategy of the boards that singles leave unsolved, one of the keys of Sudoku.SOLVE_STRATEGIES.
+  chunk_size -> the number of boards propagated together, which bounds the memory used (about 3 KB per 9x9 board).
+Returns: (np.ndarray, np.ndarray) -> the (N, size * size) uint8 solutions, organized by row (unsolvable boards are
+  left partly filled), and a bool array telling which boards were solved.
+"""
+def solve_boards(puzzles, box: int = 3, strategy: str = "propagation", chunk_size: int = 8192) -> tuple:
+  if strategy not in Sudoku.SOLVE_STRATEGIES:
+    raise ValueError(f"Unknown solving strategy '{strategy}', expected one of {list(Sudoku.SOLVE_STRATEGIES)}")
+  g = geometry(box)
+  if isinstance(puzzles, np.ndarray):
+    values = puzzles.reshape(len(puzzles), g.cell_count)
+  elif box == 3 and all(len(p) == 81 for p in puzzles):
+    values = unpack_puzzles(pack_puzzles(puzzles)) # vectorized parsing, which also checks every cell
+  else:
+    values = np.array([parse_puzzle(p, g) for p in puzzles], dtype=np.uint8).reshape(-1, g.cell_count)
+  solutions = np.empty((len(values), g.cell_count), dtype=np.uint8)
+  solved = np.empty(len(values), dtype=bool)
+  cell_of_pos = np.array(g.cell_of_pos)
+  for start in range(0, len(values), chunk_size):
+    chunk, status = propagate_singles(values[start:start + chunk_size], g)
+    for i in np.flatnonzero(status == SINGLES_STUCK):
+      cells = np.empty(g.cell_count, dtype=np.uint8)
+      cells[cell_of_pos] = chunk[i]
+      S = Sudoku.__new__(Sudoku)
+      S.__init_cells__(cells.tobytes(), box)
+      if S.solve(strategy=strategy):
+        chunk[i] = np.frombuffer(S.cells, dtype=np.uint8)[cell_of_pos]
+        status[i] = SINGLES_SOLVED
+    solutions[start:start + chunk_size] = chunk
+    solved[start:start + chunk_size] = status == SINGLES_SOLVED
+  return solutions, solved
+
+""" Solve Chunk
+Worker function for solve_batch. Solves each puzzle of the chunk without printing anything.
+Without a cache, the chunk is solved with solve_boards.
+Returns: a list with, for each puzzle, its solution as an 81-digit line or UNSOLVABLE.
+"""
+def _solve_chunk(puzzles: list, strategy: str, box: int = 3, cache_size: int = 0, canonical_cache: bool = False) -> list:
+  global _worker_cache
+  if not cache_size:
+    solutions, solved = solve_boards(puzzles, box, strategy)
+    lines = _SYMBOL_CODES[solutions].tobytes().decode("ascii")
+    width = geometry(box).cell_count
+    return [lines[i * width:(i + 1) * width] if ok else UNSOLVABLE for i, ok in enumerate(solved)]
+  if _worker_cache is None:
+    _worker_cache = SolutionCache(cache_size, canonical=canonical_cache)
+  cache = _worker_cache
+  solutions = list()
+  for puzzle in puzzles:
+    S = Sudoku(puzzle=puzzle, box=box)
+    solutions.append(S.to_line() if S.solve(strategy=strategy, cache=cache) else UNSOLVABLE)
+  return solutions
+
+""" Solve Batch
+Solves many puzzles across a pool of worker processes.
+Puzzles are sent to the workers in chunks, and only a bounded number of chunks is in flight
+at any time, so arbitrarily long inputs can be streamed through.
+Params: puzzles -> an iterable of 81-digit puzzle strings, such as read_puzzles(filename).
+  workers -> the number of worker processes. Defaults to None, which uses one per CPU.
+  chunksize -> the number of puzzles sent to a worker at a time.
+  strategy -> the solving strategy, one of the keys of Sudoku.SOLVE_STRATEGIES.
+  box -> the box size of the puzzles (see Sudoku). Defaults to 3, for 9x9 puzzles.
+  cache_size -> if not 0, every worker process keeps a SolutionCache of this size across its chunks,
+    so repeated puzzles sent to the same worker are only searched once.
+  canonical_cache -> whether the caches also find puzzles equivalent to one solved before (see SolutionCache).
+Returns: a generator of solutions as 81-digit strings (or UNSOLVABLE), in the same order as the puzzles.
+"""
+def solve_batch(puzzles, workers: int = None, chunksize: int = 256, strategy: str = "propagation", box: int = 3,
+                cache_size: int = 0, canonical_cache: bool = False):
+  if strategy not in Sudoku.SOLVE_STRATEGIES:
+    raise ValueError(f"Unknown solving strategy '{strategy}', expected one of {list(Sudoku.SOLVE_STRATEGIES)}")
+  if chunksize < 1:
+    raise ValueError("chunksize must be at least 1")
+  workers = workers or os.cpu_count() or 1
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    max_in_flight = 2 * workers
+    in_flight = deque()
+    chunk = list()
+    for puzzle in puzzles:
+      chunk.append(puzzle)
+      if len(chunk) == chunksize:
+        in_flight.append(executor.submit(_solve_chunk, chunk, strategy, box, cache_size, canonical_cache))
+        chunk = list()
+        if len(in_flight) >= max_in_flight:
+          yield from in_flight.popleft().result()
+    if chunk:
+      in_flight.append(executor.submit(_solve_chunk, chunk, strategy, box, cache_size, canonical_cache))
+    while in_flight:
+      yield from in_flight.popleft().result()
+
+""" Solve Until
+Worker function for solve_async. Solves the board with whatever time is left before the deadline.
+Returns: bytes -> the cells of the solution (see Sudoku.snapshot), or None if the board is not solvable.
+"""
+def _solve_until(board, strategy: str, deadline: float):
+  timeout = None if deadline is None else deadline - time.time()
+  return board.snapshot() if board.solve(strategy=strategy, timeout=timeout) else None
+
+_async_executor = None
+
+# Subproblems made per worker by the parallel search, when no split depth is given
+PARALLEL_SPLIT_FACTOR = 8
+_split_cancel = None
+
+""" Split Frontier
+Expands the search tree of a board breadth-first, with the propagation solver's deductions and its choice
+of branching cell (see CandidateState), into independent subproblems: each branch fixes a different value
+of the branching cell, so the subproblems share no solutions, and their solutions together are exactly
+those of the board. Every subproblem is a complete set of cells, so any strategy can search it.
+Params: board -> the Sudoku board to split.
+  target -> stop once there are at least this many subproblems. None for no limit.
+  depth -> stop once the subproblems are this many branches deep. None for no limit.
+  stats -> optional SolveStats that counts the states expanded.
+Returns: (list, list) -> the subproblems as (cells, depth) pairs, and the cells of the solutions found
+  by propagation alone while splitting.
+"""
+def split_frontier(board, target: int = None, depth: int = None, stats: SolveStats = None) -> tuple:
+  if target is None and depth is None:
+    raise ValueError("split_frontier needs a target number of subproblems or a depth")
+  g = board.geometry
   
-  def __rows_are_valid__(self) -> bool:
-    zcount = 0
-    rows = set()
-    for i in range(9):
-      values = self.__collect_row_into_list__(i)
-      if not self.__values_are_valid__(values):
-        return False
-      v = self.__combine_digits__(values)
-      if v in rows:
-        if v.all():
-          return False
-        else:
-          if not v.any():
-            zcount += 1
-      else:
-        rows.add(v)
-    return len(rows) + zcount == 9
-    
-  def __cols_are_valid__(self) -> bool:
-    zcount = 0
-    cols = set()
-    for i in range(9):
-      values = self.__collect_col_into_list__(i)
-      if not self.__values_are_valid__(values):
-        return False
-      v = self.__combine_digits__(values)
-      if v in cols:
-        if v.all():
-          return False
-        else:
-          if not v.any():
-            zcount += 1
-      else:
-        cols.add(v)
-    return len(cols) + zcount == 9
+  def cells_of(state):
+    cells = bytearray(g.cell_count)
+    for x in g.positions:
+      cells[g.cell_of_pos[x]] = state.values[x]
+    return bytes(cells)
   
-  def __squares_are_valid__(self) -> bool:
-    zcount = 0
-    squares = set()
-    for i in range(9):
-      values = list(self.board[i].flatten())
-      if not self.__values_are_valid__(values):
-#        print("squares values are not valid")
-        return False
-      v = self.__combine_digits__(values)
-      if v in squares:
-#        print("v in squares is true")
-        if v.all():
-#          print(f"v.all is {v.all()}")
-          return False
-        else:
-          if not v.any():
-            zcount += 1
+  root = CandidateState.from_board(board.board, g)
+  frontier = deque() if root is None else deque([(root, 0)])
+  solutions = list()
+  # States are propagated before they are queued, so every queued state is an open subproblem
+  queued = deque()
+  while frontier:
+    state, d = frontier.popleft()
+    if stats is not None:
+      stats.visit(d)
+    if not state.propagate():
+      continue
+    x = state.select_cell()
+    if x < 0:
+      solutions.append(cells_of(state))
+    else:
+      queued.append((state, d, x))
+  while queued and (target is None or len(queued) < target) and (depth is None or queued[0][1] < depth):
+    state, d, x = queued.popleft()
+    m = state.cands[x]
+    while m:
+      bit = m & -m
+      m ^= bit
+      child = state.copy()
+      if stats is not None:
+        stats.visit(d + 1)
+        stats.checks += 1
+      if not child.assign(x, bit.bit_length() - 1) or not child.propagate():
+        continue
+      y = child.select_cell()
+      if y < 0:
+        solutions.append(cells_of(child))
       else:
-        squares.add(v)
-#    print(f"len(squares) + zcount == 9: {len(squares)} + {zcount} == 9 -> {len(squares) + zcount == 9}")
-    return len(squares) + zcount == 9
+        queued.append((child, d + 1, y))
+  return [(cells_of(state), d) for state, d, _ in queued], solutions
+
+def _init_split_worker(cancel):
+  global _split_cancel
+  _split_cancel = cancel
+
+""" Search Subproblem
+Worker function for the parallel search. Solves, or counts the solutions of, one subproblem of split_frontier,
+giving up as soon as the pool's cancellation event is set.
+Returns: (result, dict) -> the cells of the solution (or None) when solving, or the number of solutions when
+  counting; and the SolveStats of the search as a dict, or None if it was cancelled before it started.
+"""
+def _search_subproblem(cells: bytes, box: int, strategy: str, count: bool, limit: int, deadline: float) -> tuple:
+  if _split_cancel is not None and _split_cancel.is_set():
+    return (0 if count else None), None
+  board = Sudoku.__new__(Sudoku)
+  board.__init_cells__(cells, box)
+  stats = SolveStats(deadline=deadline, cancel=_split_cancel)
+  try:
+    if count:
+      result = board.__count__(limit, strategy, stats)
+    else:
+      result = board.snapshot() if getattr(board, Sudoku.SOLVE_STRATEGIES[strategy])(stats) else None
+  except SolveCancelled:
+    result = 0 if count else None
+  return result, stats.as_dict()
+
+"""
+Returns the process pool used by solve_async when it is not given one, creating it on first use.
+"""
+def default_executor() -> ProcessPoolExecutor:
+  global _async_executor
+  if _async_executor is None:
+    _async_executor = ProcessPoolExecutor()
+    atexit.register(_async_executor.shutdown, cancel_futures=True)
+  return _async_executor
+
+""" Solve Async
+Solves a board in a worker process without blocking the event loop.
+The deadline is enforced at both ends: a puzzle still waiting for a worker when it passes is never started,
+and a search running when it passes stops itself at its next cancellation checkpoint (see SolveStats),
+so a timed out request does not keep a worker busy.
+Params: board -> a Sudoku board, or a puzzle string (see parse_puzzle).
+  timeout -> the number of seconds until the request times out. Defaults to None (no limit).
+  strategy -> the solving strategy, one of the keys of Sudoku.SOLVE_STRATEGIES.
+  executor -> the process pool to solve in. Defaults to a shared pool with one process per CPU.
+Returns: Sudoku -> a solved copy of the board, or None if the board is not solvable.
+Raises: SolveTimeout if the timeout expires first.
+"""
+async def solve_async(board, timeout: float = None, strategy: str = "propagation", executor=None):
+  if isinstance(board, str):
+    board = Sudoku(puzzle=board)
+  if strategy not in Sudoku.SOLVE_STRATEGIES:
+    raise ValueError(f"Unknown solving strategy '{strategy}', expected one of {list(Sudoku.SOLVE_STRATEGIES)}")
+  deadline = None if timeout is None else time.time() + timeout
+  loop = asyncio.get_running_loop()
+  future = loop.run_in_executor(executor or default_executor(), _solve_until, board, strategy, deadline)
+  try:
+    cells = await asyncio.wait_for(future, timeout)
+  except asyncio.TimeoutError:
+    raise SolveTimeout(f"Board was not solved within {timeout} seconds") from None
+  if cells is None:
+    return None
+  solved = board.copy()
+  solved.restore(cells)
+  return solved
+
+""" Squares To Grids
+Converts boards from the square-major (N, 9, 3, 3) layout of Sudoku.board to row-major (N, 9, 9) grids
+(from (N, size, box, box) to (N, size, size) on other boards). Returns a view where possible.
+"""
+def squares_to_grids(boards: np.ndarray) -> np.ndarray:
+  boards = np.asarray(boards)
+  b = boards.shape[-1]
+  return boards.reshape(-1, b, b, b, b).transpose(0, 1, 3, 2, 4).reshape(-1, b * b, b * b)
+
+""" Validate Boards
+Validates many boards at once using only vectorized NumPy operations.
+Each digit v is one-hot encoded as the bit 1 << v (empty cells as 0). Within a row, column, or square,
+the digits are all different exactly when the sum of their bits equals the bitwise OR of their bits,
+so each unit is checked with one sum and one OR reduction along the row, column, or square axis.
+Params: boards -> an integer array of shape (N, 9, 9), organized by row,
+    or (N, 9, 3, 3), organized by square like Sudoku.board. Other sizes are accepted the same way,
+    as (N, size, size) or (N, size, box, box) arrays.
+  chunk_size -> number of boards encoded at a time, which bounds the temporary memory used.
+Returns: (valid, solved) -> two boolean arrays of shape (N,). solved is True for boards that are
+  valid and have no empty cells.
+"""
+def validate_boards(boards, chunk_size: int = 262144) -> tuple:
+  boards = np.asarray(boards)
+  if boards.ndim == 4 and boards.shape[2] == boards.shape[3] and boards.shape[1] == boards.shape[2] ** 2:
+    boards = squares_to_grids(boards)
+  elif boards.ndim != 3 or boards.shape[1] != boards.shape[2] or isqrt(boards.shape[1]) ** 2 != boards.shape[1]:
+    raise ValueError(f"Expected boards of shape (N, size, size) or (N, size, box, box), got {boards.shape}")
+  size = boards.shape[1]
+  box = isqrt(size)
+  dtype = np.uint16 if size < 16 else np.uint32 # wide enough for the bits 1 through size
   
-  """ Is Valid
-  Returns: bool -> True if the rows, columns, and 3x3 squares are in a valid state,
-    False otherwise.
-  """
-  def __is_valid__(self) -> bool:
-    return (self.__rows_are_valid__() 
-            and self.__cols_are_valid__() 
-            and self.__squares_are_valid__())
+  def units_ok(bits, axis):
+    return (np.bitwise_or.reduce(bits, axis=axis) == bits.sum(axis=axis, dtype=dtype)).all(axis=-1)
   
-#  def check_value(self, val, s, row, col) -> bool:
-#    return self.check_row(val, s, row, col) and self.check_col(val, s, row, col) and self.check_square(val, s, row, col)
+  n = boards.shape[0]
+  valid = np.zeros(n, dtype=bool)
+  solved = np.zeros(n, dtype=bool)
+  for start in range(0, n, chunk_size):
+    b = boards[start:start + chunk_size]
+    in_range = ((b >= Sudoku.EMPTY_VALUE) & (b <= size)).all(axis=(1, 2))
+    b = np.clip(b, 0, size).astype(dtype)
+    bits = np.where(b == Sudoku.EMPTY_VALUE, dtype(0), np.left_shift(dtype(1), b))
+    squares = bits.reshape(-1, box, box, box, box).transpose(0, 1, 3, 2, 4).reshape(-1, size, size)
+    ok = in_range & units_ok(bits, 2) & units_ok(bits, 1) & units_ok(squares, 2)
+    valid[start:start + chunk_size] = ok
+    solved[start:start + chunk_size] = ok & (b != Sudoku.EMPTY_VALUE).all(axis=(1, 2))
+  return valid, solved
 
+""" Board Transform
+A symmetry of the Sudoku board: an optional transposition, then a reordering of the rows and columns
+which keeps bands (and stacks) together, then a relabeling of the digits. It maps every valid puzzle
+or solution to another valid puzzle or solution, which are equivalent to each other.
+Params: transpose -> whether the board is transposed first.
+  rows -> rows[i] is the row (of the transposed board, if transpose is set) which becomes row i.
+  cols -> cols[j] is the column which becomes column j.
+  digits -> digits[v] is the new value of digit v. digits[0] must be 0, the empty value.
+Boards are given and returned as lists of values in absolute position order, as used by parse_puzzle.
+"""
+class BoardTransform:
+  
+  def __init__(self, transpose: bool = False, rows: list = None, cols: list = None, digits: list = None,
+               size: int = 9):
+    self.transpose = transpose
+    self.rows = list(rows) if rows is not None else list(range(size))
+    self.cols = list(cols) if cols is not None else list(range(size))
+    self.digits = list(digits) if digits is not None else list(range(size + 1))
+  
   """
-  Returns a string representation of the current state of the Sudoku board.
+  Returns: np.ndarray -> the positions moved by the transform: position i of the transformed board holds
+    the (relabeled) value of position permutation[i] of the board.
   """
-  def to_string(self) -> str:
-    board_str = ""
-    for k in range(0, 9, 3):
-      for r in range(0, 3):
-        for s in range(k, k+3):
-          board_str += str(self.board[s][r]) + ' '
-        board_str += '\n'
-      board_str += '\n'
-    return board_str
+  def permutation(self) -> np.ndarray:
+    n = len(self.rows)
+    rows, cols = np.asarray(self.rows, dtype=np.intp)[:, None], np.asarray(self.cols, dtype=np.intp)
+    return (cols * n + rows if self.transpose else rows * n + cols).reshape(-1)
   
   """
-  Writes the contents of this Sudoku board to a text file,
-  using the same format as used to initialize a new board from a file.
-  Params: filename - a string. The Sudoku board will be written to this file.
+  Returns: list -> the transformed values of the board.
   """
-  def to_file(self, filename: str):
-    with open(filename, "w") as f:
-      for i in range(0, 81):
-        if i % 9 == 0 and i > 0:
-          f.write("\n")
-        s, r, c = Sudoku.pos_to_indices(i)
-        f.write(str(self.board[s][r][c]))
-      f.write("\n")
-        
-    
+  def apply(self, values: list) -> list:
+    return np.asarray(self.digits, dtype=np.uint8)[np.asarray(values, dtype=np.uint8)[self.permutation()]].tolist()
+  
   """
-  Returns True if the given Sudoku square (or 3x3 block) is solved, False otherwise.
-  Solved is defined as each cell containing a unique integer in the interval [1,9].
+  Returns: list -> the values of the board that apply() maps to the given values.
   """
-  def square_is_solved(self, s) -> bool:
-    unique_square = np.unique(self.board[s])
-    return (np.shape(unique_square) == np.shape(Sudoku.UNIQUES) 
-            and np.all(np.equal(unique_square, Sudoku.UNIQUES)))
+  def invert(self, values: list) -> list:
+    inverse_digits = np.zeros(len(self.digits), dtype=np.uint8)
+    inverse_digits[self.digits] = np.arange(len(self.digits))
+    grid = np.empty(len(self.rows) ** 2, dtype=np.uint8)
+    grid[self.permutation()] = inverse_digits[np.asarray(values, dtype=np.uint8)]
+    return grid.tolist()
+
+
+_canonical_tables = None
+
+"""
+Returns the tables used by canonical_form, built on first use:
+the 1296 orders of the 9 columns which keep the stacks together, as a (1296, 9) array, and for each of them
+the (1296, 512) table of where it moves the filled cells of a row (bit 8 - c set when column c is filled).
+"""
+def canonical_tables() -> tuple:
+  global _canonical_tables
+  if _canonical_tables is None:
+    orders = list(permutations(range(3)))
+    col_orders = np.array([[3 * s + c for s in stacks for c in inner[s]]
+                           for stacks in orders for inner in product(orders, repeat=3)], dtype=np.intp)
+    filled = (np.arange(512)[:, None] >> (8 - np.arange(9))) & 1
+    patterns = (filled[:, col_orders] << (8 - np.arange(9))).sum(axis=2).T
+    _canonical_tables = (col_orders, patterns)
+  return _canonical_tables
+
+""" Canonical Form
+Maps a 9x9 puzzle to a canonical key shared by every puzzle equivalent to it up to the symmetries of
+BoardTransform: digit relabeling, row permutations within bands, band swaps, column permutations within
+stacks, stack swaps, and transposition.
+The key is the smallest of the 81-digit strings of all transformed puzzles, when each has its digits
+relabeled 1, 2, 3, ... in order of first appearance (so it is the same for relabeled puzzles). Instead of
+trying all 3,359,232 row and column orders, the key is built one row at a time: every order of the
+columns (1296) is tried at once with NumPy, and only the choices giving the smallest row so far are
+kept. For the first row, only the pattern of filled cells matters, which a lookup table resolves.
+Params: puzzle -> a Sudoku board, a puzzle string, or a list of 81 values in absolute position order.
+Returns: (str, BoardTransform) -> the canonical key, and a transform mapping the puzzle to it.
+  Digits missing from the puzzle are given the remaining labels in increasing order.
+"""
+def canonical_form(puzzle) -> tuple:
+  if isinstance(puzzle, Sudoku):
+    puzzle = puzzle.to_line()
+  values = parse_puzzle(puzzle) if isinstance(puzzle, str) else puzzle
+  col_orders, patterns = canonical_tables()
+  grid = np.asarray(values, dtype=np.uint8).reshape(9, 9)
+  grids = np.stack([grid, grid.T])
+  row_bits = 1 << np.arange(9)
+  row_band = np.arange(9) // 3
+  weights = 10 ** np.arange(8, -1, -1, dtype=np.int64)
+  
+  # The states kept after each row: which board (transposed or not), column order, rows used so far,
+  # band of the last row, and the digit labels given so far
+  row_patterns = ((grids > 0) << (8 - np.arange(9))).sum(axis=2).reshape(-1)
+  moved = patterns[:, row_patterns]
+  order, board_row = np.nonzero(moved == moved.min())
+  board = board_row // 9
+  parent, row = np.arange(len(order)), board_row % 9
+  used = np.zeros(len(order), dtype=np.int64)
+  band = np.zeros(len(order), dtype=np.int64)
+  chosen = np.zeros((len(order), 0), dtype=np.intp)
+  labels = np.zeros((len(order), 10), dtype=np.uint8)
+  next_label = np.ones(len(order), dtype=np.uint8)
+  key = list()
+  for i in range(9):
+    if i > 0:
+      free = (used[:, None] & row_bits) == 0
+      if i % 3 == 0:
+        allowed = free & (((used[:, None] >> (3 * row_band)) & 7) == 0)
+      else:
+        allowed = free & (row_band == band[:, None])
+      parent, row = np.nonzero(allowed)
+    k = np.arange(len(parent))
+    cells = grids[board[parent], row][k[:, None], col_orders[order[parent]]]
+    new_labels, new_next = labels[parent], next_label[parent]
+    out = np.empty(cells.shape, dtype=np.int64)
+    for j in range(9):
+      v = cells[:, j]
+      label = new_labels[k, v]
+      unseen = (v > 0) & (label == 0)
+      if unseen.any():
+        label[unseen] = new_next[unseen]
+        new_labels[k[unseen], v[unseen]] = new_next[unseen]
+        new_next = new_next + unseen
+      out[:, j] = label
+    values_key = out @ weights
+    best = values_key == values_key.min()
+    parent, row = parent[best], row[best]
+    board, order = board[parent], order[parent]
+    used = used[parent] | (1 << row)
+    band = row // 3
+    chosen = np.concatenate([chosen[parent], row[:, None]], axis=1)
+    labels, next_label = new_labels[best], new_next[best]
+    key.append(out[best][0])
+    # States with the same board, column order, rows used, and labels have the same future, keep one
+    if len(order) > 1:
+      states = np.concatenate([board[:, None], order[:, None], used[:, None], labels.astype(np.int64)], axis=1)
+      first = np.sort(np.unique(states, axis=0, return_index=True)[1])
+      board, order, used, band, chosen = board[first], order[first], used[first], band[first], chosen[first]
+      labels, next_label = labels[first], next_label[first]
+  
+  digits = labels[0].tolist()
+  missing = iter(sorted(set(range(1, 10)) - set(digits)))
+  digits = [d if v == 0 or d else next(missing) for v, d in enumerate(digits)]
+  transform = BoardTransform(bool(board[0]), chosen[0].tolist(), col_orders[order[0]].tolist(), digits)
+  return "".join(SYMBOLS[v] for v in np.concatenate(key)), transform
+
+
+""" Transform Engine
+Applies symmetries of the board (see BoardTransform) to many boards at once, for growing a pool of puzzles
+from a few seed puzzles. Each transform is an index permutation of the positions, built from the tables of
+the orders of lines (rows or columns) which keep bands together, and a digit map. Transformed boards are
+gathered in one NumPy indexing operation per batch, instead of one Python step per cell.
+Params: box -> the box size of the boards (see Sudoku). Defaults to 3, for 9x9 boards.
+Boards are arrays of values in absolute position order (by row), as returned by parse_puzzle and solve_boards.
+"""
+class TransformEngine:
+  
+  def __init__(self, box: int = 3):
+    self.geometry = geometry(box)
+    size = self.geometry.size
+    # All orders of box items, used both for the bands and for the lines within a band
+    self.orders = np.array(list(permutations(range(box))), dtype=np.intp)
+    self.positions = np.arange(size * size, dtype=np.intp).reshape(size, size)
   
   """
-  Returns True if all nine squares of the Sudoku board are solved, False otherwise.
+  Draws random line orders which keep bands together, as a (n, size) array.
   """
-  def squares_are_solved(self) -> bool:
-    if not self.__squares_are_valid__():
-      return False
-    for i in range(9):
-      if not self.square_is_solved(i):
-        return False
-    return True
+  def __line_orders__(self, n: int, rng: np.random.Generator) -> np.ndarray:
+    box = self.geometry.box
+    bands = self.orders[rng.integers(len(self.orders), size=n)]
+    lines = self.orders[rng.integers(len(self.orders), size=(n, box))]
+    return (bands[:, :, None] * box + lines).reshape(n, box * box)
   
+  """ Random Transforms
+  Draws n transforms uniformly from the symmetry group of the board.
+  Params: rng -> a numpy random Generator, or a seed for one.
+  Returns: (np.ndarray, np.ndarray) -> the (n, cells) index permutations (see BoardTransform.permutation),
+    and the (n, size + 1) digit maps, which all map 0 to 0.
   """
-  Returns True if the Sudoku board is solved, False otherwise.
-  To be solved, the board must both be in a valid state and have no empty spaces.
-  Note: An empty space is represented by a '0', the EMPTY_VALUE constant.
-  """
-  def board_is_solved(self) -> bool:
-    valid = self.__rows_are_valid__() and self.__cols_are_valid__()
-    solved = self.squares_are_solved() and self.board.all()
-    return valid and solved
+  def random_transforms(self, n: int, rng=None) -> tuple:
+    rng = np.random.default_rng(rng)
+    size = self.geometry.size
+    rows = self.__line_orders__(n, rng)
+    cols = self.__line_orders__(n, rng)
+    transpose = rng.integers(2, size=n).astype(bool)
+    permutations = np.where(transpose[:, None, None], self.positions.T[rows[:, :, None], cols[:, None, :]],
+                            self.positions[rows[:, :, None], cols[:, None, :]]).reshape(n, size * size)
+    digits = np.zeros((n, size + 1), dtype=np.uint8)
+    digits[:, 1:] = rng.random((n, size)).argsort(axis=1) + 1
+    return permutations, digits
   
-  def board_is_solved_two(self) -> bool:
-    return (self.__rows_are_valid__() 
-            and self.__cols_are_valid__() 
-            and self.squares_are_solved() 
-            and self.board.all())
+  """
+  Returns: (np.ndarray, np.ndarray) -> the index permutations and digit maps of the given BoardTransforms,
+    in the form returned by random_transforms.
+  """
+  def of_transforms(self, transforms: list) -> tuple:
+    permutations = np.array([t.permutation() for t in transforms], dtype=np.intp)
+    digits = np.array([t.digits for t in transforms], dtype=np.uint8)
+    return permutations.reshape(len(transforms), self.geometry.cell_count), digits
   
+  """ Apply
+  Transforms boards, the k-th board by the k-th transform.
+  Params: boards -> a (cells,) array of one board, transformed by every transform, or a (n, cells) array.
+    permutations, digits -> the transforms, as returned by random_transforms.
+  Returns: np.ndarray -> the (n, cells) uint8 transformed boards.
   """
-  Applies the given function, f, to each cell in the board, traversing across rows.
-  Params: f, the function to apply to the given cell, and any keyword arguments to be passed into f.
+  def apply(self, boards, permutations: np.ndarray, digits: np.ndarray) -> np.ndarray:
+    boards = np.asarray(boards, dtype=np.uint8)
+    if boards.ndim == 1:
+      moved = boards[permutations]
+    else:
+      moved = np.take_along_axis(boards.reshape(len(boards), -1), permutations, axis=1)
+    return np.take_along_axis(digits, moved, axis=1)
+  
+  """ Variants
+  Draws n distinct random variants of a puzzle, and transforms its solution along with it.
+  A puzzle with symmetries of its own has fewer distinct variants than transforms: draws stop after
+  max_rounds rounds, so fewer than n variants are returned if the puzzle does not have n.
+  Params: puzzle -> a puzzle string, a list of values, or a Sudoku board.
+    solution -> the solution of the puzzle, in the same forms. Solved if not given.
+    rng -> a numpy random Generator, or a seed for one.
+  Returns: (np.ndarray, np.ndarray) -> the (n, cells) uint8 variants, and their solutions.
+  Raises: ValueError if the puzzle has no solution.
   """
-  def loop_rows(self, f, **kwargs):
-    s = r = c = 0 # square, row, column
-    for i in range(0, 9): # rows
-      r = i % 3
-      if i % 3 == 0 and i != 0:
-        s += 1
-      for j in range(0, 9): # columns
-        c = j % 3
-        if j % 3 == 0 and j != 0: # if this column is in the next square
-          s += 1
-        # do stuff with position [s][r][c]
-        f(s, r, c, **kwargs)
-      # end j loop
-      if (i + 1) % 3 != 0: # if next row is not in the next row of squares
-        s -= 2 # move square back to 
+  def variants(self, puzzle, n: int, solution=None, rng=None, max_rounds: int = 8) -> tuple:
+    rng = np.random.default_rng(rng)
+    puzzle = self.__values__(puzzle)
+    if solution is None:
+      solutions, solved = solve_boards(puzzle[None, :], self.geometry.box)
+      if not solved[0]:
+        raise ValueError("The puzzle has no solution")
+      solution = solutions[0]
+    solution = self.__values__(solution)
+    cells = self.geometry.cell_count
+    puzzles, solutions = np.empty((0, cells), dtype=np.uint8), np.empty((0, cells), dtype=np.uint8)
+    for _ in range(max_rounds):
+      if len(puzzles) >= n:
+        break
+      permutations, digits = self.random_transforms(n - len(puzzles), rng)
+      puzzles = np.concatenate([puzzles, self.apply(puzzle, permutations, digits)])
+      solutions = np.concatenate([solutions, self.apply(solution, permutations, digits)])
+      first = np.sort(np.unique(puzzles, axis=0, return_index=True)[1])
+      puzzles, solutions = puzzles[first], solutions[first]
+    return puzzles[:n], solutions[:n]
+  
+  def __values__(self, board) -> np.ndarray:
+    if isinstance(board, Sudoku):
+      board = board.to_line()
+    if isinstance(board, str):
+      board = parse_puzzle(board, self.geometry)
+    return np.asarray(board, dtype=np.uint8).reshape(self.geometry.cell_count)
 
-  def init_test_junk_board(self):
-    def gen():
-      i = 0
-      while True:
-        yield i
-        i += 1
-    it = gen()
-    def f(s, r, c):
-      self.board[s][r][c] = next(it)
-    
-    self.loop_rows(f)
-    print(self.to_string())
+""" Augment Puzzles
+Grows a pool of puzzles: yields n distinct random variants of every seed puzzle (see TransformEngine.variants),
+each with its solution. The seed puzzles are solved together with solve_boards, and unsolvable ones are skipped.
+Params: puzzles -> a list of puzzle strings (see parse_puzzle).
+  seed -> seed of the random transforms; the same seed yields the same variants.
+Returns: a generator of (puzzle, solution) strings.
+"""
+def augment_puzzles(puzzles: list, n: int, seed: int = None, box: int = 3):
+  engine = TransformEngine(box)
+  rng = np.random.default_rng(seed)
+  puzzles = list(puzzles)
+  solutions, solved = solve_boards(puzzles, box)
+  width = engine.geometry.cell_count
+  for puzzle, solution, ok in zip(puzzles, solutions, solved):
+    if not ok:
+      logger.warning("Skipping unsolvable puzzle %s", puzzle)
+      continue
+    variants, variant_solutions = engine.variants(puzzle, n, solution, rng)
+    lines = _SYMBOL_CODES[variants].tobytes().decode("ascii")
+    solution_lines = _SYMBOL_CODES[variant_solutions].tobytes().decode("ascii")
+    for i in range(len(variants)):
+      yield lines[i * width:(i + 1) * width], solution_lines[i * width:(i + 1) * width]
+
+
+""" Solution Cache
+A bounded, least-recently-used cache of puzzle solutions, consulted by Sudoku.solve(cache=...)
+before searching. Puzzles and solutions are 81-digit strings, as written by Sudoku.to_line().
+Lookups try the puzzle string itself, which is free. With canonical set, they then try its canonical form
+(see canonical_form), which also finds every puzzle equivalent to one solved before. The cached solution of
+the canonical puzzle is then transformed back into the orientation of the puzzle asked for. Computing the
+canonical form costs a few milliseconds per puzzle (and up to hundreds on nearly empty puzzles), more than
+solving most puzzles, so it only pays off on workloads with many equivalent puzzles, and is off by default.
+Each miss computes it once: put reuses the canonical form of the last lookup. Puzzles other than 9x9 are only
+looked up by their string. Unsolvable puzzles are cached as UNSOLVABLE.
+Params: maxsize -> the number of puzzles kept in memory, for each of the two lookups.
+  path -> optional sqlite database file, which keeps every solution across runs, under the canonical form of
+    the puzzle with canonical set (and under the puzzle itself otherwise). Memory misses are looked up there.
+    Writes are committed every commit_interval puts, and on close(). The database is in WAL mode, and waits
+    up to DB_TIMEOUT seconds for a lock, so several processes can share the file.
+  canonical -> whether puzzles are also looked up by their canonical form.
+Attributes: hits, misses -> the number of lookups which found a solution, and which did not.
+"""
+class SolutionCache:
+  
+  DB_TIMEOUT = 30.0
+  
+  def __init__(self, maxsize: int = 4096, path: str = None, commit_interval: int = 256, canonical: bool = False):
+    self.maxsize = maxsize
+    self.canonical = canonical
+    self.hits = 0
+    self.misses = 0
+    self.__exact = OrderedDict()
+    self.__canonical = OrderedDict()
+    self.__last = None # (puzzle, key, transform) of the last canonical lookup, reused by put
+    self.__db = None
+    self.__commit_interval = commit_interval
+    self.__pending = 0
+    if path is not None:
+      self.__db = sqlite3.connect(path, timeout=SolutionCache.DB_TIMEOUT)
+      self.__db.execute("PRAGMA journal_mode=WAL")
+      self.__db.execute("CREATE TABLE IF NOT EXISTS solutions (puzzle TEXT PRIMARY KEY, solution TEXT NOT NULL)")
+  
+  def __len__(self) -> int:
+    return len(self.__canonical)
+  
+  def __remember__(self, entries: OrderedDict, key: str, value: str):
+    entries[key] = value
+    entries.move_to_end(key)
+    if len(entries) > self.maxsize:
+      entries.popitem(last=False)
   
   """
-  Initializes the Sudoku board from a file.
-  The expected file format is 9 lines of 9 unseparated integers, organized by row.
-  However, as white space is removed, the integers may be separated without causing an error.
+  Returns: (str, BoardTransform) -> the key the puzzle is cached under, and the transform from the puzzle to it
+    (None if the key is the puzzle itself).
   """
-  def init_from_file(self, filename: str):
-    b = None
-    with open(filename, "r") as f:
-      b = f.read().replace(" ", "").replace("\n", "")
-      
-    def f(s, r, c, **kwargs):
-      vals = kwargs["vals"]
-      it = kwargs["it"]
-      i = next(it)
-      self.board[s][r][c] = int(vals[i]) if vals[i].isnumeric() else None
-      
-    def gen():
-      i = 0
-      while i < len(b):
-        yield i
-        i += 1
-        
-    self.loop_rows(f, it=gen(), vals=b)
-#      if vals[i].isnumeric():
-#        self.board[s][r][c] = int(vals[i])
-#      else:
-#        self.board[s][r][c] = None
+  def __key__(self, puzzle: str) -> tuple:
+    if not self.canonical or len(puzzle) != 81:
+      return puzzle, None
+    if self.__last is None or self.__last[0] != puzzle:
+      self.__last = (puzzle,) + canonical_form(puzzle)
+    return self.__last[1], self.__last[2]
   
-  """ Position to Indices
-  Maps an absolute position on the board to the three indices used in self.board.
-  Params: An integer representing the absolute position on the board.
-  Returns: Three integers, s, r, c, representing the square, row, and column position in self.board.
   """
-  def pos_to_indices(x: int) -> int:
-    col = x % 9
-    c = col % 3
-    
-    row = (x - col) // 9
-    r = row % 3
-    
-    square_col = 0 if col < 3 else 2 if col > 5 else 1
-    square_row = 0 if row < 3 else 6 if row > 5 else 3
-    s = square_col + square_row
-    
-    return s, r, c
+  Returns: str -> the cached solution of the puzzle, UNSOLVABLE, or None if the puzzle is not in the cache.
+  """
+  def get(self, puzzle: str):
+    solution = self.__exact.get(puzzle)
+    if solution is not None:
+      self.__exact.move_to_end(puzzle)
+      self.hits += 1
+      return solution
+    key, transform = self.__key__(puzzle)
+    found = self.__canonical.get(key)
+    if found is None and self.__db is not None:
+      row = self.__db.execute("SELECT solution FROM solutions WHERE puzzle = ?", (key,)).fetchone()
+      found = row[0] if row else None
+    if found is None:
+      self.misses += 1
+      return None
+    self.__remember__(self.__canonical, key, found)
+    if found == UNSOLVABLE or transform is None:
+      solution = found
+    else:
+      solution = "".join(SYMBOLS[v] for v in transform.invert(parse_puzzle(found)))
+    self.__remember__(self.__exact, puzzle, solution)
+    self.hits += 1
+    return solution
   
-  """ Indices to Position
-  Maps the three indices (square, row, column) to the absolute position on the board.
-  Params: three integers, s, r, c, representing the square, row, and column position in self.board.
-  Returns: An integer representing the absolute position on the board.
   """
-  def indices_to_pos(s: int, r: int, c: int) -> int:
-    # return 9 * (r + s - (s % 3)) + (3 * (s % 3) + c)
-    square_col = s % 3
-    square_row = s - square_col
-    row = r + square_row
-    col = 3 * square_col + c
-    return 9 * row + col
-    
-  """ Solve Puzzle Backtracking
-  Solves the Sudoku puzzle using backtracking.
-  This is a brute-force method of solving Sudoku.
-  While it should be able to solve every solvable Sudoku puzzle,
-  some puzzles may require a large amount of time to solve,
-  given the large amount of possible solutions.
+  Adds the solution of a puzzle, or UNSOLVABLE, to the cache.
   """
-  def solve_puzzle_backtracking(self):
-    def gen():
-      i = 1
-      while i < 10:
-        yield i
-        i += 1
-    
-    """ Check Cell
-    Recursive method which checks the given Sudoku cell and attempts to find
-      a value to place in this cell to solve the puzzle. A recursive call is made
-      only when a value has been selected for the given cell and the board
-      remains in a valid state. If the board ever enters an invalid state,
-      the method will either try a new value, or, if all legal values have failed,
-      resets the offending value to 0 (the empty value) and returns False (backtracks)
-      to the previous calling method.
-    Params: x -> an integer representing the cell of the Sudoku board,
-      where each cell is numbered from 0 to 80, starting from the top-left cell
-      and counting across the rows from left to right, top to bottom.
-    Return: a bool -> True if a solution to this Sudoku board has been found,
-      False otherwise
-    """
-    def check_cell(x: int) -> bool:
-      if x > 80:
-        logger.info("Solution has been found for this board.")
-        return True
-      logger.debug("checking cell %s", x)
-      s, r, c = Sudoku.pos_to_indices(x)
-      if self.board[s][r][c] != Sudoku.EMPTY_VALUE:
-        return check_cell(x + 1)
-      values = gen()
-      for val in values:
-        self.board[s][r][c] = val
-        if not self.__is_valid__():
-          continue
-        logger.debug("Selected value %s for cell %s, about to check cell %s", val, x, x + 1)
-        if check_cell(x + 1):
-          return True
-        logger.debug("Returned to cell %s, current value is %s, checking next value.", x, val)
-      logger.debug("About to backtrack from cell %s (value was %s)", x, self.board[s][r][c])
-      self.board[s][r][c] = Sudoku.EMPTY_VALUE
-      return False
-    
-    start = time.time()
-    if check_cell(0):
-      if self.board_is_solved():
-        end = time.time()
-        final = end - start
-        print(f"Board is solved (in {final} seconds):")
-        print(self.to_string())
-        logger.info("Board was solved in %s seconds", final)
-        return True
-      else:
-        print("Error: Board is not solved, but check_cell returned True.")
-        print(self.to_string())
-        logger.warning("Board was reported solved, but is not actually solved.")
-        return False
-    else:
-      print(f"Board is not solvable (conclusion reached in {time.time() - start} seconds)")
-      print(self.to_string())
-      logger.info("Board was found to be unsolvable in %s seconds", time.time() - start)
-      return False
+  def put(self, puzzle: str, solution: str):
+    self.__remember__(self.__exact, puzzle, solution)
+    key, transform = self.__key__(puzzle)
+    if solution != UNSOLVABLE and transform is not None:
+      solution = "".join(SYMBOLS[v] for v in transform.apply(parse_puzzle(solution)))
+    self.__remember__(self.__canonical, key, solution)
+    if self.__db is not None:
+      self.__db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?)", (key, solution))
+      self.__pending += 1
+      if self.__pending >= self.__commit_interval:
+        self.__db.commit()
+        self.__pending = 0
   
-  """ Generate Board
-  Generates a solvable Sudoku board given a number of clues to generate.
-  Params: n -> An integer representing the number of clues to use for this board.
-    Defaults to 17 (the minimum number of clues needed to solve a Sudoku puzzle).
-  Return: None
   """
-  def generate_board(self, n: int = 17):
-    print("\n")
-    
-    """ Generate Clue
-    Recursive method which generates a clue at the given position, 
-      selected from a list of positions.
-    Params: pos -> an integer representing the position in which to generate a clue on the board.
-      clues -> a list of integers representing positions to place clues.
-    Return: bool -> True if this and all future calls found a clue for positions which
-      did not place the board in an invalid state, False otherwise.
-    """
-    def generate_clue(pos: int, clues: list) -> bool:
-        values = [i for i in range(1, 10)]
-        s, r, c = Sudoku.pos_to_indices(pos)
-        while len(values) > 0:
-          # Try a random value from the remaining values
-          self.board[s][r][c] = values.pop(randint(0, len(values)-1))
-          if self.__is_valid__():
-            if len(clues) > 0:
-              if generate_clue(clues.pop(0), clues):
-                # Received True from recursive call. All clues should be placed.
-                logger.debug("inner generate position returning true")
-                return True
-              else:
-                # Received False from recursive call. At least one clue was invalid. 
-                # Try a new value.
-                logger.debug("inner generate position returned false")
-                continue
-            else:
-              # Base case for recursion. We have finished placing all clues.
-              return True
-          else:
-            # This clue put the board in an invalid state. Try a new value.
-            logger.debug("self.isValid is false")
-#        self.board[s][r][c] = 0
-        # All values at this position failed to produce a valid board.
-        logger.debug("generate position returning false")
-        return False
-    
-    while True:
-      N = [i for i in range(0, 81)]
-      clues = [N.pop(randint(0, len(N)-1)) for _ in range(n)]
-      print(f"Number of clues: {len(clues)}")
-      
-      generate_clue(clues.pop(0), clues)
-      
-      print(self.to_string())
-      board_cpy = self.board.copy()
-      
-      if self.solve_puzzle_backtracking():
-        self.board = board_cpy
+  Returns: dict -> the hit and miss counts and the number of canonical puzzles held in memory, for monitoring.
+  """
+  def info(self) -> dict:
+    return {"hits": self.hits, "misses": self.misses, "size": len(self.__canonical), "maxsize": self.maxsize}
+  
+  """
+  Commits pending writes and closes the sqlite database, if there is one.
+  """
+  def close(self):
+    if self.__db is not None:
+      self.__db.commit()
+      self.__db.close()
+      self.__db = None
+
+""" Grade Puzzle
+Rates the difficulty of a puzzle with TechniqueGrader. Results are cached by puzzle (see GRADE_CACHE_SIZE),
+so puzzles graded again, such as those shared by several runs of a generate and grade pipeline, are not graded
+twice; grade_puzzle.cache_info() and grade_puzzle.cache_clear() inspect and empty the cache.
+Params: puzzle -> the puzzle text (see parse_puzzle).
+  box -> the box size of the puzzle (see Sudoku). Defaults to 3, for 9x9 puzzles.
+Returns: dict -> the grade, as returned by TechniqueGrader.grade.
+"""
+def grade_puzzle(puzzle: str, box: int = 3) -> dict:
+  values = parse_puzzle(puzzle, geometry(box))
+  score, level, techniques, solved = _grade("".join(SYMBOLS[v] for v in values), box)
+  return {"score": score, "level": level, "techniques": dict(techniques), "solved": solved}
+
+GRADE_CACHE_SIZE = 65536
+
+@lru_cache(maxsize=GRADE_CACHE_SIZE)
+def _grade(puzzle: str, box: int) -> tuple:
+  g = geometry(box)
+  grade = TechniqueGrader(parse_puzzle(puzzle, g), g).grade()
+  return grade["score"], grade["level"], tuple(grade["techniques"].items()), grade["solved"]
+
+grade_puzzle.cache_info = _grade.cache_info
+grade_puzzle.cache_clear = _grade.cache_clear
+
+""" Generate Chunk
+Worker function for generate_puzzles. Generates a puzzle for each seed, grades it, and keeps it if it passes
+the filters.
+Returns: (list, int) -> a (puzzle, key, grade) tuple for every puzzle kept, where key identifies the puzzle up to
+  symmetry (its canonical form on 9x9 boards), and the number of puzzles rejected by the filters.
+"""
+def _generate_chunk(seeds: list, clues: int, box: int, levels: tuple, max_clues: int, timeout: float) -> tuple:
+  kept = list()
+  rejected = 0
+  for seed in seeds:
+    G = Sudoku(generate=clues, seed=seed, timeout=timeout, box=box)
+    puzzle = G.to_line()
+    if max_clues is not None and sum(1 for cell in G.cells if cell != Sudoku.EMPTY_VALUE) > max_clues:
+      rejected += 1
+      continue
+    grade = grade_puzzle(puzzle, box)
+    if levels is not None and grade["level"] not in levels:
+      rejected += 1
+      continue
+    kept.append((puzzle, canonical_form(puzzle)[0] if box == 3 else puzzle, grade))
+  return kept, rejected
+
+""" Generate Puzzles
+Bulk generation pipeline: generates puzzles across a pool of worker processes, each going through the stages
+full grid -> clue removal and uniqueness checks (see generate_board) -> grading (see grade_puzzle) -> filters,
+then drops puzzles equivalent by symmetry to one already produced (see canonical_form), and yields the rest
+as they are accepted, so they can be streamed to disk (see write_puzzles).
+Attempt i is seeded with f"{seed}:{i}" whichever worker makes it, and results are used in attempt order, so
+a run is reproducible whatever the number of workers.
+Params: count -> the number of puzzles to produce.
+  clues -> the target number of clues, passed on to generate_board.
+  levels -> only keep puzzles of these difficulty levels (see TechniqueGrader.DIFFICULTY_LEVELS). Defaults to None (any).
+  max_clues -> only keep puzzles with at most this many clues. Defaults to None (any number; generate_board
+    often stops above its target).
+  workers -> the number of worker processes. Defaults to None, which uses one per CPU.
+  seed -> the seed of the run.
+  box -> the box size of the puzzles (see Sudoku). Defaults to 3, for 9x9 puzzles.
+  timeout -> the number of seconds generate_board may spend removing clues from each puzzle. Defaults to None.
+  max_attempts -> give up after this many puzzles were generated, in case the filters are rarely met. Defaults to None.
+  chunksize -> the number of puzzles generated by a worker at a time.
+  progress -> optional callback, called every progress_interval attempts and once at the end with a dict of
+    counts ("attempts", "accepted", "rejected" by the filters, "duplicates", and "surplus" puzzles generated in
+    the last chunks but not needed any more), "seconds", and "per_second" (accepted). The attempts are the sum of
+    the four other counts. The final report is skipped if it would repeat the last periodic one.
+Returns: a generator of (puzzle, grade) tuples, with the puzzle as an 81-digit string.
+"""
+def generate_puzzles(count: int, clues: int = 24, levels: list = None, max_clues: int = None, workers: int = None,
+                     seed: int = 0, box: int = 3, timeout: float = None, max_attempts: int = None, chunksize: int = 8,
+                     progress=None, progress_interval: int = 1000):
+  if levels is not None:
+    known = [level for _, level in TechniqueGrader.DIFFICULTY_LEVELS]
+    unknown = [level for level in levels if level not in known]
+    if unknown:
+      raise ValueError(f"Unknown difficulty levels {unknown}, expected some of {known}")
+    levels = tuple(levels)
+  if chunksize < 1:
+    raise ValueError("chunksize must be at least 1")
+  workers = workers or os.cpu_count() or 1
+  start = time.time()
+  counts = {"attempts": 0, "accepted": 0, "rejected": 0, "duplicates": 0, "surplus": 0}
+  reported = dict() # the counts of the last report
+  
+  def report():
+    reported.update(counts)
+    seconds = time.time() - start
+    progress(dict(counts, seconds=seconds, per_second=counts["accepted"] / seconds if seconds > 0 else None))
+  
+  seen = set()
+  next_progress = progress_interval
+  attempts = 0 # attempts submitted
+  executor = ProcessPoolExecutor(max_workers=workers)
+  try:
+    in_flight = deque()
+    while counts["accepted"] < count:
+      while len(in_flight) < 2 * workers and (max_attempts is None or attempts < max_attempts):
+        n = chunksize if max_attempts is None else min(chunksize, max_attempts - attempts)
+        seeds = [f"{seed}:{i}" for i in range(attempts, attempts + n)]
+        in_flight.append((n, executor.submit(_generate_chunk, seeds, clues, box, levels, max_clues, timeout)))
+        attempts += n
+      if not in_flight:
+        logger.warning("Generation stopped after %s attempts with %s of %s puzzles.", attempts, counts["accepted"], count)
         break
-      else:
-        self.clear_board()
-#        break
-      
-      
+      n, future = in_flight.popleft()
+      kept, rejected = future.result()
+      counts["attempts"] += n
+      counts["rejected"] += rejected
+      for i, (puzzle, key, grade) in enumerate(kept):
+        if counts["accepted"] >= count:
+          counts["surplus"] += len(kept) - i
+          break
+        if key in seen:
+          counts["duplicates"] += 1
+          continue
+        seen.add(key)
+        counts["accepted"] += 1
+        yield puzzle, grade
+      if progress is not None and counts["attempts"] >= next_progress:
+        next_progress = (counts["attempts"] // progress_interval + 1) * progress_interval
+        report()
+  finally:
+    executor.shutdown(wait=False, cancel_futures=True)
+  if progress is not None and reported != counts:
+    report()
+  logger.info("Generated %s puzzles in %s seconds (%s attempts).", counts["accepted"], time.time() - start, counts["attempts"])
 
 def rand_gen():
   l = [i for i in range(1, 10)]
@@ -549,8 +3537,199 @@ def test_combine_digits():
   print(f"expected: {test_value_1} | actual: {actual_value}")
   assert actual_value == test_value_1
   
+
+""" Solve Batch Command
+Runs the solve-batch command: solves every puzzle of args.input and writes the solutions,
+one line per puzzle and in input order, to args.output (or stdout).
+"""
+def solve_batch_command(args):
+  start_time = time.time()
+  count = 0
+  out = open(args.output, "w") if args.output else sys.stdout
+  try:
+    for solution in solve_batch(read_puzzles(args.input), workers=args.workers,
+                                chunksize=args.chunksize, strategy=args.strategy, box=args.box,
+                                cache_size=args.cache_size, canonical_cache=args.canonical_cache):
+      out.write(solution + "\n")
+      count += 1
+  finally:
+    if out is not sys.stdout:
+      out.close()
+  logger.info("Solved batch of %s puzzles in %s seconds.", count, time.time() - start_time)
+
+def generate_command(args):
+  
+  def progress(counts):
+    print(f"{counts['accepted']} accepted of {counts['attempts']} generated ({counts['rejected']} rejected, "
+          f"{counts['duplicates']} duplicates) in {counts['seconds']:.1f} s, {counts['per_second'] or 0:.1f}/s",
+          file=sys.stderr)
+  
+  puzzles = (puzzle for puzzle, _ in generate_puzzles(args.count, args.clues, args.level, args.max_clues, args.workers,
+                                                      args.seed, args.box, args.timeout, args.max_attempts,
+                                                      progress=progress, progress_interval=args.progress_interval))
+  if args.packed:
+    write_packed_puzzles(args.output, puzzles)
+  else:
+    write_puzzles(args.output, puzzles)
+
+def count_command(args):
+  start_time = time.time()
+  if args.resume:
+    if not args.checkpoint:
+      raise SystemExit("--resume needs the --checkpoint file to resume from")
+    search = ResumableSearch.resume(args.checkpoint, args.interval)
+  else:
+    if not args.puzzle:
+      raise SystemExit("a puzzle is needed, unless resuming from a checkpoint")
+    board = Sudoku(filename=args.puzzle, box=args.box) if os.path.exists(args.puzzle) else Sudoku(puzzle=args.puzzle, box=args.box)
+    if not args.checkpoint:
+      print(board.count_solutions(limit=args.limit))
+      return
+    search = ResumableSearch(board, args.checkpoint, args.limit, args.interval if args.interval is not None else 60.0)
+  found = search.run()
+  print(found)
+  for solution in search.solutions:
+    print(solution)
+  logger.info("Counted %s solutions in %s seconds (%s nodes in total).", found, time.time() - start_time, search.stats.nodes)
+
+""" Profile Command
+Runs the profile command: solves args.puzzle, or generates a board if there is none, with a SolveProfiler,
+and writes the profile to args.output.
+"""
+def profile_command(args):
+  profiler = SolveProfiler(sample_interval=args.sample_interval)
+  if args.puzzle:
+    with profiler.section("I/O"):
+      board = Sudoku(filename=args.puzzle, box=args.box) if os.path.exists(args.puzzle) else Sudoku(puzzle=args.puzzle, box=args.box)
+    board.solve(strategy=args.strategy, timeout=args.timeout, profiler=profiler)
+  else:
+    board = Sudoku(puzzle="0" * args.box ** 4, box=args.box)
+    board.generate_board(args.clues, seed=args.seed, timeout=args.timeout, profiler=profiler)
+  profiler.write(args.output)
+  for name, total in sorted(profiler.totals().items(), key=lambda item: -item[1]["us"]):
+    print(f"{name:<20} {total['us'] / 1000:10.2f} ms {total['count']:8} calls")
+  print(f"{board.stats.nodes} nodes, {len(profiler.depth_samples)} depth samples, written to {args.output}")
+
+""" Augment Command
+Runs the augment command: writes args.variants distinct variants of every puzzle of args.input to args.output,
+and their solutions, line for line, to args.solutions if given.
+"""
+def augment_command(args):
+  start_time = time.time()
+  count = 0
+  solutions = open(args.solutions, "w") if args.solutions else None
+  try:
+    with open(args.output, "w") as out:
+      for puzzle, solution in augment_puzzles(read_puzzles(args.input), args.variants, args.seed, args.box):
+        out.write(puzzle + "\n")
+        if solutions is not None:
+          solutions.write(solution + "\n")
+        count += 1
+  finally:
+    if solutions is not None:
+      solutions.close()
+  logger.info("Wrote %s puzzle variants in %s seconds.", count, time.time() - start_time)
+
+def grade_command(args):
+  start_time = time.time()
+  count = 0
+  out = open(args.output, "w") if args.output else sys.stdout
+  try:
+    for puzzle in read_puzzles(args.input):
+      grade = grade_puzzle(puzzle, args.box)
+      out.write(f"{puzzle} {grade['score']} {grade['level']}\n")
+      count += 1
+  finally:
+    if out is not sys.stdout:
+      out.close()
+  logger.info("Graded %s puzzles in %s seconds.", count, time.time() - start_time)
+
+def parse_args(argv=None):
+  parser = argparse.ArgumentParser(description="Generate and solve Sudoku puzzles.")
+  parser.add_argument("--log-config", default=DEFAULT_LOG_CONFIG, help="logging config file (defaults to logging.conf)")
+  parser.add_argument("--async-log", action="store_true", help="write log records from a background thread")
+  subparsers = parser.add_subparsers(dest="command")
+  batch = subparsers.add_parser("solve-batch", help="solve a file with one 81-digit puzzle per line")
+  batch.add_argument("input", help="puzzle file, one puzzle of 81 digits per line (0 for empty cells)")
+  batch.add_argument("-o", "--output", help="solution file (defaults to stdout); "
+                     f"unsolvable puzzles are written as '{UNSOLVABLE}'")
+  batch.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes (defaults to one per CPU)")
+  batch.add_argument("-c", "--chunksize", type=int, default=256, help="puzzles sent to a worker at a time")
+  batch.add_argument("-s", "--strategy", choices=list(Sudoku.SOLVE_STRATEGIES), default="propagation")
+  batch.add_argument("-b", "--box", type=int, default=3, help="box size of the puzzles: 3 for 9x9 (the default), 4 for 16x16")
+  batch.add_argument("--cache-size", type=int, default=0, help="solutions cached by each worker, to skip repeated "
+                     "puzzles (defaults to 0, no cache)")
+  batch.add_argument("--canonical-cache", action="store_true", help="also skip puzzles equivalent by symmetry to one "
+                     "solved before, at the cost of canonicalizing every new puzzle")
+  generate = subparsers.add_parser("generate", help="generate a pack of unique, graded puzzles")
+  generate.add_argument("count", type=int, help="number of puzzles to generate")
+  generate.add_argument("-o", "--output", required=True, help="puzzle file, written as puzzles are accepted")
+  generate.add_argument("--clues", type=int, default=24, help="target number of clues (defaults to 24)")
+  generate.add_argument("--max-clues", type=int, help="only keep puzzles with at most this many clues")
+  generate.add_argument("--level", action="append", choices=[level for _, level in TechniqueGrader.DIFFICULTY_LEVELS],
+                        help="only keep puzzles of this difficulty level (may be repeated)")
+  generate.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes (defaults to one per CPU)")
+  generate.add_argument("--seed", type=int, default=0, help="seed of the run; the same seed generates the same pack")
+  generate.add_argument("-b", "--box", type=int, default=3, help="box size of the puzzles: 3 for 9x9 (the default), 4 for 16x16")
+  generate.add_argument("--timeout", type=float, help="seconds spent removing clues from each puzzle")
+  generate.add_argument("--max-attempts", type=int, help="give up after generating this many puzzles")
+  generate.add_argument("--progress-interval", type=int, default=1000, help="puzzles generated between progress reports")
+  generate.add_argument("--packed", action="store_true", help="write the packed binary format (9x9 only)")
+  count = subparsers.add_parser("count", help="count the solutions of a puzzle, optionally with checkpoints to resume from")
+  count.add_argument("puzzle", nargs="?", help="puzzle file, or the puzzle itself as a line of digits (0 for empty cells)")
+  count.add_argument("-b", "--box", type=int, default=3, help="box size of the puzzle: 3 for 9x9 (the default), 4 for 16x16")
+  count.add_argument("--limit", type=int, help="stop counting at this many solutions")
+  count.add_argument("--checkpoint", help="save the state of the search to this file regularly")
+  count.add_argument("--interval", type=float, help="seconds between checkpoints (defaults to 60)")
+  count.add_argument("--resume", action="store_true", help="continue the search saved in the --checkpoint file")
+  grade = subparsers.add_parser("grade", help="rate the difficulty of every puzzle of a file")
+  grade.add_argument("input", help="puzzle file, one puzzle of 81 digits per line (0 for empty cells)")
+  grade.add_argument("-o", "--output", help="output file (defaults to stdout), with one line per puzzle: "
+                     "the puzzle, its difficulty score, and its level")
+  grade.add_argument("-b", "--box", type=int, default=3, help="box size of the puzzles: 3 for 9x9 (the default), 4 for 16x16")
+  augment = subparsers.add_parser("augment", help="grow a puzzle file with random symmetric variants of its puzzles")
+  augment.add_argument("input", help="puzzle file, one puzzle per line (0 for empty cells)")
+  augment.add_argument("-n", "--variants", type=int, required=True, help="distinct variants written for every puzzle")
+  augment.add_argument("-o", "--output", required=True, help="file the variants are written to, one per line")
+  augment.add_argument("--solutions", help="file their solutions are written to, line for line")
+  augment.add_argument("--seed", type=int, help="seed of the run; the same seed writes the same variants")
+  augment.add_argument("-b", "--box", type=int, default=3, help="box size of the puzzles: 3 for 9x9 (the default), 4 for 16x16")
+  profile = subparsers.add_parser("profile", help="profile solving a puzzle, or generating a board, and write "
+                                  "a flamegraph or a trace of it")
+  profile.add_argument("puzzle", nargs="?", help="puzzle file, or the puzzle itself as a line of digits (0 for empty "
+                       "cells); a board is generated if it is left out")
+  profile.add_argument("-o", "--output", required=True, help="profile file: a Chrome trace if its name ends with .json, "
+                       "collapsed stacks for flamegraph.pl or speedscope otherwise")
+  profile.add_argument("-s", "--strategy", choices=list(Sudoku.SOLVE_STRATEGIES), default="propagation")
+  profile.add_argument("-b", "--box", type=int, default=3, help="box size of the puzzle: 3 for 9x9 (the default), 4 for 16x16")
+  profile.add_argument("--clues", type=int, default=24, help="target number of clues of the generated board")
+  profile.add_argument("--seed", type=int, help="seed of the generated board")
+  profile.add_argument("--timeout", type=float, help="seconds the solve or the generation may take")
+  profile.add_argument("--sample-interval", type=int, default=100, help="search nodes between two depth samples")
+  return parser.parse_args(argv)
     
-def main():
+def main(argv=None):
+  args = parse_args(argv)
+  configure_logging(args.log_config, asynchronous=args.async_log)
+  logger.info("Sudoku running as main.")
+  if args.command == "solve-batch":
+    solve_batch_command(args)
+    return
+  if args.command == "grade":
+    grade_command(args)
+    return
+  if args.command == "generate":
+    generate_command(args)
+    return
+  if args.command == "count":
+    count_command(args)
+    return
+  if args.command == "profile":
+    profile_command(args)
+    return
+  if args.command == "augment":
+    augment_command(args)
+    return
 #  T = Sudoku(filename="sudoku_solver_test_02.txt")
 #  print(T.to_string())
 #  print(T.board_is_solved())
@@ -570,5 +3749,4 @@ def main():
   E.to_file("sudoku_output_test_00.txt")
   
 if __name__ == "__main__":
-  logger.info("Sudoku running as main.")
   main()
\ No newline at end of file
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the Sudoku solvers and generator.
+
+Runs every selected solving strategy against the bundled puzzle corpora (9x9, and one of 16x16 puzzles), and generate_board
+at several clue counts, and reports throughput (puzzles/sec), latency percentiles,
+search nodes explored, and peak memory. Results can be written as JSON to track
+regressions between releases:
+
+  python sudoku_bench.py --json bench.json
+
+Every corpus is also solved as a batch with solve_boards, whose latency is the batch time per puzzle.
+With --parallel-workers, every corpus is also solved one puzzle at a time with Sudoku.solve_parallel,
+and its speedup over the serial solves is reported.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+from sudoku import Sudoku, read_puzzles, solve_boards
+
+logger = logging.getLogger('sudoku')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPORA = {
+  "easy": "sudoku_bench_easy.txt",
+  "hard": "sudoku_bench_hard.txt",
+  "17-clue": "sudoku_bench_17.txt",
+  "16x16": "sudoku_bench_16x16.txt",
+}
+# Box size of the corpora that are not 9x9
+CORPUS_BOX = {"16x16": 4}
+# Backtracking takes minutes on the hard and 17-clue corpora, so it is opt-in. It is never run on
+# corpora larger than 9x9, where it does not finish.
+DEFAULT_STRATEGIES = ["propagation", "dlx"]
+DEFAULT_GENERATE_CLUES = [40, 30, 24]
+
+"""
+Loads a bundled corpus by name, as a list of puzzle strings.
+"""
+def load_corpus(name: str) -> list:
+  return list(read_puzzles(os.path.join(BENCH_DIR, CORPORA[name])))
+
+"""
+Summarizes a list of per-item latencies (in seconds) and the wall time they took together.
+Returns: dict -> throughput and latency percentiles in milliseconds.
+"""
+def summarize(latencies: list, total: float) -> dict:
+  ms = np.array(latencies) * 1000
+  return {
+    "count": len(latencies),
+    "total_seconds": total,
+    "per_second": len(latencies) / total if total > 0 else None,
+    "latency_ms": {
+      "mean": float(ms.mean()),
+      "p50": float(np.percentile(ms, 50)),
+      "p95": float(np.percentile(ms, 95)),
+      "p99": float(np.percentile(ms, 99)),
+      "max": float(ms.max()),
+    },
+  }
+
+"""
+Runs f on every item with tracemalloc enabled, in a pass separate from the timed one
+(tracing slows allocation down considerably).
+Returns: int -> the peak traced memory, in KiB.
+"""
+def measure_peak_memory(f, items: list) -> int:
+  tracemalloc.start()
+  try:
+    for item in items:
+      f(item)
+    return tracemalloc.get_traced_memory()[1] // 1024
+  finally:
+    tracemalloc.stop()
+
+""" Bench Solve
+Solves every puzzle of the corpus with the given strategy, repeat times.
+box is the box size of the puzzles (see Sudoku).
+Returns: dict -> the benchmark result, including the search nodes explored per puzzle.
+"""
+def bench_solve(strategy: str, corpus: str, puzzles: list, repeat: int = 1, box: int = 3) -> dict:
+  latencies = list()
+  nodes = list()
+  unsolved = 0
+  start = time.perf_counter()
+  for _ in range(repeat):
+    for puzzle in puzzles:
+      t = time.perf_counter()
+      S = Sudoku(puzzle=puzzle, box=box)
+      if not S.solve(strategy=strategy):
+        unsolved += 1
+      latencies.append(time.perf_counter() - t)
+      nodes.append(S.stats.nodes)
+  result = {"benchmark": "solve", "strategy": strategy, "corpus": corpus}
+  result.update(summarize(latencies, time.perf_counter() - start))
+  result["unsolved"] = unsolved
+  result["nodes"] = {"total": int(sum(nodes)), "mean": float(np.mean(nodes)), "max": int(max(nodes))}
+  result["peak_memory_kib"] = measure_peak_memory(lambda p: Sudoku(puzzle=p, box=box).solve(strategy=strategy), puzzles)
+  return result
+
+""" Bench Batch
+Solves the whole corpus at once with solve_boards, repeat times.
+Returns: dict -> the benchmark result, with the time of each batch spread evenly over its puzzles.
+"""
+def bench_batch(strategy: str, corpus: str, puzzles: list, repeat: int = 1, box: int = 3) -> dict:
+  latencies = list()
+  unsolved = 0
+  start = time.perf_counter()
+  for _ in range(repeat):
+    t = time.perf_counter()
+    _, solved = solve_boards(puzzles, box, strategy)
+    latencies.extend([(time.perf_counter() - t) / len(puzzles)] * len(puzzles))
+    unsolved += int((~solved).sum())
+  result = {"benchmark": "batch", "strategy": strategy, "corpus": corpus}
+  result.update(summarize(latencies, time.perf_counter() - start))
+  result["unsolved"] = unsolved
+  result["peak_memory_kib"] = measure_peak_memory(lambda p: solve_boards(p, box, strategy), [puzzles])
+  return result
+
+""" Bench Parallel
+Solves every puzzle of the corpus both serially and with solve_parallel, one puzzle at a time.
+Returns: dict -> the benchmark result of the parallel solves, with the speedup of their total wall time
+  over the serial one. The pool started by every parallel solve is included in its latency.
+"""
+def bench_parallel(strategy: str, corpus: str, puzzles: list, workers: int, split_depth: int = None, box: int = 3) -> dict:
+  start = time.perf_counter()
+  for puzzle in puzzles:
+    Sudoku(puzzle=puzzle, box=box).solve(strategy=strategy)
+  serial = time.perf_counter() - start
+  latencies = list()
+  unsolved = 0
+  start = time.perf_counter()
+  for puzzle in puzzles:
+    t = time.perf_counter()
+    if not Sudoku(puzzle=puzzle, box=box).solve_parallel(workers, strategy, split_depth):
+      unsolved += 1
+    latencies.append(time.perf_counter() - t)
+  result = {"benchmark": "parallel", "strategy": strategy, "corpus": corpus, "workers": workers}
+  result.update(summarize(latencies, time.perf_counter() - start))
+  result["unsolved"] = unsolved
+  result["serial_seconds"] = serial
+  result["speedup"] = serial / result["total_seconds"]
+  return result
+
+""" Bench Generate
+Generates count boards with the given target number of clues, seeded 0 to count - 1 so runs are comparable.
+Returns: dict -> the benchmark result, including the number of clues actually reached.
+"""
+def bench_generate(clues: int, count: int) -> dict:
+  latencies = list()
+  reached = list()
+  start = time.perf_counter()
+  for seed in range(count):
+    t = time.perf_counter()
+    G = Sudoku(generate=clues, seed=seed)
+    latencies.append(time.perf_counter() - t)
+    reached.append(sum(1 for cell in G.cells if cell != Sudoku.EMPTY_VALUE))
+  result = {"benchmark": "generate", "clues": clues}
+  result.update(summarize(latencies, time.perf_counter() - start))
+  result["clues_reached"] = {"mean": float(np.mean(reached)), "min": int(min(reached)), "max": int(max(reached))}
+  result["peak_memory_kib"] = measure_peak_memory(lambda seed: Sudoku(generate=clues, seed=seed), range(min(count, 3)))
+  return result
+
+""" Run
+Runs the solver benchmarks for every strategy and corpus, then the generator benchmarks.
+Returns: dict -> the environment and a list of benchmark results, ready to be written as JSON.
+"""
+def run(strategies: list = DEFAULT_STRATEGIES, corpora: list = list(CORPORA),
+        generate_clues: list = DEFAULT_GENERATE_CLUES, generate_count: int = 10, repeat: int = 1,
+        parallel_workers: int = None) -> dict:
+  results = list()
+  for corpus in corpora:
+    puzzles = load_corpus(corpus)
+    box = CORPUS_BOX.get(corpus, 3)
+    for strategy in strategies:
+      if strategy == "backtracking" and box > 3:
+        continue
+      results.append(bench_solve(strategy, corpus, puzzles, repeat, box))
+      results.append(bench_batch(strategy, corpus, puzzles, repeat, box))
+      if parallel_workers:
+        results.append(bench_parallel(strategy, corpus, puzzles, parallel_workers, box=box))
+  for clues in generate_clues:
+    results.append(bench_generate(clues, generate_count))
+  return {
+    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    "python": platform.python_version(),
+    "numpy": np.__version__,
+    "machine": platform.machine(),
+    "results": results,
+  }
+
+"""
+Returns a one-line, human-readable summary of a benchmark result.
+"""
+def format_result(result: dict) -> str:
+  if result["benchmark"] == "solve":
+    name = f"solve {result['strategy']:<12} {result['corpus']:<8}"
+    extra = f"nodes/puzzle {result['nodes']['mean']:9.1f}"
+  elif result["benchmark"] == "batch":
+    name = f"batch {result['strategy']:<12} {result['corpus']:<8}"
+    extra = f"unsolved {result['unsolved']}"
+  elif result["benchmark"] == "parallel":
+    name = f"parallel {result['strategy']:<9} {result['corpus']:<8}"
+    extra = f"speedup x{result['speedup']:.2f} on {result['workers']} workers"
+  else:
+    name = f"generate {result['clues']:>2} clues{'':<8}"
+    extra = f"clues reached {result['clues_reached']['mean']:5.1f}"
+  lat = result["latency_ms"]
+  return (f"{name} {result['per_second']:9.1f}/s  p50 {lat['p50']:8.2f} ms  p95 {lat['p95']:8.2f} ms  "
+          f"p99 {lat['p99']:8.2f} ms  {extra}" + (f"  peak {result['peak_memory_kib']} KiB" if "peak_memory_kib" in result else ""))
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark the Sudoku solvers and generator.")
+  parser.add_argument("--strategies", nargs="+", default=DEFAULT_STRATEGIES, choices=list(Sudoku.SOLVE_STRATEGIES))
+  parser.add_argument("--corpora", nargs="+", default=list(CORPORA), choices=list(CORPORA))
+  parser.add_argument("--generate-clues", nargs="*", type=int, default=DEFAULT_GENERATE_CLUES,
+                      help="clue counts to benchmark generate_board at (none to skip)")
+  parser.add_argument("--generate-count", type=int, default=10, help="boards generated per clue count")
+  parser.add_argument("--repeat", type=int, default=1, help="times each corpus is solved")
+  parser.add_argument("--parallel-workers", type=int, help="also benchmark solve_parallel with this many workers")
+  parser.add_argument("--json", help="write the results to this JSON file")
+  args = parser.parse_args(argv)
+
+  # Per-solve log records would dominate the timings
+  logger.setLevel(logging.WARNING)
+  report = run(args.strategies, args.corpora, args.generate_clues, args.generate_count, args.repeat,
+               args.parallel_workers)
+  for result in report["results"]:
+    print(format_result(result))
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Line-based Sudoku solving service.
+
+Clients connect over TCP or a Unix socket and send one puzzle per line (81 digits, 0 or . for empty cells).
+For every puzzle the server answers one line, in the order the puzzles were sent: the solution as 81 digits,
+"unsolvable", "timeout", or "error: <reason>". Puzzles are solved in a pool of worker processes (see solve_async),
+each with a deadline, so one hard puzzle cannot hold a worker or a connection forever.
+
+At most max_concurrency puzzles are in flight across all connections. Once that many are, the server stops
+reading from its connections, so clients are slowed down by TCP flow control instead of the server queueing
+unbounded work. Each connection also has at most pipeline puzzles waiting for their answer to be written.
+
+  python sudoku_server.py --port 8765 --workers 4 --timeout 5
+  python sudoku_server.py --unix /tmp/sudoku.sock
+  python sudoku_server.py --load-test sudoku_bench_hard.txt --port 8765 --connections 8
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sudoku import Sudoku, SolveTimeout, UNSOLVABLE, solve_async, read_puzzles, configure_logging
+
+logger = logging.getLogger('sudoku')
+
+TIMEOUT = "timeout"
+DEFAULT_PORT = 8765
+
+""" Solve Server
+Params: executor -> the process pool puzzles are solved in.
+  max_concurrency -> the most puzzles being solved at once, across all connections.
+  timeout -> seconds each puzzle may take, from the moment it is read. None for no limit.
+  strategy -> the solving strategy, one of the keys of Sudoku.SOLVE_STRATEGIES.
+  pipeline -> the most puzzles of one connection waiting for their answer to be written.
+"""
+class SolveServer:
+  def __init__(self, executor, max_concurrency: int, timeout: float = 10.0, strategy: str = "propagation",
+               pipeline: int = 64):
+    if strategy not in Sudoku.SOLVE_STRATEGIES:
+      raise ValueError(f"Unknown solving strategy '{strategy}', expected one of {list(Sudoku.SOLVE_STRATEGIES)}")
+    self.executor = executor
+    self.slots = asyncio.Semaphore(max_concurrency)
+    self.timeout = timeout
+    self.strategy = strategy
+    self.pipeline = pipeline
+    self.counts = {"solved": 0, UNSOLVABLE: 0, TIMEOUT: 0, "error": 0}
+
+  """ Answer
+  Solves one puzzle line and frees its concurrency slot, whatever the outcome.
+  Returns: str -> the response line, without the newline.
+  """
+  async def __answer__(self, line: str) -> str:
+    try:
+      board = Sudoku(puzzle=line)
+      solved = await solve_async(board, self.timeout, self.strategy, self.executor)
+    except SolveTimeout:
+      self.counts[TIMEOUT] += 1
+      return TIMEOUT
+    except ValueError as e:
+      self.counts["error"] += 1
+      return f"error: {e}"
+    except Exception as e:
+      # e.g. a crashed worker process: keep serving the connection
+      logger.exception("Failed to solve %s", line)
+      self.counts["error"] += 1
+      return f"error: {type(e).__name__}"
+    finally:
+      self.slots.release()
+    if solved is None:
+      self.counts[UNSOLVABLE] += 1
+      return UNSOLVABLE
+    self.counts["solved"] += 1
+    return solved.to_line()
+
+  """
+  Counts a line refused without solving it.
+  Returns: str -> the error response line, without the newline.
+  """
+  async def __reject__(self, reason: str) -> str:
+    self.counts["error"] += 1
+    return f"error: {reason}"
+
+  """ Respond
+  Writes the answers of a connection in the order its puzzles arrived, until it gets None.
+  If the client goes away, the remaining answers are still awaited (so their slots are freed) but not written.
+  """
+  async def __respond__(self, pending: asyncio.Queue, writer: asyncio.StreamWriter):
+    connected = True
+    while (task := await pending.get()) is not None:
+      answer = await task
+      if not connected:
+        continue
+      try:
+        writer.write(answer.encode() + b"\n")
+        await writer.drain()
+      except ConnectionError:
+        connected = False
+
+  """ Handle
+  Serves one connection: reads puzzle lines, starts solving each as soon as a concurrency slot is free,
+  and hands the tasks to the responder in arrival order.
+  """
+  async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    pending = asyncio.Queue(self.pipeline)
+    responder = asyncio.create_task(self.__respond__(pending, writer))
+    try:
+      while True:
+        try:
+          line = await reader.readline()
+        except ValueError:
+          # The line is longer than the stream limit: answer it, then drop the connection
+          await pending.put(asyncio.create_task(self.__reject__("line too long")))
+          break
+        except ConnectionError:
+          break
+        if not line:
+          break
+        line = line.decode(errors="replace").strip()
+        if not line:
+          continue
+        await self.slots.acquire()
+        await pending.put(asyncio.create_task(self.__answer__(line)))
+    finally:
+      await pending.put(None)
+      await responder
+      writer.close()
+      try:
+        await writer.wait_closed()
+      except ConnectionError:
+        pass
+
+  """ Start
+  Starts listening on a Unix socket if path is given, on host:port otherwise.
+  Returns: asyncio.Server -> the listening server.
+  """
+  async def start(self, host: str = None, port: int = DEFAULT_PORT, path: str = None) -> asyncio.Server:
+    if path:
+      server = await asyncio.start_unix_server(self.handle, path=path)
+    else:
+      server = await asyncio.start_server(self.handle, host, port)
+    logger.info("Solving service listening on %s", path or server.sockets[0].getsockname())
+    return server
+
+""" Load Test
+Sends the puzzles to a running server over several connections, pipelining each connection's puzzles,
+and measures each puzzle's latency from when it was sent to when its answer arrived.
+Returns: dict -> throughput, latency percentiles (see sudoku_bench.summarize) and the number of each kind of answer.
+"""
+async def load_test(puzzles: list, host: str = None, port: int = DEFAULT_PORT, path: str = None,
+                    connections: int = 4) -> dict:
+  from sudoku_bench import summarize
+
+  latencies = list()
+  answers = dict()
+
+  async def connection(batch: list):
+    if path:
+      reader, writer = await asyncio.open_unix_connection(path)
+    else:
+      reader, writer = await asyncio.open_connection(host or "localhost", port)
+    sent = list()
+
+    async def send():
+      for puzzle in batch:
+        sent.append(time.perf_counter())
+        writer.write(puzzle.encode() + b"\n")
+        await writer.drain()
+
+    sender = asyncio.create_task(send())
+    for i in range(len(batch)):
+      answer = (await reader.readline()).decode().strip()
+      latencies.append(time.perf_counter() - sent[i])
+      kind = answer if answer in (UNSOLVABLE, TIMEOUT) else "error" if answer.startswith("error") else "solved"
+      answers[kind] = answers.get(kind, 0) + 1
+    await sender
+    writer.close()
+    await writer.wait_closed()
+
+  start = time.perf_counter()
+  await asyncio.gather(*(connection(puzzles[i::connections]) for i in range(connections) if puzzles[i::connections]))
+  result = summarize(latencies, time.perf_counter() - start)
+  result["answers"] = answers
+  return result
+
+async def serve(args):
+  workers = args.workers or os.cpu_count() or 1
+  executor = ProcessPoolExecutor(max_workers=workers)
+  service = SolveServer(executor, args.max_concurrency or 2 * workers, args.timeout, args.strategy)
+  server = await service.start(args.host, args.port, args.unix)
+  try:
+    async with server:
+      await server.serve_forever()
+  finally:
+    logger.info("Solving service stopped, answers: %s", service.counts)
+    executor.shutdown(cancel_futures=True)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Serve Sudoku solving over TCP or a Unix socket, one puzzle per line.")
+  parser.add_argument("--host", help="interface to listen on (default: all)")
+  parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+  parser.add_argument("--unix", help="listen on (or, with --load-test, connect to) this Unix socket instead")
+  parser.add_argument("--workers", type=int, help="solver processes (default: one per CPU)")
+  parser.add_argument("--max-concurrency", type=int, help="puzzles solved at once (default: twice the workers)")
+  parser.add_argument("--timeout", type=float, default=10.0, help="seconds each puzzle may take")
+  parser.add_argument("--strategy", default="propagation", choices=list(Sudoku.SOLVE_STRATEGIES))
+  parser.add_argument("--load-test", metavar="FILE", help="act as a client: send the puzzles in FILE and report latencies")
+  parser.add_argument("--connections", type=int, default=4, help="client connections used by --load-test")
+  args = parser.parse_args(argv)
+
+  configure_logging()
+  try:
+    if args.load_test:
+      puzzles = list(read_puzzles(args.load_test))
+      print(json.dumps(asyncio.run(load_test(puzzles, args.host, args.port, args.unix, args.connections)), indent=2))
+    else:
+      asyncio.run(serve(args))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == "__main__":
+  main()
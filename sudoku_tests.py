@@ -17,8 +17,20 @@ Created on Fri Mar 11 10:51:07 2022
 286134795
 """
 
-from sudoku import Sudoku
-import logging, logging.config
+from sudoku import Sudoku, ConstraintState, solve_batch, UNSOLVABLE, validate_boards, squares_to_grids
+import sudoku
+import sudoku_bench
+import sudoku_server
+import asyncio
+import json
+import numpy as np
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import logging, logging.config, logging.handlers
 
 #logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', datefmt="%Y-%m-%d %H:%M:%S", level=logging.DEBUG, filename="sudoku_tests.log", filemode="w")
 
@@ -48,10 +60,766 @@ def test_sudoku_init_from_file():
   assert (Actual.board[8] == expected_square_eight).all()
   logger.info("End of test: test_sudoku_init_from_file. Result: Passed")
 
+def test_constraint_state_place_unplace():
+  # Arrange
+  logger.info("Beginning test: test_constraint_state_place_unplace")
+  state = ConstraintState()
+  
+  # Act
+  state.place(0, 5)
+  
+  # Assert
+  assert not state.can_place(8, 5) # same row
+  assert not state.can_place(72, 5) # same column
+  assert not state.can_place(20, 5) # same square
+  assert state.can_place(40, 5)
+  state.unplace(0, 5)
+  assert state.can_place(8, 5)
+  logger.info("End of test: test_constraint_state_place_unplace. Result: Passed")
+
+def test_solve_puzzle_backtracking():
+  # Arrange
+  logger.info("Beginning test: test_solve_puzzle_backtracking")
+  Puzzle = Sudoku(filename = "sudoku_solver_test_02.txt")
+  clues = Puzzle.board.copy()
+  
+  # Act
+  solved = Puzzle.solve_puzzle_backtracking()
+  
+  # Assert
+  assert solved
+  assert Puzzle.board_is_solved()
+  assert (Puzzle.board[clues != 0] == clues[clues != 0]).all()
+  logger.info("End of test: test_solve_puzzle_backtracking. Result: Passed")
+
+def test_solve_propagation_seventeen_clues():
+  # Arrange
+  logger.info("Beginning test: test_solve_propagation_seventeen_clues")
+  Puzzle = Sudoku(filename = "sudoku_solver_test_03.txt")
+  clues = Puzzle.board.copy()
+  
+  # Act
+  solved = Puzzle.solve(strategy = "propagation")
+  
+  # Assert
+  assert solved
+  assert Puzzle.board_is_solved()
+  assert (Puzzle.board[clues != 0] == clues[clues != 0]).all()
+  logger.info("End of test: test_solve_propagation_seventeen_clues. Result: Passed")
+
+def test_solve_unsolvable_board():
+  # Arrange
+  logger.info("Beginning test: test_solve_unsolvable_board")
+  Puzzle = Sudoku(filename = "sudoku_test_00.txt")
+  Puzzle.clear_board()
+  for i, val in enumerate([1, 2, 3, 4, 5, 6, 7, 8]): # top row, last cell left empty
+    Puzzle.board[i // 3][0][i % 3] = val
+  Puzzle.board[8][2][2] = 9 # 9 in the last column, so the empty cell has no candidates
+  original = Puzzle.board.copy()
+  
+  # Act / Assert
+  for strategy in Sudoku.SOLVE_STRATEGIES:
+    assert not Puzzle.solve(strategy = strategy)
+    assert (Puzzle.board == original).all()
+  solve_propagation = Sudoku.__solve_propagation__
+  def broken(self, stats): # reports a solution, but leaves an invalid board
+    self.cells[:] = bytes([1]) * len(self.cells)
+    return True
+  Sudoku.__solve_propagation__ = broken
+  try:
+    assert not Puzzle.solve(strategy = "propagation")
+  finally:
+    Sudoku.__solve_propagation__ = solve_propagation
+  assert (Puzzle.board == original).all()
+  logger.info("End of test: test_solve_unsolvable_board. Result: Passed")
+
+def test_iter_solutions_enumerates_all():
+  # Arrange
+  logger.info("Beginning test: test_iter_solutions_enumerates_all")
+  Puzzle = Sudoku(filename = "sudoku_solver_test_02.txt") # has exactly two solutions
+  original = Puzzle.board.copy()
+  
+  # Act
+  solutions = list(Puzzle.iter_solutions())
+  
+  # Assert
+  assert len(solutions) == 2
+  assert not (solutions[0] == solutions[1]).all()
+  assert (Puzzle.board == original).all()
+  assert Puzzle.solve(strategy = "dlx")
+  assert Puzzle.board_is_solved()
+  logger.info("End of test: test_iter_solutions_enumerates_all. Result: Passed")
+
+def test_solve_batch_keeps_input_order():
+  # Arrange
+  logger.info("Beginning test: test_solve_batch_keeps_input_order")
+  files = ["sudoku_solver_test_01.txt", "dummy.txt", "sudoku_solver_test_03.txt"]
+  puzzles = [Sudoku(filename = name).to_line() for name in files] * 3
+  
+  # Act
+  solutions = list(solve_batch(puzzles, workers = 2, chunksize = 2))
+  
+  # Assert
+  assert len(solutions) == len(puzzles)
+  for puzzle, solution in zip(puzzles, solutions):
+    if puzzle == puzzles[1]: # dummy.txt repeats digits within its squares
+      assert solution == UNSOLVABLE
+      continue
+    Solved = Sudoku(puzzle = solution)
+    assert Solved.board_is_solved()
+    assert all(p == "0" or p == s for p, s in zip(puzzle, solution))
+  logger.info("End of test: test_solve_batch_keeps_input_order. Result: Passed")
+
+def test_validate_boards_matches_board_is_solved():
+  # Arrange
+  logger.info("Beginning test: test_validate_boards_matches_board_is_solved")
+  files = ["sudoku_test_00.txt", "sudoku_solver_test_01.txt", "dummy.txt", "sudoku_solver_test_03.txt"]
+  boards = np.array([Sudoku(filename = name).board for name in files])
+  expected_valid = [True, True, False, True]
+  expected_solved = [True, False, False, False]
+  
+  # Act
+  valid, solved = validate_boards(boards, chunk_size = 3)
+  grid_valid, grid_solved = validate_boards(squares_to_grids(boards))
+  
+  # Assert
+  assert list(valid) == expected_valid and list(grid_valid) == expected_valid
+  assert list(solved) == expected_solved and list(grid_solved) == expected_solved
+  assert [Sudoku(filename = name).board_is_solved() for name in files] == expected_solved
+  logger.info("End of test: test_validate_boards_matches_board_is_solved. Result: Passed")
+
+def test_flat_board_views_and_snapshot():
+  # Arrange
+  logger.info("Beginning test: test_flat_board_views_and_snapshot")
+  Actual = Sudoku(filename = "sudoku_test_00.txt")
+  
+  # Act
+  saved = Actual.snapshot()
+  Actual.row_view(4)[0, 0] = 0 # first cell of row 4 is square 3, row 1, column 0
+  
+  # Assert
+  assert len(Actual.cells) == 81
+  assert list(Actual.row_view(0).flatten()) == [1, 6, 8, 4, 5, 7, 9, 3, 2]
+  assert list(Actual.col_view(0).flatten()) == [1, 5, 9, 8, 0, 7, 3, 4, 2]
+  assert (Actual.square_view(8) == [[6, 4, 1], [8, 2, 3], [7, 9, 5]]).all()
+  assert Actual.board[3][1][0] == 0
+  Actual.restore(saved)
+  assert Actual.board[3][1][0] == 6
+  assert Actual.board_is_solved()
+  logger.info("End of test: test_flat_board_views_and_snapshot. Result: Passed")
+
+def test_position_lookup_tables():
+  # Arrange
+  logger.info("Beginning test: test_position_lookup_tables")
+  
+  # Act / Assert
+  assert Sudoku.pos_to_indices(0) == (0, 0, 0)
+  assert Sudoku.pos_to_indices(40) == (4, 1, 1)
+  assert Sudoku.pos_to_indices(80) == (8, 2, 2)
+  for x in sudoku.POSITIONS:
+    assert Sudoku.indices_to_pos(*Sudoku.pos_to_indices(x)) == x
+    assert len(sudoku.PEERS[x]) == 20
+    assert x not in sudoku.PEERS[x]
+    for u in sudoku.UNITS_OF_POS[x]:
+      assert x in sudoku.UNITS[u]
+      assert set(sudoku.UNITS[u]) - {x} <= set(sudoku.PEERS[x])
+  logger.info("End of test: test_position_lookup_tables. Result: Passed")
+
+def test_generate_board_unique_and_reproducible():
+  # Arrange
+  logger.info("Beginning test: test_generate_board_unique_and_reproducible")
+  
+  # Act
+  Actual = Sudoku(generate = 30, seed = 7)
+  Again = Sudoku(generate = 30, seed = 7)
+  
+  # Assert
+  assert Actual == Again
+  assert sum(1 for cell in Actual.cells if cell) == 30
+  assert Actual.has_unique_solution()
+  logger.info("End of test: test_generate_board_unique_and_reproducible. Result: Passed")
+
+def test_count_solutions_with_limit():
+  # Arrange
+  logger.info("Beginning test: test_count_solutions_with_limit")
+  Puzzle = Sudoku(filename = "sudoku_solver_test_02.txt") # has exactly two solutions
+  Many = Sudoku(filename = "sudoku_solver_test_03.txt") # has many solutions
+  original = Puzzle.snapshot()
+  
+  # Act / Assert
+  for strategy in Sudoku.SOLVE_STRATEGIES:
+    assert Puzzle.count_solutions(strategy = strategy) == 2
+    assert Puzzle.count_solutions(limit = 1, strategy = strategy) == 1
+  assert Many.count_solutions(limit = 5, strategy = "propagation") == 5
+  assert Many.count_solutions(limit = 5, strategy = "dlx") == 5
+  assert Puzzle.snapshot() == original
+  assert not Puzzle.has_unique_solution()
+  assert Sudoku(filename = "sudoku_solver_test_00.txt").has_unique_solution()
+  logger.info("End of test: test_count_solutions_with_limit. Result: Passed")
+
+def test_bench_corpora_and_report():
+  # Arrange
+  logger.info("Beginning test: test_bench_corpora_and_report")
+  corpora = {name: sudoku_bench.load_corpus(name) for name in sudoku_bench.CORPORA}
+  
+  # Act
+  result = sudoku_bench.bench_solve("propagation", "17-clue", corpora["17-clue"][:2])
+  
+  # Assert
+  for name, puzzles in corpora.items():
+    assert len(puzzles) > 0
+    box = sudoku_bench.CORPUS_BOX.get(name, 3)
+    for puzzle in puzzles[:2] if box > 3 else puzzles: # uniqueness checks of 16x16 puzzles are slow
+      assert Sudoku(puzzle = puzzle, box = box).has_unique_solution()
+  assert all(puzzle.count("0") == 81 - 17 for puzzle in corpora["17-clue"])
+  assert result["count"] == 2 and result["unsolved"] == 0
+  assert result["nodes"]["total"] >= 2
+  assert set(result["latency_ms"]) >= {"p50", "p95", "p99"}
+  logger.info("End of test: test_bench_corpora_and_report. Result: Passed")
+
+def test_solve_stats_and_progress():
+  # Arrange
+  logger.info("Beginning test: test_solve_stats_and_progress")
+  Puzzle = Sudoku(puzzle = sudoku_bench.load_corpus("hard")[0])
+  samples = list()
+  
+  # Act
+  solved = Puzzle.solve(strategy = "propagation", progress = lambda stats: samples.append(stats.nodes),
+                        progress_interval = 10)
+  stats = Puzzle.stats.as_dict()
+  
+  # Assert
+  assert solved
+  assert stats["nodes"] > 10 and stats["backtracks"] > 0 and stats["checks"] > 0
+  assert 0 < stats["max_depth"] < stats["nodes"]
+  assert set(stats["wall"]) == {"parse", "propagate", "search", "verify"}
+  assert samples == list(range(10, stats["nodes"] + 1, 10))
+  Puzzle = Sudoku(filename = "sudoku_solver_test_01.txt")
+  Puzzle.solve_puzzle_backtracking()
+  assert Puzzle.stats.nodes == 9 and Puzzle.stats.max_depth == 8 # nine empty cells, no backtracking
+  Generated = Sudoku(generate = 40, seed = 1)
+  assert set(Generated.stats.wall) == {"fill", "remove", "parse", "search"}
+  logger.info("End of test: test_solve_stats_and_progress. Result: Passed")
+
+def test_configure_logging_asynchronous():
+  # Arrange
+  logger.info("Beginning test: test_configure_logging_asynchronous")
+  sudoku_logger = logging.getLogger('sudoku')
+  
+  # Act
+  listener = sudoku.configure_logging(asynchronous = True)
+  handlers = list(sudoku_logger.handlers)
+  sudoku.stop_logging()
+  
+  # Assert
+  assert listener is not None
+  assert [type(h) for h in handlers] == [logging.handlers.QueueHandler]
+  assert any(isinstance(h, logging.FileHandler) for h in listener.handlers)
+  assert sudoku.configure_logging() is None
+  assert not any(isinstance(h, logging.handlers.QueueHandler) for h in sudoku_logger.handlers)
+  logger.info("End of test: test_configure_logging_asynchronous. Result: Passed")
+
+def test_backtracking_search_pause_and_resume():
+  # Arrange
+  logger.info("Beginning test: test_backtracking_search_pause_and_resume")
+  Puzzle = Sudoku(filename = "sudoku_solver_test_02.txt") # has exactly two solutions
+  original = Puzzle.snapshot()
+  empties = [x for x in sudoku.POSITIONS if Puzzle.cells[sudoku.CELL_OF_POS[x]] == Sudoku.EMPTY_VALUE]
+  def new_search(cells):
+    state = ConstraintState()
+    assert state.load(Puzzle.board)
+    return sudoku.BacktrackingSearch(cells, empties, state)
+  
+  # Act
+  uninterrupted = new_search(bytearray(original))
+  expected = [uninterrupted.run(), bytes(uninterrupted.cells), uninterrupted.run(), bytes(uninterrupted.cells)]
+  search = new_search(bytearray(original))
+  pauses = 0
+  while search.run(max_nodes = 3) == sudoku.BacktrackingSearch.PAUSED:
+    pauses += 1
+  first = bytes(search.cells)
+  
+  # Assert
+  assert expected[0] == expected[2] == sudoku.BacktrackingSearch.SOLVED
+  assert expected[1] != expected[3]
+  assert pauses > 0 and first == expected[1] and search.depth == len(empties)
+  assert search.run() == sudoku.BacktrackingSearch.SOLVED and bytes(search.cells) == expected[3]
+  assert search.run() == sudoku.BacktrackingSearch.EXHAUSTED
+  assert bytes(search.cells) == original and search.depth == 0
+  logger.info("End of test: test_backtracking_search_pause_and_resume. Result: Passed")
+
+def test_board_sizes():
+  # Arrange
+  logger.info("Beginning test: test_board_sizes")
+  puzzle = sudoku_bench.load_corpus("16x16")[4]
+  
+  # Act
+  Small = Sudoku(box = 2, generate = 4, seed = 3)
+  Large = Sudoku(puzzle = puzzle, box = 4)
+  
+  # Assert
+  for box in (2, 3, 4, 5):
+    g = sudoku.geometry(box)
+    assert g.size == box * box and len(g.units) == 3 * g.size
+    assert all(len(peers) == 2 * (g.size - 1) + (box - 1) ** 2 for peers in g.peers)
+    assert all(g.indices_to_pos[s][r][c] == x for x, (s, r, c) in enumerate(g.pos_to_indices))
+  assert Small.board.shape == (4, 2, 2) and Small.has_unique_solution()
+  assert Large.board.shape == (16, 4, 4) and Large.to_line() == puzzle
+  assert pickle.loads(pickle.dumps(Large)) == Large and Large.copy().geometry is Large.geometry
+  for strategy in ("propagation", "dlx"):
+    Solved = Large.copy()
+    assert Solved.solve(strategy = strategy) and Solved.board_is_solved()
+    assert all(p in ("0", s) for s, p in zip(Solved.to_line(), puzzle))
+    valid, solved = validate_boards(Solved.board[np.newaxis])
+    assert valid[0] and solved[0]
+  Solved = Small.copy()
+  assert Solved.solve(strategy = "backtracking") and Solved.board_is_solved()
+  for strategy in ("propagation", "dlx"): # deeper than the recursion limit
+    Huge = Sudoku(puzzle = "0" * 6 ** 4, box = 6)
+    assert Huge.solve(strategy = strategy) and Huge.board_is_solved() and Huge.stats.max_depth > 1000
+  logger.info("End of test: test_board_sizes. Result: Passed")
+
+def test_puzzle_io_text_and_packed():
+  # Arrange
+  logger.info("Beginning test: test_puzzle_io_text_and_packed")
+  puzzles = sudoku_bench.load_corpus("easy")
+  directory = tempfile.mkdtemp()
+  text_file = os.path.join(directory, "puzzles.txt")
+  packed_file = os.path.join(directory, "puzzles.bin")
+  
+  # Act
+  written = sudoku.write_puzzles(text_file, (Sudoku(puzzle = p) for p in puzzles))
+  packed = sudoku.write_packed_puzzles(packed_file, sudoku.read_puzzles(text_file), batch_size = 7)
+  
+  # Assert
+  assert written == packed == len(puzzles)
+  assert list(sudoku.read_puzzles(text_file)) == puzzles
+  assert os.path.getsize(packed_file) == sudoku.PACKED_PUZZLE_SIZE * len(puzzles)
+  with sudoku.PackedPuzzles(packed_file) as Packed:
+    assert len(Packed) == len(puzzles) and list(Packed) == puzzles
+    assert Packed[5] == puzzles[5] and Packed[-1] == puzzles[-1]
+    assert validate_boards(Packed.grids(2, 6))[0].all()
+  assert Sudoku(puzzle = puzzles[0].replace("0", ".")) == Sudoku(puzzle = puzzles[0])
+  assert Sudoku(filename = text_file) == Sudoku(puzzle = puzzles[0]) # the first puzzle of a batch file
+  for bad in (puzzles[0][:80], puzzles[0][:80] + "x"):
+    for parse in (lambda p: Sudoku(puzzle = p), lambda p: sudoku.pack_puzzles([p])):
+      try:
+        parse(bad)
+        assert False, "expected a ValueError"
+      except ValueError:
+        pass
+  shutil.rmtree(directory)
+  logger.info("End of test: test_puzzle_io_text_and_packed. Result: Passed")
+
+def test_solution_cache_with_equivalent_puzzles():
+  # Arrange
+  logger.info("Beginning test: test_solution_cache_with_equivalent_puzzles")
+  puzzles = sudoku_bench.load_corpus("hard")
+  transform = sudoku.BoardTransform(True, [5, 3, 4, 8, 6, 7, 1, 0, 2], [2, 1, 0, 6, 8, 7, 4, 3, 5],
+                                    [0, 4, 7, 1, 9, 2, 3, 8, 6, 5])
+  equivalent = "".join(str(v) for v in transform.apply(sudoku.parse_puzzle(puzzles[0])))
+  directory = tempfile.mkdtemp()
+  cache = sudoku.SolutionCache(maxsize = 2, path = os.path.join(directory, "cache.db"), canonical = True)
+  exact = sudoku.SolutionCache(path = os.path.join(directory, "exact.db"))
+  canonical_form = sudoku.canonical_form
+  canonicalized = list()
+  sudoku.canonical_form = lambda puzzle: canonicalized.append(puzzle) or canonical_form(puzzle)
+  
+  # Act
+  try:
+    Original = Sudoku(puzzle = puzzles[0])
+    Original.solve(cache = cache)
+    Equivalent = Sudoku(puzzle = equivalent)
+    Equivalent.solve(cache = cache)
+    ExactOnly = Sudoku(puzzle = equivalent)
+    ExactOnly.solve(cache = exact)
+    exact_calls = len(canonicalized)
+    Repeated = Sudoku(puzzle = equivalent)
+    Repeated.solve(cache = exact)
+  finally:
+    sudoku.canonical_form = canonical_form
+  Invalid = Sudoku(filename = "dummy.txt")
+  first, second = Invalid.solve(cache = cache), Invalid.solve(cache = cache)
+  for puzzle in puzzles[1:3]:
+    Sudoku(puzzle = puzzle).solve(cache = cache)
+  info = cache.info()
+  cache.close()
+  reopened = sudoku.SolutionCache(path = os.path.join(directory, "cache.db"), canonical = True)
+  journal = sudoku.sqlite3.connect(os.path.join(directory, "cache.db")).execute("PRAGMA journal_mode").fetchone()[0]
+  
+  # Assert
+  assert sudoku.canonical_form(puzzles[0])[0] == sudoku.canonical_form(equivalent)[0]
+  assert sudoku.canonical_form(puzzles[0])[0] != sudoku.canonical_form(puzzles[1])[0]
+  assert Equivalent.board_is_solved() and Equivalent.stats.nodes == 0
+  assert canonicalized[:exact_calls] == [puzzles[0], equivalent] # once per miss, by get and not again by put
+  assert exact_calls == len(canonicalized) == 2 # never without canonical set
+  assert ExactOnly.stats.nodes > 0 and Repeated.stats.nodes == 0 and exact.info()["hits"] == 1
+  assert journal == "wal"
+  assert all(p in ("0", s) for s, p in zip(Equivalent.to_line(), equivalent))
+  assert not first and not second
+  assert info == {"hits": 2, "misses": 4, "size": 2, "maxsize": 2}
+  assert reopened.get(equivalent) == Equivalent.to_line() and reopened.hits == 1
+  reopened.close()
+  exact.close()
+  shutil.rmtree(directory)
+  logger.info("End of test: test_solution_cache_with_equivalent_puzzles. Result: Passed")
+
+def test_solve_timeout_and_server():
+  # Arrange
+  logger.info("Beginning test: test_solve_timeout_and_server")
+  Hard = Sudoku(filename = "sudoku_solver_test_03.txt")
+  original = Hard.snapshot()
+  puzzles = sudoku_bench.load_corpus("easy")[:4]
+  Invalid = Sudoku(filename = "dummy.txt")
+  lines = puzzles[:2] + ["12345", Invalid.to_line()] + puzzles[2:]
+  directory = tempfile.mkdtemp()
+  executor = sudoku.ProcessPoolExecutor(max_workers = 1)
+  
+  async def run():
+    service = sudoku_server.SolveServer(executor, max_concurrency = 2, timeout = 5)
+    server = await service.start(path = os.path.join(directory, "sudoku.sock"))
+    async with server:
+      reader, writer = await asyncio.open_unix_connection(os.path.join(directory, "sudoku.sock"))
+      writer.write("".join(line + "\n" for line in lines).encode())
+      await writer.drain()
+      answers = [(await reader.readline()).decode().strip() for _ in lines]
+      writer.close()
+      reader, writer = await asyncio.open_unix_connection(os.path.join(directory, "sudoku.sock"))
+      writer.write(b"0" * 100000 + b"\n") # longer than the stream limit
+      await writer.drain()
+      answers.append((await reader.readline()).decode().strip())
+      writer.close()
+      start = time.time()
+      try:
+        await sudoku.solve_async(Hard, timeout = 0.2, strategy = "backtracking", executor = executor)
+        assert False, "expected a SolveTimeout"
+      except sudoku.SolveTimeout:
+        pass
+      waited = time.time() - start
+      solved = await sudoku.solve_async(puzzles[0], timeout = 5, executor = executor) # the worker is free again
+      return answers, waited, solved, service.counts
+  
+  # Act
+  try:
+    Hard.solve(strategy = "backtracking", timeout = 0.2)
+    assert False, "expected a SolveTimeout"
+  except sudoku.SolveTimeout:
+    pass
+  answers, waited, solved, counts = asyncio.run(run())
+  executor.shutdown()
+  
+  # Assert
+  assert Hard.snapshot() == original # the timed out search left the board as it was
+  assert answers[2].startswith("error:") and answers[3] == UNSOLVABLE and answers[-1] == "error: line too long"
+  assert counts == {"solved": 4, UNSOLVABLE: 1, "timeout": 0, "error": 2}
+  for answer, line in zip(answers[:2] + answers[4:-1], puzzles):
+    assert Sudoku(puzzle = answer).board_is_solved() and all(p in ("0", s) for s, p in zip(answer, line))
+  assert waited < 1 and solved.board_is_solved()
+  shutil.rmtree(directory)
+  logger.info("End of test: test_solve_timeout_and_server. Result: Passed")
+
+def test_parallel_search_splitting():
+  # Arrange
+  logger.info("Beginning test: test_parallel_search_splitting")
+  puzzle = sudoku_bench.load_corpus("easy")[0]
+  clues = [i for i, c in enumerate(puzzle) if c != "0"][:8]
+  Loose = Sudoku(puzzle = "".join("0" if i in clues else c for i, c in enumerate(puzzle))) # 24 solutions
+  Hard = Sudoku(filename = "sudoku_solver_test_03.txt")
+  
+  # Act
+  frontier, solutions = sudoku.split_frontier(Loose, depth = 2)
+  counts = list()
+  for cells, _ in frontier:
+    Subproblem = Loose.copy()
+    Subproblem.restore(cells)
+    counts.append(Subproblem.count_solutions())
+  parallel = {strategy: Loose.count_solutions_parallel(workers = 2, strategy = strategy, split_depth = 1)
+              for strategy in ("propagation", "dlx")}
+  limited = Loose.count_solutions_parallel(limit = 5, workers = 2, split_depth = 1)
+  solved = Hard.solve_parallel(workers = 2, strategy = "backtracking")
+  
+  # Assert
+  assert sum(counts) + len(solutions) == Loose.count_solutions() == 24
+  assert all(depth <= 2 and count > 0 for (_, depth), count in zip(frontier, counts))
+  assert parallel == {"propagation": 24, "dlx": 24} and limited == 5
+  assert solved and Hard.board_is_solved() and Hard.stats.nodes > 0
+  assert not Sudoku(filename = "dummy.txt").solve_parallel(workers = 2)
+  logger.info("End of test: test_parallel_search_splitting. Result: Passed")
+
+def test_technique_grader():
+  # Arrange
+  logger.info("Beginning test: test_technique_grader")
+  easy = sudoku_bench.load_corpus("easy")
+  hard = sudoku_bench.load_corpus("hard")[0]
+  g = sudoku.GEOMETRY
+  Solved = Sudoku(puzzle = hard)
+  Solved.solve()
+  solution = sudoku.parse_puzzle(Solved.to_line())
+  sudoku.grade_puzzle.cache_clear()
+  
+  # Act
+  grades = [sudoku.grade_puzzle(puzzle) for puzzle in easy]
+  Grader = sudoku.TechniqueGrader(sudoku.parse_puzzle(hard))
+  grade = Grader.grade()
+  again = Sudoku(puzzle = easy[0]).grade()
+  invalid = Sudoku(filename = "dummy.txt").grade()
+  
+  # Assert
+  assert all(gr["level"] == "easy" and gr["solved"] and gr["score"] <= 2.3 for gr in grades)
+  assert grades[0] == again and sudoku.grade_puzzle.cache_info().hits == 1
+  assert all(Grader.state.cands[x] >> solution[x] & 1 for x in g.positions) # no technique removed the solution
+  assert grade == {"score": 10.0, "level": "extreme", "techniques": {"search": 1}, "solved": False} # no logical first step
+  assert invalid["level"] == "invalid" and invalid["score"] is None
+  logger.info("End of test: test_technique_grader. Result: Passed")
+
+def test_generate_puzzles_pipeline():
+  # Arrange
+  logger.info("Beginning test: test_generate_puzzles_pipeline")
+  reports = list()
+  
+  # Act
+  pack = list(sudoku.generate_puzzles(8, clues = 28, workers = 2, seed = 3, chunksize = 3, progress = reports.append,
+                                      progress_interval = 3))
+  again = list(sudoku.generate_puzzles(8, clues = 28, workers = 1, seed = 3))
+  easy = list(sudoku.generate_puzzles(4, clues = 28, levels = ["easy"], max_clues = 30, seed = 3, workers = 1))
+  capped = list(sudoku.generate_puzzles(10, clues = 28, levels = ["extreme"], max_attempts = 2, workers = 1))
+  
+  # Assert
+  assert [p for p, _ in pack] == [p for p, _ in again] # reproducible whatever the number of workers
+  assert len({sudoku.canonical_form(p)[0] for p, _ in pack}) == 8
+  assert all(Sudoku(puzzle = p).has_unique_solution() and g == sudoku.grade_puzzle(p) for p, g in pack)
+  assert all(g["level"] == "easy" and sum(c != "0" for c in p) <= 30 for p, g in easy)
+  assert len(easy) == 4 and len(capped) <= 2
+  assert reports[-1]["accepted"] == 8 and reports[-1]["attempts"] >= 8 and len(reports) >= 2
+  tallies = ("accepted", "rejected", "duplicates", "surplus")
+  assert all(r["attempts"] == sum(r[k] for k in tallies) for r in reports) # every attempt is accounted for
+  assert all(a["attempts"] < b["attempts"] for a, b in zip(reports, reports[1:])) # no repeated report
+  logger.info("End of test: test_generate_puzzles_pipeline. Result: Passed")
+
+def test_batched_singles_propagation():
+  # Arrange
+  logger.info("Beginning test: test_batched_singles_propagation")
+  puzzles = sudoku_bench.load_corpus("easy") + sudoku_bench.load_corpus("hard")
+  invalid = Sudoku(filename = "dummy.txt").to_line()
+  big = sudoku_bench.load_corpus("16x16")[:2]
+  
+  # Act
+  values, status = sudoku.propagate_singles(sudoku.unpack_puzzles(sudoku.pack_puzzles(puzzles + [invalid])))
+  solutions, solved = sudoku.solve_boards(puzzles + [invalid], strategy = "dlx")
+  big_solutions, big_solved = sudoku.solve_boards(big, box = 4)
+  batch = list(solve_batch(puzzles + [invalid], workers = 1, chunksize = 8))
+  
+  # Assert
+  assert (status[:20] == sudoku.SINGLES_SOLVED).all() # the easy corpus falls to singles
+  assert sudoku.SINGLES_STUCK in status[20:-1] and status[-1] == sudoku.SINGLES_INVALID
+  assert validate_boards(values[:20].reshape(-1, 9, 9))[1].all()
+  assert solved[:-1].all() and not solved[-1] and validate_boards(solutions[:-1].reshape(-1, 9, 9))[1].all()
+  for puzzle, solution, line in zip(puzzles, solutions, batch):
+    assert all(p in ("0", str(s)) for p, s in zip(puzzle, solution))
+    assert line == "".join(map(str, solution))
+  assert batch[-1] == UNSOLVABLE
+  assert big_solved.all() and validate_boards(big_solutions.reshape(-1, 16, 16))[1].all()
+  logger.info("End of test: test_batched_singles_propagation. Result: Passed")
+
+def test_resumable_search_checkpoints():
+  # Arrange
+  logger.info("Beginning test: test_resumable_search_checkpoints")
+  puzzle = sudoku_bench.load_corpus("easy")[0]
+  clues = [i for i, c in enumerate(puzzle) if c != "0"][:8]
+  Loose = Sudoku(puzzle = "".join("0" if i in clues else c for i, c in enumerate(puzzle))) # 24 solutions
+  directory = tempfile.mkdtemp()
+  path = os.path.join(directory, "search.ckpt")
+  slice_size = sudoku.ResumableSearch.CHECKPOINT_SLICE
+  sudoku.ResumableSearch.CHECKPOINT_SLICE = 5
+  
+  # Act
+  try:
+    whole = sudoku.ResumableSearch(Loose, os.path.join(directory, "whole.ckpt"), keep = 24)
+    whole.run()
+    search = sudoku.ResumableSearch(Loose, path, interval = 0, keep = 24)
+    search.run(max_seconds = 0)
+    resumes = 0
+    while not search.done:
+      search = sudoku.ResumableSearch.resume(path)
+      search.run(max_seconds = 0)
+      resumes += 1
+    limited = sudoku.ResumableSearch(Loose, os.path.join(directory, "limited.ckpt"), limit = 1)
+    limited.run()
+    finished = sudoku.ResumableSearch.resume(path)
+  finally:
+    sudoku.ResumableSearch.CHECKPOINT_SLICE = slice_size
+  
+  # Assert
+  assert whole.found == search.found == Loose.count_solutions() == 24 and resumes > 3
+  assert search.solutions == whole.solutions and len(set(search.solutions)) == 24
+  assert search.stats.nodes == whole.stats.nodes # the resumed runs continued exactly where they stopped
+  assert finished.done and finished.found == 24 and finished.run() == 24
+  assert limited.found == 1 and Sudoku(puzzle = limited.solutions[0]).board_is_solved()
+  assert sorted(os.listdir(directory)) == ["limited.ckpt", "search.ckpt", "whole.ckpt"] # no temporary files left
+  shutil.rmtree(directory)
+  logger.info("End of test: test_resumable_search_checkpoints. Result: Passed")
+
+def test_play_session_moves_and_hints():
+  # Arrange
+  logger.info("Beginning test: test_play_session_moves_and_hints")
+  Puzzle = Sudoku(puzzle = sudoku_bench.load_corpus("hard")[0]) # first row 800000000, solved as 812753649
+  Session = sudoku.PlaySession(Puzzle)
+  before = Puzzle.snapshot()
+  
+  # Act
+  conflicts = Session.place(0, 1, 8)
+  options = Session.candidates(0, 1)
+  wrong = Session.place(0, 1, 2)
+  mistake_hint = Session.hint()
+  
+  # Assert
+  assert [(c["unit"], c["cell"]) for c in conflicts] == [("row", (0, 0)), ("square", (0, 0))]
+  assert options == [1, 2, 4, 6] and wrong == [] and Session.mistakes() == [(0, 1)]
+  assert mistake_hint == {"technique": "mistake", "cell": (0, 1), "value": 1}
+  assert 2 not in Session.candidates(0, 2) and Session.check(1, 0, 2)[0]["unit"] == "square"
+  assert Session.undo() and Session.board.snapshot() == before and 2 in Session.candidates(0, 2)
+  assert Session.redo() and not Session.redo() and Session.candidates(0, 1) == options
+  Session.clear(0, 1)
+  try:
+    Session.clear(0, 0)
+    assert False, "expected a ValueError"
+  except ValueError:
+    pass
+  moves = 0
+  while not Session.is_solved():
+    hint = Session.hint()
+    assert Session.place(*hint["cell"], hint["value"]) == []
+    moves += 1
+  assert Session.board.board_is_solved() and Session.hint() is None and Session.mistakes() == []
+  assert Puzzle.snapshot() == before # the session works on a copy
+  while Session.undo():
+    pass
+  assert Session.board.snapshot() == before and len(Session.redo_stack) == moves + 2
+  logger.info("End of test: test_play_session_moves_and_hints. Result: Passed")
+
+def test_profiler_sections_and_exports():
+  # Arrange
+  logger.info("Beginning test: test_profiler_sections_and_exports")
+  puzzle = sudoku_bench.load_corpus("hard")[0]
+  Profiler = sudoku.SolveProfiler(sample_interval = 50)
+  timed = [(Sudoku, "board_is_solved"), (ConstraintState, "load"), (sudoku.CandidateState, "select_cell"),
+           (sudoku.CandidateState, "propagate"), (sudoku.BacktrackingSearch, "__select_position__")]
+  originals = {(cls, name): cls.__dict__[name] for cls, name in timed}
+  directory = tempfile.mkdtemp()
+  concurrent = sudoku_bench.load_corpus("hard")[:6]
+  start = threading.Barrier(2)
+  profilers = [sudoku.SolveProfiler(sample_interval = 10) for _ in range(2)]
+  
+  def solve_all(profiler):
+    start.wait()
+    for p in concurrent:
+      assert Sudoku(puzzle = p).solve(strategy = "propagation", profiler = profiler)
+  
+  # Act
+  Solved = Sudoku(puzzle = puzzle)
+  solved = Solved.solve(strategy = "backtracking", profiler = Profiler)
+  Generated = Sudoku(puzzle = "0" * 81)
+  Generated.generate_board(30, seed = 3, profiler = Profiler)
+  Plain = Sudoku(puzzle = "0" * 81)
+  Plain.generate_board(30, seed = 3)
+  Profiler.write(os.path.join(directory, "profile.json"))
+  Profiler.write(os.path.join(directory, "profile.folded"))
+  with open(os.path.join(directory, "profile.json")) as f:
+    trace = json.load(f)
+  with open(os.path.join(directory, "profile.folded")) as f:
+    stacks = dict(line.rsplit(" ", 1) for line in f.read().splitlines())
+  threads = [threading.Thread(target = solve_all, args = (profiler,)) for profiler in profilers]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  recorded = [len(profiler.events) for profiler in profilers]
+  Sudoku(puzzle = concurrent[0]).solve(strategy = "propagation")
+  
+  # Assert
+  assert solved and Generated.to_line() == Plain.to_line() # profiling does not change the results
+  totals = Profiler.totals()
+  assert totals["solve"]["count"] == totals["generate"]["count"] == 1 and not Profiler.stack
+  assert {"search", "verify", "validation", "fill", "remove", "propagation", "candidate selection"} <= set(totals)
+  assert "solve;search" in stacks and "generate;remove;search;propagation" in stacks
+  assert all(stack.split(";")[0] in ("solve", "generate") and int(us) > 0 for stack, us in stacks.items())
+  samples = [e for e in trace["traceEvents"] if e["ph"] == "C"]
+  assert len(samples) == len(Profiler.depth_samples) >= Solved.stats.nodes // 50
+  assert all(e["args"]["depth"] <= 81 for e in samples)
+  assert {e["name"] for e in trace["traceEvents"] if e["ph"] == "X"} == set(totals)
+  assert all(cls.__dict__[name] is f for (cls, name), f in originals.items()) # no method was replaced
+  for profiler in profilers: # each recorded its own solves, and nothing else
+    assert profiler.totals()["solve"]["count"] == len(concurrent) and not profiler.stack
+    assert all(line.rsplit(" ", 1)[0].split(";")[0] == "solve" for line in profiler.collapsed().splitlines())
+  assert [len(profiler.events) for profiler in profilers] == recorded
+  shutil.rmtree(directory)
+  logger.info("End of test: test_profiler_sections_and_exports. Result: Passed")
+
+def test_transform_engine_variants():
+  # Arrange
+  logger.info("Beginning test: test_transform_engine_variants")
+  puzzle = sudoku_bench.load_corpus("hard")[0]
+  values = sudoku.parse_puzzle(puzzle)
+  Engine = sudoku.TransformEngine()
+  Transform = sudoku.BoardTransform(True, [2, 1, 0, 6, 7, 8, 3, 4, 5], [4, 3, 5, 0, 1, 2, 8, 6, 7],
+                                    [0, 9, 8, 7, 6, 5, 4, 3, 2, 1])
+  
+  # Act
+  permutations, digits = Engine.random_transforms(500, 7)
+  batch = Engine.apply(np.tile(np.array(values, dtype = np.uint8), (500, 1)), permutations, digits)
+  variants, solutions = Engine.variants(puzzle, 300, rng = 7)
+  again, _ = Engine.variants(puzzle, 300, rng = 7)
+  empty, _ = Engine.variants("0" * 81, 5, solution = solutions[0])
+  augmented = list(sudoku.augment_puzzles(sudoku_bench.load_corpus("easy")[:3], 4, seed = 1))
+  Engine16 = sudoku.TransformEngine(4)
+  variants16, solutions16 = Engine16.variants(sudoku_bench.load_corpus("16x16")[0], 20, rng = 1)
+  
+  # Assert
+  assert Engine.apply(values, *Engine.of_transforms([Transform]))[0].tolist() == Transform.apply(values)
+  assert Transform.invert(Transform.apply(values)) == values
+  assert (batch == Engine.apply(values, permutations, digits)).all()
+  assert np.array_equal(np.sort(permutations, axis = 1), np.tile(np.arange(81), (500, 1)))
+  assert variants.shape == (300, 81) and len(np.unique(variants, axis = 0)) == 300 and (again == variants).all()
+  assert validate_boards(solutions.reshape(-1, 9, 9))[1].all() and ((variants == 0) | (variants == solutions)).all()
+  key = sudoku.canonical_form(puzzle)[0]
+  assert all(sudoku.canonical_form(v.tolist())[0] == key for v in variants[:5]) # equivalent to the puzzle
+  assert len(empty) == 1 # the empty board is its own only variant
+  assert len(augmented) == 12 and all(Sudoku(puzzle = s).board_is_solved() for _, s in augmented)
+  assert all(p[i] in ("0", s[i]) for p, s in augmented for i in range(81))
+  assert validate_boards(solutions16.reshape(-1, 16, 16))[1].all() and len(np.unique(variants16, axis = 0)) == 20
+  logger.info("End of test: test_transform_engine_variants. Result: Passed")
+
 def main():
   logger.info("Beginning test run")
   
   test_sudoku_init_from_file()
+  test_constraint_state_place_unplace()
+  test_solve_puzzle_backtracking()
+  test_solve_propagation_seventeen_clues()
+  test_solve_unsolvable_board()
+  test_iter_solutions_enumerates_all()
+  test_solve_batch_keeps_input_order()
+  test_validate_boards_matches_board_is_solved()
+  test_flat_board_views_and_snapshot()
+  test_position_lookup_tables()
+  test_generate_board_unique_and_reproducible()
+  test_count_solutions_with_limit()
+  test_bench_corpora_and_report()
+  test_solve_stats_and_progress()
+  test_configure_logging_asynchronous()
+  test_backtracking_search_pause_and_resume()
+  test_board_sizes()
+  test_puzzle_io_text_and_packed()
+  test_solution_cache_with_equivalent_puzzles()
+  test_solve_timeout_and_server()
+  test_parallel_search_splitting()
+  test_technique_grader()
+  test_generate_puzzles_pipeline()
+  test_batched_singles_propagation()
+  test_resumable_search_checkpoints()
+  test_play_session_moves_and_hints()
+  test_profiler_sections_and_exports()
+  test_transform_engine_variants()
   
   logger.info("Finished test run")
 